@@ -19,4 +19,6 @@ def create_app():
         version="1.0.0"
     )
     app.include_router(cvr_controller.router, prefix="/cvr", tags=["CVR"])
+    app.add_event_handler("startup", cvr_controller.startup)
+    app.add_event_handler("shutdown", cvr_controller.shutdown)
     return app
\ No newline at end of file
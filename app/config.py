@@ -7,5 +7,89 @@ class Settings(BaseSettings):
     CVR_API_PASSWORD: str
     ELASTICSEARCH_VERSION: str
 
+    # Upstream HTTP connection pool (keep-alive sessions to the CVR ElasticSearch endpoint)
+    CVR_HTTP_POOL_CONNECTIONS: int = 10  # Number of host pools to cache
+    CVR_HTTP_POOL_MAXSIZE: int = 20  # Max open connections kept per host
+    CVR_HTTP_POOL_BLOCK: bool = True  # Wait for a free connection instead of opening extra ones
+    CVR_HTTP_CONNECT_TIMEOUT: float = 3.05
+    CVR_HTTP_READ_TIMEOUT: float = 30.0
+    CVR_ASYNC_MAX_CONNECTIONS: int = 200  # Upper bound on concurrent upstream requests per worker
+    CVR_ASYNC_MAX_KEEPALIVE_CONNECTIONS: int = 50
+
+    # Per-CVR company document cache
+    CVR_CACHE_ENABLED: bool = True
+    CVR_CACHE_MAX_ENTRIES: int = 512  # Documents can be several MB each, size this to the worker memory
+    CVR_CACHE_TTL: float = 300.0  # Seconds an entry is served as fresh
+    CVR_CACHE_STALE_TTL: float = 600.0  # Further seconds a stale entry is served while it is refreshed in the background
+    CVR_CACHE_NEGATIVE_TTL: float = 60.0  # Seconds an unknown CVR ID is answered without asking the upstream
+    CVR_CACHE_REFRESH_WORKERS: int = 4  # Background refreshes running at once
+    CVR_CACHE_BACKEND: str = "memory"  # "memory" (per process) or "sqlite" (shared by all workers on the host)
+    CVR_CACHE_PATH: str = "./cache/cvr_documents.sqlite3"  # Used by the sqlite backend
+    CVR_CACHE_SERIALIZER: str = "json"  # "json" or "pickle"; only use pickle if no one else can write the file
+
+    # Local company store filled by the change-feed sync (python -m app.services.company_sync)
+    CVR_STORE_ENABLED: bool = False  # Serve company documents from the store before asking the upstream
+    CVR_STORE_PATH: str = "./cache/companies.sqlite3"
+    CVR_STORE_MAX_LAG: float = 3600.0  # Seconds since the last complete sync after which the store is bypassed
+    CVR_SYNC_PAGE_SIZE: int = 500  # Companies per search_after page
+    CVR_SYNC_TIMESTAMP_FIELD: str = "Vrvirksomhed.sidstIndlaest"  # Or Vrvirksomhed.sidstOpdateret
+    CVR_SYNC_FULL_DOCUMENTS: bool = False  # False keeps only the fields the API reads
+    CVR_NAME_INDEX_ENABLED: bool = False  # Answer partial-name searches from an in-memory index of the store
+    CVR_NAME_INDEX_REFRESH_INTERVAL: float = 60.0  # Seconds, also for the fuzzy matcher; every worker holds its own copies
+    CVR_FUZZY_MATCH_ENABLED: bool = False  # Resolve company names to CVR IDs with a local trigram index of the store
+    CVR_FUZZY_MIN_SIMILARITY: float = 0.3  # Candidates below this trigram similarity are dropped
+    CVR_FUZZY_MIN_CONFIDENCE: float = 0.75  # Below this, name lookups still ask the upstream
+
+    # Full-register snapshot export (python -m app.services.snapshot_export)
+    CVR_EXPORT_PAGE_SIZE: int = 1000  # Companies per search_after page
+    CVR_EXPORT_ROWS_PER_FILE: int = 100000  # Rows per Parquet part file
+    CVR_EXPORT_WORKERS: int = 0  # Parser processes, 0 uses every core
+
+    # Partial-name search pagination
+    CVR_SEARCH_DEFAULT_LIMIT: int = 100
+    CVR_SEARCH_MAX_LIMIT: int = 1000
+    CVR_SEARCH_PAGE_SIZE: int = 500  # Page size used when streaming every match
+
+    # Batch lookups by CVR ID
+    CVR_BATCH_CHUNK_SIZE: int = 100  # CVR IDs per `terms` query
+    CVR_BATCH_MAX_IDS: int = 10000  # Per request
+    CVR_BATCH_CONCURRENCY: int = 4  # Chunks in flight at once on the async path
+
+    # Ownership graph traversal
+    CVR_OWNERSHIP_MAX_DEPTH: int = 10  # Levels of corporate owners walked above the company
+    CVR_OWNERSHIP_MAX_COMPANIES: int = 2000  # Companies expanded per graph
+    CVR_OWNERSHIP_CACHE_MAX_ENTRIES: int = 100000  # Owner lists kept per CVR; each is a few hundred bytes
+
+    # Bulk name-to-CVR resolution
+    CVR_BULK_MAX_NAMES: int = 100000  # Per uploaded file
+    CVR_BULK_MSEARCH_BATCH_SIZE: int = 50  # Names per `_msearch` request
+    CVR_BULK_CONCURRENCY: int = 4  # `_msearch` requests in flight at once
+    CVR_BULK_TOP_K: int = 3  # Candidates returned per name
+
+    # PDF download browser pool
+    PDF_DOWNLOAD_DIR: str = "./downloads"
+    PDF_WARM_UP_ON_STARTUP: bool = True  # Launch the browsers in the background when the app starts
+    PDF_POOL_SIZE: int = 2  # Headless Chrome workers, each uses roughly 150-300 MB
+    PDF_MAX_JOBS_PER_BROWSER: int = 50  # Recycle a browser after this many downloads
+    PDF_CHECKOUT_TIMEOUT: float = 120.0  # Seconds a download waits for a free browser
+    PDF_DOWNLOAD_TIMEOUT: int = 60  # Seconds
+    PDF_DOWNLOAD_POLL_INTERVAL: float = 0.1  # Seconds, only used where inotify is unavailable
+
+    # Downloaded PDF cache
+    PDF_CACHE_ENABLED: bool = True
+    PDF_CACHE_DIR: str = "./downloads/cache"
+    PDF_CACHE_TTL: float = 86400.0  # Seconds
+    PDF_CACHE_MAX_BYTES: int = 1024 ** 3  # Least recently used PDFs are evicted above this size
+
+    # Background PDF jobs
+    PDF_JOB_WORKERS: int = 2  # Jobs running at once, keep at or below PDF_POOL_SIZE
+    PDF_JOB_MAX_QUEUED: int = 1000
+    PDF_JOB_RETENTION: float = 3600.0  # Seconds a finished job stays queryable
+    PDF_JOB_STATE_DIR: str = "./downloads/jobs"
+
+    # ZIP bundles of many PDFs
+    PDF_BUNDLE_MAX_IDS: int = 500  # Per request
+    PDF_BUNDLE_CONCURRENCY: int = 2  # PDFs fetched at once per bundle
+
     class Config:
         env_file = ".env"  # Optional: You can load a .env file for local development if needed.
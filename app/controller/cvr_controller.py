@@ -1,53 +1,151 @@
-from fastapi import APIRouter, HTTPException
-from app.services.cvr_service import CVRService
-from app.dtos.cvr_dto import CompanyRequest, CompanyResponse, CompanyInfo, CompanySearchResponse, CompanyDataResponse, GeneralInfoResponse,PersonRequest, PersonInfoResponse, PossibleOwnershipInfo, PossibleOwnershipResponse,KeyIndividualsResponse, KeyIndividual, OwnershipInfo, OwnershipResponse, PDFDownloadResponse, PDFDownloadRequest
-from app.services.cvr_service import PDFService
+import json
+from typing import List, Literal, Optional
+from fastapi import APIRouter, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.cvr_service import CVRService, AsyncCVRService, settings
+from app.dtos.cvr_dto import CompanyRequest, CompanySearchRequest, CompanyResponse, CompanyInfo, CompanySearchResponse, CompanyDataResponse, GeneralInfoResponse,PersonRequest, PersonInfoResponse, PossibleOwnershipInfo, PossibleOwnershipResponse,KeyIndividualsResponse, KeyIndividual, OwnershipInfo, OwnershipResponse, PDFDownloadResponse, PDFDownloadRequest, CompanyDossierResponse, BatchRequest, BatchGeneralInfoResponse, BatchOwnershipResponse, BatchKeyIndividualsResponse, NameResolutionResult, PDFJobResponse, PDFBundleRequest, NameMatchRequest, NameMatchResponse, OwnershipGraphResponse
+from app.services.pdf_service import PDFService
+from app.services.pdf_jobs import PDFJobQueue, DONE
+from app.controller.range_file_response import RangeFileResponse
+from app.services.name_resolution import read_names
 
 router = APIRouter()
 cvr_service = CVRService()
+async_cvr_service = AsyncCVRService()
 pdf_service = PDFService()
+pdf_jobs = PDFJobQueue(
+    pdf_service,
+    workers=settings.PDF_JOB_WORKERS,
+    state_dir=settings.PDF_JOB_STATE_DIR,
+    max_queued=settings.PDF_JOB_MAX_QUEUED,
+    retention=settings.PDF_JOB_RETENTION,
+)
+
+
+async def startup():
+    """
+    Starts the PDF browser pool and the local name indexes in the background, so booting the app
+    never waits for Chrome or an index build.
+    """
+    if settings.PDF_WARM_UP_ON_STARTUP:
+        pdf_service.warm_up()
+    if async_cvr_service.name_index is not None:
+        async_cvr_service.name_index.start(async_cvr_service.store, settings.CVR_NAME_INDEX_REFRESH_INTERVAL)
+    if async_cvr_service.fuzzy_matcher is not None:
+        async_cvr_service.fuzzy_matcher.start(async_cvr_service.store, settings.CVR_NAME_INDEX_REFRESH_INTERVAL)
+
+
+async def shutdown():
+    """
+    Closes the upstream HTTP clients and the PDF browser pool when the application stops.
+    """
+    await async_cvr_service.close()
+    cvr_service.client.close()
+    pdf_jobs.close()
+    pdf_service.close_driver()
+    if async_cvr_service.name_index is not None:
+        async_cvr_service.name_index.close()
+    if async_cvr_service.fuzzy_matcher is not None:
+        async_cvr_service.fuzzy_matcher.close()
+
 
 @router.post("/get-cvr-id", response_model=CompanyResponse)
-def get_cvr_id(company_request: CompanyRequest):
+async def get_cvr_id(company_request: CompanyRequest):
     """
     Endpoint to retrieve the CVR-ID of a company by its name.
     """
     try:
         print(f"Received request for company: {company_request.name}")
-        cvr_id = cvr_service.get_cvr_id_by_company_name(company_request.name)
+        cvr_id = await async_cvr_service.get_cvr_id_by_company_name(company_request.name)
         print(f"Fetched CVR ID: {cvr_id}")
         return CompanyResponse(cvr_id=cvr_id)
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
     
+@router.post("/match-company-name", response_model=NameMatchResponse)
+async def match_company_name(match_request: NameMatchRequest):
+    """
+    Endpoint to rank the companies matching a possibly misspelled or differently written name,
+    with a confidence score per candidate (1.0 when the names are equal after normalization).
+    """
+    try:
+        if match_request.top_k is not None and not 1 <= match_request.top_k <= 25:
+            raise Exception("top_k must be between 1 and 25")
+        return await async_cvr_service.match_company_name(match_request.name, match_request.top_k)
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/get-companies-by-partial-name", response_model=CompanySearchResponse)
-def get_companies_by_partial_name(company_request: CompanyRequest):
+async def get_companies_by_partial_name(company_request: CompanySearchRequest):
     """
     Endpoint to retrieve full company names and CVR numbers by partial company name.
+    Results are paginated: pass the returned `next_cursor` as `cursor` to fetch the next page.
     """
     try:
         print(f"Received request for partial company name: {company_request.name}")
-        results = cvr_service.get_companies_by_partial_name(company_request.name)
-        if not results:
+        limit = company_request.limit or settings.CVR_SEARCH_DEFAULT_LIMIT
+        if not 1 <= limit <= settings.CVR_SEARCH_MAX_LIMIT:
+            raise Exception(f"limit must be between 1 and {settings.CVR_SEARCH_MAX_LIMIT}")
+
+        page = await async_cvr_service.search_companies_by_partial_name(company_request.name, limit, company_request.cursor)
+        if not page["results"] and not company_request.cursor:
             raise HTTPException(status_code=404, detail="No companies found with the given partial name.")
 
         # Format the response
-        companies_info = [CompanyInfo(company_name=company["company_name"], cvr_number=company["cvr_number"]) for company in results]
-        return CompanySearchResponse(total_results=len(companies_info), results=companies_info)
+        companies_info = [CompanyInfo(company_name=company["company_name"], cvr_number=company["cvr_number"]) for company in page["results"]]
+        return CompanySearchResponse(total_results=page["total_results"], results=companies_info, next_cursor=page["next_cursor"])
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/typeahead", response_model=List[CompanyInfo])
+async def typeahead(q: str, limit: int = Query(10, ge=1, le=100)):
+    """
+    Endpoint for search-as-you-type: the best matching companies for a name prefix, ranked with
+    names starting with the prefix and active companies first. Served from the local name index
+    when it is enabled, otherwise from the first page of the upstream search.
+    """
+    try:
+        results = await async_cvr_service.typeahead(q, limit)
+        return [CompanyInfo(company_name=company["company_name"], cvr_number=company["cvr_number"]) for company in results]
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/get-companies-by-partial-name/stream")
+async def stream_companies_by_partial_name(company_request: CompanyRequest):
+    """
+    Endpoint to stream every company matching a partial name as NDJSON (one CompanyInfo per line).
+    Pages are fetched from ElasticSearch as the client reads, so memory use does not grow with the result size.
+    """
+    async def generate():
+        try:
+            async for company in async_cvr_service.iter_companies_by_partial_name(company_request.name):
+                yield CompanyInfo(company_name=company["company_name"], cvr_number=company["cvr_number"]).model_dump_json() + "\n"
+        except Exception as e:
+            # The status line is already sent, so report the failure in-band
+            print(f"Error occurred while streaming companies: {str(e)}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
     
 
 
 @router.get("/get-general-info/{cvr_id}", response_model=GeneralInfoResponse)
-def get_general_info(cvr_id: int):
+async def get_general_info(cvr_id: int, use_cache: bool = True):
     """
     Endpoint to retrieve general company information by CVR ID.
     """
     try:
-        general_info = cvr_service.get_general_info_by_cvr_id(cvr_id)
+        general_info = await async_cvr_service.get_general_info_by_cvr_id(cvr_id, use_cache)
         return GeneralInfoResponse(
             company_name=general_info["company_name"],
             cvr_number=general_info["cvr_number"],
@@ -64,12 +162,12 @@ def get_general_info(cvr_id: int):
 
 
 @router.get("/get-possible-ownership-info/{cvr_id}", response_model=PossibleOwnershipResponse)
-def get_possible_ownership_info(cvr_id: int):
+async def get_possible_ownership_info(cvr_id: int, use_cache: bool = True):
     """
     Endpoint to retrieve possible ownership information by CVR ID.
     """
     try:
-        possible_ownership_info = cvr_service.get_possible_ownership_info_by_cvr_id(cvr_id)
+        possible_ownership_info = await async_cvr_service.get_possible_ownership_info_by_cvr_id(cvr_id, use_cache)
         return PossibleOwnershipResponse(
             cvr_number=possible_ownership_info["cvr_number"],
             company_name=possible_ownership_info["company_name"],
@@ -83,12 +181,12 @@ def get_possible_ownership_info(cvr_id: int):
     
 
 @router.get("/get-key-individuals/{cvr_id}", response_model=KeyIndividualsResponse)
-def get_key_individuals(cvr_id: int):
+async def get_key_individuals(cvr_id: int, use_cache: bool = True):
     """
     Endpoint to retrieve key individuals like Management, Board of Directors, Founders, and Fully Liable Partners by CVR ID.
     """
     try:
-        key_individuals = cvr_service.get_key_individuals_by_cvr_id(cvr_id)
+        key_individuals = await async_cvr_service.get_key_individuals_by_cvr_id(cvr_id, use_cache)
 
         # Convert data into DTO format
         response = KeyIndividualsResponse(
@@ -104,26 +202,209 @@ def get_key_individuals(cvr_id: int):
 
 
 @router.get("/ownership/{cvr_id}", response_model=OwnershipResponse)
-def get_ownership_info(cvr_id: int):
+async def get_ownership_info(cvr_id: int, use_cache: bool = True):
     """
     Endpoint to retrieve both legal and beneficial ownership information for a company by CVR ID.
     """
     try:
-        ownership_data = cvr_service.get_ownership_info(cvr_id)
+        ownership_data = await async_cvr_service.get_ownership_info(cvr_id, use_cache)
         return ownership_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 
+@router.get("/ownership-graph/{cvr_id}", response_model=OwnershipGraphResponse)
+async def get_ownership_graph(
+    cvr_id: int,
+    max_depth: Optional[int] = Query(None, description="Levels of corporate owners to walk"),
+    use_cache: bool = True
+):
+    """
+    Endpoint to retrieve the ownership graph above a company: every owner reached through its
+    corporate owners, the effective share of each ultimate owner, and any ownership cycles.
+    """
+    try:
+        return await async_cvr_service.get_ownership_graph(cvr_id, max_depth, use_cache)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/company/{cvr_id}", response_model=CompanyDossierResponse)
+async def get_company_dossier(
+    cvr_id: int,
+    sections: Optional[List[str]] = Query(None, description="general_info, ownership, key_individuals, possible_ownership (all if omitted)"),
+    use_cache: bool = True
+):
+    """
+    Endpoint to retrieve several views of a company (general info, ownership, key individuals and
+    possible ownership) from a single upstream fetch. Only the requested sections are extracted.
+    """
+    try:
+        # Accept both ?sections=a&sections=b and ?sections=a,b
+        requested = [part.strip() for section in sections or [] for part in section.split(",") if part.strip()]
+        dossier = await async_cvr_service.get_company_dossier(cvr_id, requested, use_cache)
+        return CompanyDossierResponse(**dossier)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/batch/general-info", response_model=BatchGeneralInfoResponse)
+async def get_general_info_batch(batch_request: BatchRequest):
+    """
+    Endpoint to retrieve general company information for many CVR IDs with one upstream query per chunk.
+    """
+    try:
+        return await async_cvr_service.get_batch("general_info", batch_request.cvr_ids, batch_request.use_cache, batch_request.chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/batch/ownership", response_model=BatchOwnershipResponse)
+async def get_ownership_info_batch(batch_request: BatchRequest):
+    """
+    Endpoint to retrieve legal and beneficial ownership information for many CVR IDs.
+    """
+    try:
+        return await async_cvr_service.get_batch("ownership", batch_request.cvr_ids, batch_request.use_cache, batch_request.chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/batch/key-individuals", response_model=BatchKeyIndividualsResponse)
+async def get_key_individuals_batch(batch_request: BatchRequest):
+    """
+    Endpoint to retrieve key individuals for many CVR IDs.
+    """
+    try:
+        return await async_cvr_service.get_batch("key_individuals", batch_request.cvr_ids, batch_request.use_cache, batch_request.chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bulk/resolve-names")
+async def resolve_names(
+    file: UploadFile = File(..., description="CSV with a name column, or NDJSON with one {\"name\": ...} per line"),
+    top_k: Optional[int] = Query(None, ge=1, le=25)
+):
+    """
+    Endpoint to resolve a file of company names to CVR numbers. Names are normalized and deduplicated,
+    queried in `_msearch` batches, and streamed back as NDJSON (one NameResolutionResult per input row,
+    in completion order) with the match score and the top-k candidates.
+    """
+    try:
+        names = read_names(await file.read(), file.filename or "", file.content_type or "")
+        if len(names) > settings.CVR_BULK_MAX_NAMES:
+            raise Exception(f"A file may contain at most {settings.CVR_BULK_MAX_NAMES} names")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generate():
+        async for result in async_cvr_service.resolve_names(names, top_k):
+            yield NameResolutionResult(**result).model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/ready")
+async def get_readiness(pdf: bool = Query(False, description="Also require a running PDF browser")):
+    """
+    Readiness probe. The JSON endpoints are ready as soon as the app answers; PDF capacity is
+    reported separately and only required with `pdf=true`, which answers 503 until a browser is up.
+    """
+    pdf_ready = pdf_service.is_ready()
+    body = {
+        "ready": pdf_ready or not pdf,
+        "pdf_ready": pdf_ready,
+        "pdf_browsers": pdf_service.pool.metrics()["workers"],
+        "pdf_pool_size": pdf_service.pool.size
+    }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Endpoint to retrieve runtime metrics of the upstream CVR connection pool and the PDF browser pool.
+    """
+    return {
+        "upstream_pool": cvr_service.client.pool_metrics(),
+        "async_upstream_pool": async_cvr_service.client.pool_metrics(),
+        "document_cache": async_cvr_service.cache.stats(),
+        "ownership_cache": async_cvr_service.ownership_cache.stats(),
+        "company_store": dict(
+            async_cvr_service.store.stats(),
+            hits=cvr_service.store_hits + async_cvr_service.store_hits
+        ) if async_cvr_service.store is not None else None,
+        "name_index": async_cvr_service.name_index.stats() if async_cvr_service.name_index is not None else None,
+        "fuzzy_matcher": async_cvr_service.fuzzy_matcher.stats() if async_cvr_service.fuzzy_matcher is not None else None,
+        "document_single_flight": {
+            "sync": cvr_service.single_flight.stats(),
+            "async": async_cvr_service.single_flight.stats()
+        },
+        "pdf_browser_pool": pdf_service.pool_metrics(),
+        "pdf_cache": pdf_service.cache.stats(),
+        "pdf_jobs": pdf_jobs.stats()
+    }
+
+
+@router.delete("/cache/{cvr_id}")
+async def invalidate_cached_company(cvr_id: int):
+    """
+    Endpoint to drop the cached company document and owners for a CVR ID, so the next request refetches them.
+    """
+    removed = async_cvr_service.cache.invalidate(cvr_id)
+    removed = async_cvr_service.ownership_cache.invalidate(cvr_id) or removed
+    return {"cvr_id": cvr_id, "invalidated": removed}
+
+
+
+def _pdf_job_response(job: dict) -> PDFJobResponse:
+    return PDFJobResponse(
+        job_id=job["job_id"],
+        cvr_id=job["cvr_id"],
+        locale=job["locale"],
+        priority=job["priority"],
+        state=job["state"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        file_name=job["file_name"],
+        file_url=f"/cvr/pdf-jobs/{job['job_id']}/file" if job["state"] == DONE else None,
+        error=job["error"]
+    )
+
+
 @router.post("/download-pdf", response_model=PDFDownloadResponse)
-def download_pdf(request: PDFDownloadRequest):
+async def download_pdf(
+    request: PDFDownloadRequest,
+    http_request: Request,
+    async_job: bool = Query(False, description="Queue the download and return a job ID immediately"),
+    priority: int = Query(5, ge=0, le=9, description="Job priority, 0 runs first"),
+    x_client_id: Optional[str] = Header(None)
+):
     """
     Endpoint to download the PDF for a given CVR ID.
+
+    With `async_job=true` the download is queued and a 202 response with the job is returned at once;
+    poll `/cvr/pdf-jobs/{job_id}` until its state is "done".
     """
+    if async_job:
+        client = x_client_id or (http_request.client.host if http_request.client else "anonymous")
+        try:
+            job = pdf_jobs.submit(request.cvr_id, request.locale, request.use_cache, client, priority)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        status_url = f"/cvr/pdf-jobs/{job.id}"
+        return JSONResponse(
+            status_code=202,
+            content=_pdf_job_response(job.to_dict()).model_dump(),
+            headers={"Location": status_url}
+        )
+
     try:
         print(f"Request received to download PDF for CVR ID: {request.cvr_id}")
-        result = pdf_service.download_pdf(request.cvr_id)
+        result = await run_in_threadpool(pdf_service.download_pdf, request.cvr_id, request.locale, request.use_cache)
         print(f"PDF downloaded successfully: {result}")
         return PDFDownloadResponse(
             file_name=result["file_name"],
@@ -136,6 +417,74 @@ def download_pdf(request: PDFDownloadRequest):
         raise HTTPException(status_code=500, detail="Failed to download PDF. Check server logs for details.")
 
 
+@router.get("/pdf-jobs/{job_id}", response_model=PDFJobResponse)
+async def get_pdf_job(job_id: str):
+    """
+    Endpoint to retrieve the state of a queued PDF download.
+    """
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown PDF job: {job_id}")
+    return _pdf_job_response(job)
+
+
+@router.api_route("/pdf-jobs/{job_id}/file", methods=["GET", "HEAD"])
+async def get_pdf_job_file(job_id: str, request: Request):
+    """
+    Endpoint to download the PDF of a finished job. Supports Range and If-None-Match.
+    """
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown PDF job: {job_id}")
+    if job["state"] != DONE:
+        raise HTTPException(status_code=409, detail=f"PDF job is {job['state']}")
+    try:
+        return RangeFileResponse(job["file_path"], request.headers, job["digest"], job["file_name"],
+                                 method=request.method)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="The PDF of this job is no longer cached.")
+
+
+@router.post("/pdf-bundle")
+async def get_pdf_bundle(request: PDFBundleRequest):
+    """
+    Endpoint to download the PDFs of many companies as one streamed ZIP archive.
+
+    PDFs are fetched in parallel and added to the archive as they complete; CVR IDs that
+    fail are listed in an `errors.txt` entry.
+    """
+    if not request.cvr_ids:
+        raise HTTPException(status_code=400, detail="cvr_ids must not be empty")
+    if len(request.cvr_ids) > settings.PDF_BUNDLE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PDF_BUNDLE_MAX_IDS} CVR IDs per bundle")
+
+    return StreamingResponse(
+        pdf_service.iter_pdf_bundle(request.cvr_ids, request.locale, settings.PDF_BUNDLE_CONCURRENCY),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="cvr-pdfs.zip"'}
+    )
+
+
+@router.api_route("/pdf/{cvr_id}", methods=["GET", "HEAD"])
+async def get_pdf(cvr_id: int, request: Request, locale: Literal["en", "da"] = Query("en")):
+    """
+    Endpoint to stream the PDF for a given CVR ID, downloading it first when it is not cached.
+
+    Responses carry Content-Length and a content-digest ETag, and honour Range, If-Range and
+    If-None-Match, so interrupted downloads can be resumed.
+    """
+    try:
+        result = await run_in_threadpool(pdf_service.download_pdf, cvr_id, locale)
+    except Exception as e:
+        print(f"Error occurred in PDF download: {e}")
+        raise HTTPException(status_code=502, detail="Failed to download PDF. Check server logs for details.")
+    try:
+        return RangeFileResponse(result["file_path"], request.headers, result["digest"], result["file_name"],
+                                 method=request.method)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="The PDF was evicted from the cache, try again.")
+
+
     
 """    
 @router.post("/download-pdf", response_model=PDFDownloadResponse)
@@ -147,40 +496,36 @@ async def download_pdf(request: PDFDownloadRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 """          
-#Doesn't work part starts here
-    ###
-    ###
-    ###    
 
 @router.post("/get-person-info", response_model=PersonInfoResponse)
-def get_person_info(person_request: PersonRequest):
+async def get_person_info(person_request: PersonRequest):
     """
-    Endpoint to retrieve person information by their name.
+    Endpoint to retrieve a person or other participant by name or unit number, with every company
+    and role they appear in. Served from the participant index of the local company store.
     """
     try:
-        person_info = cvr_service.get_person_info_by_name(person_request.name)
-        return PersonInfoResponse(
-            full_name=person_info["full_name"],
-            address="N/A",  # Placeholder, we're only testing full name
-            postal_code="N/A",
-            city="N/A",
-            affiliations=[]
-        )
+        if not person_request.name and person_request.unit_number is None:
+            raise Exception("name or unit_number is required")
+        person_info = await run_in_threadpool(cvr_service.get_person_info_by_name, person_request.name, person_request.unit_number)
+        return PersonInfoResponse(**person_info)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-
+#Doesn't work part starts here
+    ###
+    ###
+    ###    
 
 #not working correctly
 @router.get("/get-company-data/{cvr_id}", response_model=CompanyDataResponse)
-def get_company_data(cvr_id: int):
+async def get_company_data(cvr_id: int):
     """
     Endpoint to retrieve detailed company data by CVR ID.
     """
     try:
         print(f"Received request for company data with CVR ID: {cvr_id}")
-        company_data = cvr_service.get_company_data_by_cvr_id(cvr_id)
+        company_data = await run_in_threadpool(cvr_service.get_company_data_by_cvr_id, cvr_id)
 
         # Map the company data to the response model
         response = CompanyDataResponse(
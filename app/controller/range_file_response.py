@@ -0,0 +1,144 @@
+import os
+import re
+from email.utils import formatdate
+from urllib.parse import quote
+
+import anyio
+from starlette.responses import Response
+
+_SINGLE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeFileResponse(Response):
+    """
+    Streams a file from disk with ETag, conditional request and single byte-range support.
+
+    The ETag is the file's content digest, so it stays valid across restarts and workers.
+    `If-None-Match` answers 304, `Range` answers 206 (or 416 when unsatisfiable) and `If-Range`
+    only honours the range while the ETag still matches, which lets clients resume interrupted
+    downloads. The body is sent with the ASGI `zerocopysend` extension when the server offers it,
+    otherwise in chunks read straight from the file, so large PDFs are never loaded into memory.
+    The file is opened here, so evicting it from the PDF cache before the body is sent is harmless.
+
+    Args:
+        path (str): File to serve.
+        request_headers: Headers of the incoming request.
+        etag (str): Content digest of the file.
+        filename (str): Name suggested to the client in Content-Disposition.
+        media_type (str): Content-Type of the file.
+        method (str): Request method; HEAD sends headers only.
+    """
+
+    def __init__(self, path: str, request_headers, etag: str, filename: str = None,
+                 media_type: str = "application/pdf", method: str = "GET"):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        self.body = b""
+
+        self.file = open(path, "rb")
+        stat_result = os.fstat(self.file.fileno())
+        size = stat_result.st_size
+        etag = f'"{etag}"'
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        if filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+        self.status_code = 200
+        self.offset = 0
+        self.count = size
+        if_none_match = request_headers.get("if-none-match")
+        byte_range = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+
+        if if_none_match and self._etag_matches(if_none_match, etag):
+            self.status_code = 304
+            self.count = 0
+        elif byte_range and (if_range is None or if_range.strip() == etag):
+            parsed = self._parse_range(byte_range, size)
+            if parsed is False:
+                self.status_code = 416
+                self.count = 0
+                headers["content-range"] = f"bytes */{size}"
+            elif parsed is not None:
+                start, end = parsed
+                self.status_code = 206
+                self.offset = start
+                self.count = end - start + 1
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        if self.status_code != 304:
+            headers["content-length"] = str(self.count)
+        self.send_body = method != "HEAD" and self.count > 0
+        if not self.send_body:
+            self.file.close()
+        self.init_headers(headers)
+
+    @staticmethod
+    def _etag_matches(if_none_match: str, etag: str) -> bool:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    @staticmethod
+    def _parse_range(byte_range: str, size: int):
+        """
+        Parses a single `bytes=` range.
+
+        Returns:
+            tuple: Inclusive (start, end); None to ignore the header and send the whole file,
+            which is also how multi-range and invalid (start > end) requests are answered;
+            False when unsatisfiable.
+        """
+        match = _SINGLE_RANGE.match(byte_range.replace(" ", ""))
+        if match is None or match.group(1) == match.group(2) == "":
+            return None
+
+        start, end = match.groups()
+        if start == "":
+            suffix_length = int(end)  # bytes=-N is the last N bytes
+            if suffix_length == 0 or size == 0:
+                return False
+            return max(size - suffix_length, 0), size - 1
+
+        start = int(start)
+        if end and int(end) < start:
+            return None  # Syntactically invalid, RFC 7233 says to ignore it
+        if start >= size:
+            return False
+        return start, min(int(end), size - 1) if end else size - 1
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self.send_body:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+                return
+
+            f = anyio.wrap_file(self.file)
+            await f.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 #Get one CVR id from company name
 #Input
@@ -18,10 +18,17 @@ class CompanyInfo(BaseModel):
     company_name: str
     cvr_number: int
 
+#Input (cursor-paginated search; `cursor` is the `next_cursor` of the previous page)
+class CompanySearchRequest(BaseModel):
+    name: str
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+
 #Output
 class CompanySearchResponse(BaseModel):
     total_results: int
     results: List[CompanyInfo]
+    next_cursor: Optional[str] = None
 
 
 
@@ -83,28 +90,138 @@ class OwnershipResponse(BaseModel):
     terminated_owners: List[OwnershipInfo]  # List for terminated owners
 #####    
 
+# Ownership graph: every owner above a company, walked through corporate owners
+class OwnershipGraphNode(BaseModel):
+    id: str  # "cvr:<CVR number>" for companies, "unit:<enhedsNummer>" for persons
+    node_type: Literal["company", "person"]
+    cvr_number: Optional[int] = None
+    unit_number: Optional[int] = None
+    name: Optional[str] = None
+    depth: int  # Ownership levels above the company, 0 for the company itself
+    expanded: bool  # False for companies whose own owners were not fetched
+    error: Optional[str] = None
+
+class OwnershipGraphEdge(BaseModel):
+    owner: str
+    owned: str
+    ownership_share: Optional[float] = None  # Fraction, 0.25 for 25 %
+    voting_share: Optional[float] = None
+
+class UltimateOwner(BaseModel):
+    id: str
+    node_type: Literal["company", "person"]
+    cvr_number: Optional[int] = None
+    name: Optional[str] = None
+    effective_share: Optional[float] = None  # Shares multiplied along each path, summed over paths
+    paths: int
+
+class OwnershipGraphResponse(BaseModel):
+    cvr_number: int
+    company_name: str
+    nodes: List[OwnershipGraphNode]
+    edges: List[OwnershipGraphEdge]
+    ultimate_owners: List[UltimateOwner]
+    cycles: List[List[int]]  # Each company is owned by the next one, the last by the first
+    truncated: bool
+#####
+
+# Company dossier: several views of one company built from a single document fetch
+class CompanyDossierResponse(BaseModel):
+    cvr_number: int
+    company_name: str
+    general_info: Optional[GeneralInfoResponse] = None
+    ownership: Optional[OwnershipResponse] = None
+    key_individuals: Optional[KeyIndividualsResponse] = None
+    possible_ownership: Optional[PossibleOwnershipResponse] = None
+#####
+
+# Batch lookups: per-ID results and per-ID errors
+class BatchRequest(BaseModel):
+    cvr_ids: List[int]
+    chunk_size: Optional[int] = None
+    use_cache: bool = True
+
+class BatchGeneralInfoResponse(BaseModel):
+    results: Dict[int, GeneralInfoResponse]
+    errors: Dict[int, str]
+
+class BatchOwnershipResponse(BaseModel):
+    results: Dict[int, OwnershipResponse]
+    errors: Dict[int, str]
+
+class BatchKeyIndividualsResponse(BaseModel):
+    results: Dict[int, KeyIndividualsResponse]
+    errors: Dict[int, str]
+#####
+
+# Bulk name resolution: one NDJSON line per input row
+class NameCandidate(BaseModel):
+    company_name: str
+    cvr_number: int
+    score: Optional[float] = None
+
+class NameResolutionResult(BaseModel):
+    row: int
+    name: str
+    normalized_name: str
+    cvr_number: Optional[int] = None
+    company_name: Optional[str] = None
+    score: Optional[float] = None
+    candidates: List[NameCandidate]
+    error: Optional[str] = None
+
+#Input (fuzzy name matching)
+class NameMatchRequest(BaseModel):
+    name: str
+    top_k: Optional[int] = None
+
+#Output (`source` is "local" for the fuzzy matcher, "upstream" for ElasticSearch relevance scores)
+class NameMatchResponse(BaseModel):
+    name: str
+    normalized_name: str
+    source: Literal["local", "upstream"]
+    candidates: List[NameCandidate]
+#####
+
 #PDF Download
 class PDFDownloadRequest(BaseModel):
     cvr_id: int
+    locale: Literal["en", "da"] = "en"
+    use_cache: bool = True
 
 class PDFDownloadResponse(BaseModel):
     file_name: str
     file_path: str
     message: str
 
-    
-#Doesn't work part starts here
-    ###
-    ###
-    ###
-    
+class PDFBundleRequest(BaseModel):
+    cvr_ids: List[int]
+    locale: Literal["en", "da"] = "en"
+
+class PDFJobResponse(BaseModel):
+    job_id: str
+    cvr_id: int
+    locale: str
+    priority: int
+    state: str  # queued, running, done or failed
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    file_name: Optional[str] = None
+    file_url: Optional[str] = None
+    error: Optional[str] = None
+
+
 #Person
 class PersonRequest(BaseModel):
-    name: str
+    name: Optional[str] = None
+    unit_number: Optional[int] = None  # `enhedsNummer`, needed when several participants share the name
 
 class PersonAffiliation(BaseModel):
     company_name: str
     role: str
+    cvr_number: Optional[int] = None
+    role_type: Optional[str] = None  # `hovedtype`, e.g. LEDELSESORGAN or REGISTER
 
 class PersonInfoResponse(BaseModel):
     full_name: str
@@ -112,6 +229,7 @@ class PersonInfoResponse(BaseModel):
     postal_code: str
     city: str
     affiliations: List[PersonAffiliation]
+    unit_number: Optional[int] = None
 #####
 
 
@@ -0,0 +1,250 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.services.extractors import extract_participant_roles, participant_name_key
+
+# Seconds the sync checkpoint time is kept in memory by is_current, which every local read calls
+SYNCED_UNTIL_CACHE_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    cvr INTEGER PRIMARY KEY,
+    document BLOB NOT NULL,
+    fields TEXT,
+    updated TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS companies_synced_at ON companies (synced_at);
+CREATE TABLE IF NOT EXISTS participant_roles (
+    unit_number INTEGER,
+    name_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    participant_type TEXT,
+    cvr INTEGER NOT NULL,
+    company_name TEXT,
+    role TEXT,
+    role_type TEXT,
+    address TEXT,
+    postal_code TEXT,
+    city TEXT
+);
+CREATE INDEX IF NOT EXISTS participant_roles_unit ON participant_roles (unit_number);
+CREATE INDEX IF NOT EXISTS participant_roles_name ON participant_roles (name_key);
+CREATE INDEX IF NOT EXISTS participant_roles_cvr ON participant_roles (cvr);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class CompanyStore:
+    """
+    Local SQLite copy of `Vrvirksomhed` documents, filled by the change-feed sync.
+
+    Each row keeps the document, the `_source` paths it was fetched with (NULL for the full
+    document) and its update timestamp. The sync checkpoint and run statistics live in the
+    same file, so a page of documents and the checkpoint after it are committed together
+    and an interrupted sync resumes exactly where it stopped.
+
+    participant_roles is a reverse index from participants (`deltager` unit number and name)
+    to the companies and roles they appear in. It is rewritten for every company in the same
+    transaction as its document, so it always matches the stored documents.
+
+    Args:
+        path (str): SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._synced_until = None
+        self._synced_until_read_at = float("-inf")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        One connection per thread and process; connections are never shared across a fork.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, cvr_id: int):
+        """
+        Returns (fields, company_data) for a stored company, or None.
+        """
+        row = self._connection().execute(
+            "SELECT fields, document FROM companies WHERE cvr = ?", (cvr_id,)).fetchone()
+        if row is None:
+            return None
+        fields, document = row
+        return (json.loads(fields) if fields is not None else None), json.loads(document)
+
+    def iter_names(self, since: float = None):
+        """
+        Yields (cvr, name, status, synced_at) for every company written after `since` (all when None),
+        reading the fields inside SQLite instead of decoding whole documents.
+        """
+        query = (
+            "SELECT cvr, json_extract(CAST(document AS TEXT), '$.virksomhedMetadata.nyesteNavn.navn'), "
+            "json_extract(CAST(document AS TEXT), '$.virksomhedMetadata.sammensatStatus'), synced_at FROM companies"
+        )
+        if since is None:
+            return iter(self._connection().execute(query))
+        return iter(self._connection().execute(query + " WHERE synced_at > ?", (since,)))
+
+    def upsert_many(self, documents: list, fields: list = None, state: dict = None) -> int:
+        """
+        Inserts or replaces company documents in one transaction.
+
+        Args:
+            documents (list): `Vrvirksomhed` documents; each needs its `cvrNummer`.
+            fields (list): `_source` paths the documents were fetched with; None for full documents.
+            state (dict): sync_state values written in the same transaction, e.g. the checkpoint.
+
+        Returns:
+            int: Number of documents written.
+        """
+        encoded_fields = json.dumps(fields) if fields is not None else None
+        rows = [
+            (
+                document["cvrNummer"],
+                json.dumps(document, separators=(",", ":")).encode("utf-8"),
+                encoded_fields,
+                document.get("sidstOpdateret"),
+            )
+            for document in documents
+        ]
+
+        roles = self._participant_rows(documents)
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Taken under the write lock, so synced_at grows in commit order and readers can
+            # pick up every later write with `synced_at > last seen`
+            now = time.time()
+            rows = [row + (now,) for row in rows]
+            connection.executemany(
+                "INSERT OR REPLACE INTO companies (cvr, document, fields, updated, synced_at) VALUES (?, ?, ?, ?, ?)",
+                rows)
+            self._write_participants(connection, [row[0] for row in rows], roles)
+            for name, value in (state or {}).items():
+                self._write_state(connection, name, value)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def _participant_rows(self, documents: list) -> list:
+        return [
+            (role["unit_number"], participant_name_key(role["name"]), role["name"], role["participant_type"],
+             document["cvrNummer"], role["company_name"], role["role"], role["role_type"],
+             role["address"], role["postal_code"], role["city"])
+            for document in documents
+            for role in extract_participant_roles(document)
+        ]
+
+    def _write_participants(self, connection: sqlite3.Connection, cvrs: list, roles: list):
+        connection.executemany("DELETE FROM participant_roles WHERE cvr = ?", [(cvr,) for cvr in cvrs])
+        connection.executemany(
+            "INSERT INTO participant_roles (unit_number, name_key, name, participant_type, cvr, company_name, "
+            "role, role_type, address, postal_code, city) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            roles)
+
+    def participant_roles(self, unit_number: int = None, name: str = None) -> list:
+        """
+        Returns every role of the participant with this unit number, or of every participant with
+        this name (case and spacing ignored), as dicts ordered by company name.
+        """
+        if unit_number is not None:
+            where, value = "unit_number = ?", unit_number
+        elif name:
+            where, value = "name_key = ?", participant_name_key(name)
+        else:
+            raise Exception("A participant name or unit number is required")
+        cursor = self._connection().execute(
+            "SELECT unit_number, name, participant_type, cvr, company_name, role, role_type, address, postal_code, city "
+            f"FROM participant_roles WHERE {where} ORDER BY company_name, cvr, role", (value,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def reindex_participants(self, batch_size: int = 1000) -> int:
+        """
+        Rebuilds participant_roles from the stored documents, for stores synced before the index
+        existed. Returns the number of companies indexed.
+        """
+        connection = self._connection()
+        indexed, last_cvr = 0, -1
+        while True:
+            batch = connection.execute(
+                "SELECT cvr, document FROM companies WHERE cvr > ? ORDER BY cvr LIMIT ?", (last_cvr, batch_size)).fetchall()
+            if not batch:
+                return indexed
+            documents = [json.loads(document) for _, document in batch]
+            roles = self._participant_rows(documents)
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_participants(connection, [cvr for cvr, _ in batch], roles)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            indexed += len(batch)
+            last_cvr = batch[-1][0]
+
+    def get_state(self, name: str, default=None):
+        row = self._connection().execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def set_state(self, name: str, value):
+        self._write_state(self._connection(), name, value)
+
+    def _write_state(self, connection: sqlite3.Connection, name: str, value):
+        if name == "synced_until":
+            self._synced_until_read_at = float("-inf")
+        if value is None:
+            connection.execute("DELETE FROM sync_state WHERE name = ?", (name,))
+        else:
+            connection.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+                               (name, json.dumps(value)))
+
+    def is_current(self, max_lag: float) -> bool:
+        """
+        True if a full sync pass finished within the last max_lag seconds, so a stored document
+        is at most that much behind the register. The checkpoint time is read from SQLite at most
+        once per SYNCED_UNTIL_CACHE_SECONDS.
+        """
+        now = time.monotonic()
+        if now - self._synced_until_read_at >= SYNCED_UNTIL_CACHE_SECONDS:
+            # The sync usually runs in another process, so the value is reread now and then
+            self._synced_until = self.get_state("synced_until")
+            self._synced_until_read_at = now
+        synced_until = self._synced_until
+        return synced_until is not None and time.time() - synced_until <= max_lag
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def stats(self) -> dict:
+        synced_until = self.get_state("synced_until")
+        return {
+            "path": self.path,
+            "companies": self.count(),
+            "participant_roles": self._connection().execute("SELECT COUNT(*) FROM participant_roles").fetchone()[0],
+            "checkpoint": self.get_state("checkpoint"),
+            "synced_until": synced_until,
+            "lag_seconds": round(time.time() - synced_until, 3) if synced_until is not None else None,
+            "last_run": self.get_state("last_run"),
+        }
@@ -0,0 +1,232 @@
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BrowserWorker:
+    """
+    One headless browser together with the directory it initially downloads into.
+    """
+
+    def __init__(self, worker_id: int, driver, download_dir: str):
+        self.id = worker_id
+        self.driver = driver
+        self.download_dir = download_dir
+        self.jobs = 0
+        self.created_at = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        """
+        Checks that the browser process still answers commands.
+        """
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser worker {self.id}: {e}")
+
+
+class BrowserPool:
+    """
+    Bounded pool of browser workers with checkout/checkin.
+
+    Workers are health-checked on checkout and replaced in the background after
+    `max_jobs_per_worker` jobs or whenever a job fails, so one crashed browser never
+    poisons later requests. Concurrent jobs scale with the pool size instead of
+    queueing behind a single browser. Nothing is launched until `start` or the first
+    checkout, so creating a pool is cheap.
+
+    Args:
+        driver_factory (callable): Creates a new WebDriver downloading into the given directory.
+        size (int): Number of browser workers.
+        download_root (str): Directory the browsers initially download into.
+        max_jobs_per_worker (int): Jobs after which a worker is recycled.
+        checkout_timeout (float): Seconds a job may wait for a free worker.
+    """
+
+    def __init__(self, driver_factory, size: int, download_root: str, max_jobs_per_worker: int = 50,
+                 checkout_timeout: float = 120.0):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.download_root = download_root
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = {}
+        self._start_threads = []
+        self.waiting = 0
+        self.checkouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.recycled = 0
+        self.failed_jobs = 0
+        self.health_check_failures = 0
+        self.start_failures = 0
+
+    def start(self, wait: bool = True):
+        """
+        Launches all workers in parallel. Only the first call launches anything.
+
+        Args:
+            wait (bool): Block until the initial workers are started.
+        """
+        with self._lock:
+            launch = not self._start_threads
+            if launch:
+                self._start_threads = [threading.Thread(target=self._add_worker, daemon=True) for _ in range(self.size)]
+        if launch:
+            for thread in self._start_threads:
+                thread.start()
+        if wait:
+            for thread in self._start_threads:
+                thread.join()
+        return self
+
+    @property
+    def started(self) -> bool:
+        return bool(self._start_threads)
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once at least one worker is running.
+        """
+        with self._lock:
+            return bool(self._workers)
+
+    def _add_worker(self):
+        worker_id = next(self._ids)
+        try:
+            # Jobs point the browser at their own directory, so it only starts out in the root
+            worker = BrowserWorker(worker_id, self.driver_factory(self.download_root), self.download_root)
+        except Exception as e:
+            with self._lock:
+                self.start_failures += 1
+            print(f"Error starting browser worker {worker_id}: {e}")
+            return
+
+        with self._lock:
+            if self._closed:
+                worker.quit()
+                return
+            self._workers[worker.id] = worker
+        self._idle.put(worker)
+
+    def _replace_worker(self, worker: BrowserWorker):
+        """
+        Quits a worker and starts its replacement on a background thread.
+        """
+        with self._lock:
+            self._workers.pop(worker.id, None)
+            self.recycled += 1
+        worker.quit()
+        if not self._closed:
+            threading.Thread(target=self._add_worker, daemon=True).start()
+
+    def checkout(self, timeout: float = None) -> BrowserWorker:
+        """
+        Takes a healthy worker out of the pool, waiting up to `timeout` seconds for one.
+        Starts the pool on first use if it has not been warmed up.
+        """
+        self.start(wait=False)
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("Timed out waiting for a free browser worker.")
+                try:
+                    worker = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise Exception("Timed out waiting for a free browser worker.")
+
+                if worker.is_healthy():
+                    break
+                with self._lock:
+                    self.health_check_failures += 1
+                self._replace_worker(worker)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return worker
+
+    def checkin(self, worker: BrowserWorker, failed: bool = False):
+        """
+        Returns a worker to the pool, recycling it after a failure or once it reached its job limit.
+        """
+        worker.jobs += 1
+        if failed:
+            with self._lock:
+                self.failed_jobs += 1
+        if failed or worker.jobs >= self.max_jobs_per_worker or self._closed:
+            self._replace_worker(worker)
+        else:
+            self._idle.put(worker)
+
+    @contextmanager
+    def worker(self, timeout: float = None):
+        """
+        Context manager around checkout/checkin; an exception inside the block recycles the worker.
+        """
+        worker = self.checkout(timeout)
+        failed = False
+        try:
+            yield worker
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.checkin(worker, failed)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "started": bool(self._start_threads),
+                "size": self.size,
+                "workers": len(self._workers),
+                "idle": self._idle.qsize(),
+                "busy": max(len(self._workers) - self._idle.qsize(), 0),
+                "queue_depth": self.waiting,
+                "checkouts": self.checkouts,
+                "average_wait_seconds": round(self.total_wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 6),
+                "recycled": self.recycled,
+                "failed_jobs": self.failed_jobs,
+                "health_check_failures": self.health_check_failures,
+                "start_failures": self.start_failures,
+            }
+
+    def close(self):
+        """
+        Quits every idle worker; busy workers are quit when they are checked in.
+        """
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._workers.pop(worker.id, None)
+            worker.quit()
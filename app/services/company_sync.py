@@ -0,0 +1,183 @@
+"""
+Incremental change-feed sync of company documents into the local CompanyStore.
+
+Each run asks the register only for companies whose update timestamp is at or after the
+stored checkpoint, paging with search_after over (timestamp, cvrNummer), and upserts every
+page together with the checkpoint after it. Upstream load is therefore proportional to the
+churn in the register, and an interrupted run resumes from its last committed page.
+
+The store also keeps a reverse index of participants to their companies and roles, written
+with every page. --reindex-participants rebuilds it from the stored documents, for stores
+synced before the index existed.
+
+Usage:
+    python -m app.services.company_sync [--max-pages N] [--page-size N] [--reset] [--interval SECONDS]
+    python -m app.services.company_sync --reindex-participants
+"""
+import argparse
+import time
+
+from app.config import Settings
+from app.repositories.company_store import CompanyStore
+from app.services import extractors
+from app.services.cvr_client import CVRClient
+from dotenv import load_dotenv
+
+# Paths kept for every synced company: everything the dossier extractors read, plus the
+# identifiers and timestamps of the company and its participants
+SYNC_FIELDS = extractors.merge_fields(
+    extractors.GENERAL_INFO_FIELDS,
+    extractors.PARTICIPANT_FIELDS,
+    [
+        "Vrvirksomhed.enhedsNummer",
+        "Vrvirksomhed.sidstOpdateret",
+        "Vrvirksomhed.sidstIndlaest",
+        "Vrvirksomhed.deltagerRelation.deltager.enhedsNummer",
+        "Vrvirksomhed.deltagerRelation.deltager.forretningsnoegle",
+    ],
+)
+
+
+class CompanySync:
+    """
+    Pulls changed companies from the CVR register into a CompanyStore.
+
+    Args:
+        store (CompanyStore): Destination of the documents and the checkpoint.
+        client (CVRClient): Upstream client.
+        page_size (int): Documents per search_after page.
+        timestamp_field (str): Document timestamp the feed is ordered by.
+        fields (list): `_source` paths to sync; None syncs full documents.
+    """
+
+    def __init__(self, store: CompanyStore, client: CVRClient, page_size: int = 500,
+                 timestamp_field: str = "Vrvirksomhed.sidstIndlaest", fields: list = SYNC_FIELDS):
+        self.store = store
+        self.client = client
+        self.page_size = page_size
+        self.timestamp_field = timestamp_field
+        self.fields = fields
+
+    def _changes_query(self, checkpoint: list) -> dict:
+        query = {
+            "size": self.page_size,
+            "query": {"match_all": {}},
+            # cvrNummer breaks ties between companies updated at the same instant
+            "sort": [{self.timestamp_field: "asc"}, {"Vrvirksomhed.cvrNummer": "asc"}],
+        }
+        if checkpoint:
+            query["query"] = {"range": {self.timestamp_field: {"gte": checkpoint[0]}}}
+            query["search_after"] = checkpoint
+        if self.fields is not None:
+            query["_source"] = {"includes": self.fields}
+        return query
+
+    def run(self, max_pages: int = None) -> dict:
+        """
+        Syncs changed companies until the feed is exhausted or max_pages pages were stored.
+
+        Returns:
+            dict: Throughput statistics of the run, also kept in the store as `last_run`.
+        """
+        started_at = time.time()
+        checkpoint = self.store.get_state("checkpoint")
+        pages = documents = 0
+        fetch_seconds = write_seconds = 0.0
+        complete = False
+
+        while max_pages is None or pages < max_pages:
+            start = time.perf_counter()
+            data = self.client.search(self._changes_query(checkpoint))
+            fetched = time.perf_counter()
+            hits = data['hits']['hits']
+            if not hits:
+                complete = True
+                break
+
+            checkpoint = hits[-1]['sort']
+            documents += self.store.upsert_many(
+                [hit['_source']['Vrvirksomhed'] for hit in hits], self.fields, {"checkpoint": checkpoint})
+            pages += 1
+            fetch_seconds += fetched - start
+            write_seconds += time.perf_counter() - fetched
+            if len(hits) < self.page_size:
+                complete = True
+                break
+
+        elapsed = time.time() - started_at
+        run = {
+            "started_at": started_at,
+            "seconds": round(elapsed, 3),
+            "pages": pages,
+            "documents": documents,
+            "documents_per_second": round(documents / elapsed, 1) if elapsed > 0 else 0.0,
+            "fetch_seconds": round(fetch_seconds, 3),
+            "write_seconds": round(write_seconds, 3),
+            "complete": complete,
+            "checkpoint": checkpoint,
+        }
+        self.store.set_state("last_run", run)
+        if complete:
+            # Every change made before this run started is now in the store
+            self.store.set_state("synced_until", started_at)
+        return run
+
+    def reset(self):
+        """
+        Forgets the checkpoint, so the next run pulls every company again.
+        """
+        self.store.set_state("checkpoint", None)
+        self.store.set_state("synced_until", None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-pages", type=int, default=None, help="Stop after this many pages")
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and resync everything")
+    parser.add_argument("--interval", type=float, default=0.0, help="Keep running, syncing every N seconds")
+    parser.add_argument("--reindex-participants", action="store_true",
+                        help="Rebuild the participant index from the stored documents and exit")
+    args = parser.parse_args()
+
+    load_dotenv()
+    settings = Settings()
+    if args.reindex_participants:
+        start = time.perf_counter()
+        indexed = CompanyStore(settings.CVR_STORE_PATH).reindex_participants()
+        print(f"Indexed the participants of {indexed} companies in {time.perf_counter() - start:.1f} s")
+        return
+
+    client = CVRClient(
+        base_url=settings.CVR_API_URL,
+        auth=(settings.CVR_API_USERNAME, settings.CVR_API_PASSWORD),
+        connect_timeout=settings.CVR_HTTP_CONNECT_TIMEOUT,
+        read_timeout=settings.CVR_HTTP_READ_TIMEOUT,
+    )
+    sync = CompanySync(
+        CompanyStore(settings.CVR_STORE_PATH),
+        client,
+        page_size=args.page_size or settings.CVR_SYNC_PAGE_SIZE,
+        timestamp_field=settings.CVR_SYNC_TIMESTAMP_FIELD,
+        fields=None if settings.CVR_SYNC_FULL_DOCUMENTS else SYNC_FIELDS,
+    )
+    if args.reset:
+        sync.reset()
+
+    while True:
+        try:
+            run = sync.run(max_pages=args.max_pages)
+            print(f"Synced {run['documents']} companies in {run['pages']} pages, {run['seconds']} s "
+                  f"({run['documents_per_second']} companies/s), complete: {run['complete']}")
+        except Exception as e:
+            print(f"Company sync failed: {e}")
+            if not args.interval:
+                raise
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
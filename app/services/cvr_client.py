@@ -0,0 +1,341 @@
+import json
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+MSEARCH_HEADERS = {"Content-Type": "application/x-ndjson"}
+# Connections per httpx pool of the async client; larger pools spend more CPU on bookkeeping
+POOL_SHARD_CONNECTIONS = 16
+
+
+def msearch_url(search_url: str) -> str:
+    """
+    Derives the `_msearch` endpoint from the configured `_search` URL of the index.
+    """
+    base, _, _ = search_url.rstrip("/").rpartition("/_search")
+    return f"{base or search_url.rstrip('/')}/_msearch"
+
+
+def msearch_body(queries: list) -> bytes:
+    """
+    Encodes queries as the NDJSON header/body pairs expected by `_msearch`.
+    """
+    lines = []
+    for query in queries:
+        lines.append("{}")
+        lines.append(json.dumps(query))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class PoolMetrics:
+    """
+    Thread-safe counters describing how the upstream connection pool is used.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.bytes_received = 0
+        self.parse_seconds = 0.0
+
+    def record_new_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_checkout(self, waited: bool, wait_seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds += wait_seconds
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_response(self, size: int, parse_seconds: float):
+        with self._lock:
+            self.bytes_received += size
+            self.parse_seconds += parse_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.checkouts - self.connections_opened, 0),
+                "requests_waited_for_connection": self.waits,
+                "total_wait_seconds": round(self.wait_seconds, 6),
+                "bytes_received": self.bytes_received,
+                "total_parse_seconds": round(self.parse_seconds, 6),
+            }
+
+
+def _metered_pool_class(pool_class, metrics: PoolMetrics):
+    """
+    Builds a urllib3 connection pool subclass that reports to the given metrics object.
+    """
+
+    class MeteredConnectionPool(pool_class):
+        def _new_conn(self):
+            metrics.record_new_connection()
+            return super()._new_conn()
+
+        def _get_conn(self, timeout=None):
+            # An empty queue means every slot is checked out, so a blocking pool has to wait
+            waited = bool(self.block and self.pool is not None and self.pool.empty())
+            start = time.perf_counter()
+            conn = super()._get_conn(timeout=timeout)
+            metrics.record_checkout(waited, time.perf_counter() - start)
+            return conn
+
+    return MeteredConnectionPool
+
+
+class MeteredHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools count opened, reused and waited-for connections.
+    """
+
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _metered_pool_class(HTTPConnectionPool, self.metrics),
+            "https": _metered_pool_class(HTTPSConnectionPool, self.metrics),
+        }
+
+    def idle_connections(self) -> int:
+        """
+        Number of open connections currently parked in the pools and ready for reuse.
+        """
+        idle = 0
+        for key in list(self.poolmanager.pools.keys()):
+            pool = self.poolmanager.pools.get(key)
+            if pool is not None and pool.pool is not None:
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return idle
+
+
+class CVRClient:
+    """
+    Keep-alive HTTP client for the CVR ElasticSearch endpoint.
+
+    All upstream calls made by CVRService go through one requests.Session, so TCP and TLS
+    connections are reused between requests instead of being re-established for every query.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: tuple,
+        pool_connections: int = 10,
+        pool_maxsize: int = 20,
+        pool_block: bool = True,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+    ):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = PoolMetrics()
+
+        self.adapter = MeteredHTTPAdapter(
+            self.metrics,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def search(self, query: dict, timeout: tuple = None) -> dict:
+        """
+        Sends a query to the search endpoint and returns the decoded JSON response.
+
+        Args:
+            query (dict): The ElasticSearch query body.
+            timeout (tuple): Optional (connect, read) timeout overriding the client default.
+        """
+        return self._post(self.base_url, query, timeout)
+
+    def msearch(self, queries: list, timeout: tuple = None) -> list:
+        """
+        Sends several queries in one `_msearch` round trip and returns one response per query.
+        Failed sub-queries are returned as dicts with an "error" key.
+        """
+        data = self._post(msearch_url(self.base_url), None, timeout, content=msearch_body(queries))
+        return data.get("responses", [])
+
+    def _post(self, url: str, body: dict, timeout: tuple = None, content: bytes = None) -> dict:
+        self.metrics.record_request()
+        try:
+            if content is not None:
+                response = self.session.post(url, data=content, headers=MSEARCH_HEADERS, timeout=timeout or self.timeout)
+            else:
+                response = self.session.post(url, json=body, timeout=timeout or self.timeout)
+        except requests.exceptions.Timeout as e:
+            raise Exception(f"ElasticSearch query timed out: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"ElasticSearch request failed: {str(e)}")
+
+        if response.status_code != 200:
+            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
+
+        # Payload size and decode time are the main latency drivers, so both are tracked
+        raw = response.content
+        start = time.perf_counter()
+        data = json.loads(raw)
+        self.metrics.record_response(len(raw), time.perf_counter() - start)
+        return data
+
+    def pool_metrics(self) -> dict:
+        """
+        Returns connection pool statistics for monitoring.
+        """
+        metrics = self.metrics.snapshot()
+        metrics["connections_idle"] = self.adapter.idle_connections()
+        return metrics
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncCVRClient:
+    """
+    asyncio-native HTTP client for the CVR ElasticSearch endpoint, backed by httpx.AsyncClient.
+
+    The underlying client is created lazily inside the running event loop and keeps
+    connections alive between requests, so hundreds of queries can be in flight at once.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: tuple,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+    ):
+        self.base_url = base_url
+        self.auth = auth
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        # httpcore scans every connection of a pool for every idle connection each time a request
+        # starts or ends, which is quadratic in the pool size. The connections are therefore split
+        # over several small pools, and each request goes to the pool with the fewest in flight.
+        shards = max(1, -(-max_connections // POOL_SHARD_CONNECTIONS))
+        self._shard_limits = httpx.Limits(
+            max_connections=-(-max_connections // shards),
+            max_keepalive_connections=-(-max_keepalive_connections // shards),
+        )
+        # The pool timeout bounds how long a request may wait for a free connection
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout)
+        self._clients = [None] * shards
+        self._shard_in_flight = [0] * shards
+        self._ssl_context = None  # Loading the CA bundle costs ~40 ms of CPU, so the pools share one context
+        self._requests = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._bytes_received = 0
+        self._parse_seconds = 0.0
+
+    def _get_client(self, shard: int) -> httpx.AsyncClient:
+        client = self._clients[shard]
+        if client is None or client.is_closed:
+            if self._ssl_context is None:
+                self._ssl_context = httpx.create_ssl_context()
+            client = self._clients[shard] = httpx.AsyncClient(
+                auth=self.auth, limits=self._shard_limits, timeout=self.timeout, verify=self._ssl_context
+            )
+        return client
+
+    async def search(self, query: dict, timeout: tuple = None) -> dict:
+        """
+        Sends a query to the search endpoint and returns the decoded JSON response.
+
+        Args:
+            query (dict): The ElasticSearch query body.
+            timeout (tuple): Optional (connect, read) timeout overriding the client default.
+        """
+        return await self._post(self.base_url, query, timeout)
+
+    async def msearch(self, queries: list, timeout: tuple = None) -> list:
+        """
+        Sends several queries in one `_msearch` round trip and returns one response per query.
+        Failed sub-queries are returned as dicts with an "error" key.
+        """
+        data = await self._post(msearch_url(self.base_url), None, timeout, content=msearch_body(queries))
+        return data.get("responses", [])
+
+    async def _post(self, url: str, body: dict, timeout: tuple = None, content: bytes = None) -> dict:
+        request_timeout = self.timeout
+        if timeout is not None:
+            request_timeout = httpx.Timeout(timeout[1], connect=timeout[0], pool=timeout[1])
+
+        shard = self._shard_in_flight.index(min(self._shard_in_flight))
+        self._requests += 1
+        self._in_flight += 1
+        self._shard_in_flight[shard] += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            client = self._get_client(shard)
+            if content is not None:
+                response = await client.post(url, content=content, headers=MSEARCH_HEADERS, timeout=request_timeout)
+            else:
+                response = await client.post(url, json=body, timeout=request_timeout)
+        except httpx.TimeoutException as e:
+            raise Exception(f"ElasticSearch query timed out: {str(e)}")
+        except httpx.HTTPError as e:
+            raise Exception(f"ElasticSearch request failed: {str(e)}")
+        finally:
+            self._in_flight -= 1
+            self._shard_in_flight[shard] -= 1
+
+        if response.status_code != 200:
+            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
+
+        raw = response.content
+        start = time.perf_counter()
+        data = json.loads(raw)
+        self._parse_seconds += time.perf_counter() - start
+        self._bytes_received += len(raw)
+        return data
+
+    def pool_metrics(self) -> dict:
+        """
+        Returns request concurrency statistics for monitoring.
+        """
+        return {
+            "requests": self._requests,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "pools": len(self._clients),
+            "bytes_received": self._bytes_received,
+            "total_parse_seconds": round(self._parse_seconds, 6),
+        }
+
+    async def aclose(self):
+        for shard, client in enumerate(self._clients):
+            if client is not None:
+                await client.aclose()
+                self._clients[shard] = None
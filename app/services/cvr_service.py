@@ -1,12 +1,26 @@
-from pandas import options
-import requests
 from app.config import Settings
+from app.services.cvr_client import CVRClient, AsyncCVRClient
+from app.services.document_cache import DocumentCache
+from app.services.shared_cache import SharedDocumentCache
+from app.repositories.company_store import CompanyStore
+from app.services import extractors
+from app.services.name_resolution import normalize_company_name, name_key
+from app.services.name_index import NameIndex
+from app.services.fuzzy_matcher import FuzzyMatcher, split_legal_form
+from app.services.ownership_graph import build_ownership_graph
+from app.services.single_flight import SingleFlight, AsyncSingleFlight
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+import anyio
+import anyio.to_thread
+import asyncio
+import base64
 import os
 import json
 import re
 
-from app.dtos.cvr_dto import OwnershipResponse, OwnershipInfo
+from app.dtos.cvr_dto import OwnershipResponse
 
 
 # Load environment variables from the .env file
@@ -15,34 +29,190 @@ load_dotenv()
 # Now instantiate settings
 settings = Settings()
 
-class CVRService:
-    def __init__(self):
+# Unique names matched locally per threadpool call when resolving a bulk upload
+LOCAL_MATCH_CHUNK_SIZE = 1000
+# Worker threads the async service uses for blocking document cache calls
+CACHE_THREADS = 1
+
+# Views that can be requested from the company dossier, mapped to their extractor
+# and the `_source` fields that extractor needs
+DOSSIER_SECTIONS = {
+    "general_info": (
+        lambda company_data, cvr_id: extractors.extract_general_info(company_data),
+        extractors.GENERAL_INFO_FIELDS,
+    ),
+    "ownership": (extractors.extract_ownership_info, extractors.OWNERSHIP_FIELDS),
+    "key_individuals": (
+        lambda company_data, cvr_id: extractors.extract_key_individuals(company_data),
+        extractors.KEY_INDIVIDUALS_FIELDS,
+    ),
+    "possible_ownership": (
+        lambda company_data, cvr_id: extractors.extract_possible_ownership_info(company_data),
+        extractors.POSSIBLE_OWNERSHIP_FIELDS,
+    ),
+}
+
+
+def create_document_cache():
+    """
+    Builds the document cache selected by CVR_CACHE_BACKEND.
+    """
+    options = dict(
+        max_entries=settings.CVR_CACHE_MAX_ENTRIES,
+        ttl=settings.CVR_CACHE_TTL,
+        enabled=settings.CVR_CACHE_ENABLED,
+        stale_ttl=settings.CVR_CACHE_STALE_TTL,
+        negative_ttl=settings.CVR_CACHE_NEGATIVE_TTL,
+    )
+    if settings.CVR_CACHE_BACKEND == "memory":
+        return DocumentCache(**options)
+    if settings.CVR_CACHE_BACKEND == "sqlite":
+        return SharedDocumentCache(settings.CVR_CACHE_PATH, serializer=settings.CVR_CACHE_SERIALIZER, **options)
+    raise Exception(f"Unknown cache backend: {settings.CVR_CACHE_BACKEND}. Valid backends: memory, sqlite")
+
+
+# Company documents keyed by CVR number, shared by the sync and async services
+# (and with the sqlite backend, by every worker process on the host)
+document_cache = create_document_cache()
+
+# Current owners extracted per CVR number, so overlapping ownership graphs expand each company once
+ownership_cache = DocumentCache(
+    max_entries=settings.CVR_OWNERSHIP_CACHE_MAX_ENTRIES,
+    ttl=settings.CVR_CACHE_TTL,
+    enabled=settings.CVR_CACHE_ENABLED,
+)
+
+# Local copy of the register kept up to date by app.services.company_sync
+company_store = CompanyStore(settings.CVR_STORE_PATH) if settings.CVR_STORE_ENABLED else None
+
+# Company names of the store, for partial-name searches without the upstream
+name_index = NameIndex() if company_store is not None and settings.CVR_NAME_INDEX_ENABLED else None
+fuzzy_matcher = FuzzyMatcher(settings.CVR_FUZZY_MIN_SIMILARITY) \
+    if company_store is not None and settings.CVR_FUZZY_MATCH_ENABLED else None
+
+
+class _CVRServiceBase:
+    """
+    Query construction and response parsing shared by the sync and async CVR services.
+    Subclasses only decide how the queries are sent to ElasticSearch, and provide
+    _refresh_document, which refetches a stale cache entry without blocking the caller.
+    """
+
+    def __init__(self, cache: DocumentCache = None, store: CompanyStore = None):
         self.base_url = settings.CVR_API_URL
         self.auth = (settings.CVR_API_USERNAME, settings.CVR_API_PASSWORD)
+        self.cache = cache if cache is not None else document_cache
+        self.store = store if store is not None else company_store
+        self.store_hits = 0
+        self.ownership_cache = ownership_cache
+        self.name_index = name_index if self.store is company_store else None
+        self.fuzzy_matcher = fuzzy_matcher if self.store is company_store else None
+
+    def _company_name_query(self, company_name: str) -> dict:
+        return {
+            "query": {
+                "match": {
+                    "Vrvirksomhed.virksomhedMetadata.nyesteNavn.navn": company_name
+                }
+            },
+            "_source": {"includes": ["Vrvirksomhed.cvrNummer"]}
+        }
 
-    def get_cvr_id_by_company_name(self, company_name: str) -> int:
-        """
-        Searches for a company by name and returns its CVR-ID.
-        """
-        query = {
+    def _name_candidates_query(self, company_name: str, top_k: int) -> dict:
+        return {
+            "size": top_k,
             "query": {
                 "match": {
                     "Vrvirksomhed.virksomhedMetadata.nyesteNavn.navn": company_name
                 }
-            }
+            },
+            "_source": {"includes": extractors.COMPANY_HEADER_FIELDS}
         }
 
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
+    def _parse_name_candidates(self, response: dict) -> list:
+        """
+        Turns one `_msearch` sub-response into ranked candidates (company_name, cvr_number, score).
+        """
+        if "error" in response:
+            raise Exception(f"ElasticSearch sub-query failed: {response['error']}")
+        candidates = []
+        for hit in response.get('hits', {}).get('hits', []):
+            company_data = hit['_source']['Vrvirksomhed']
+            candidates.append({
+                "company_name": company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn', 'N/A'),
+                "cvr_number": company_data.get('cvrNummer'),
+                "score": hit.get('_score'),
+            })
+        return candidates
+
+    def _unique_names(self, names: list) -> dict:
+        """
+        Normalizes and deduplicates names. Returns {name key: (query name, input rows)}.
+        """
+        unique = {}
+        for row, name in enumerate(names):
+            key = name_key(name)
+            if not key:
+                continue
+            unique.setdefault(key, (normalize_company_name(name), []))[1].append(row)
+        return unique
 
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
+    def _match_names_locally(self, unique: dict, keys: list, top_k: int) -> tuple:
+        """
+        Returns (local, remaining): local maps the keys the fuzzy matcher resolved confidently to
+        their candidates, remaining lists the other keys, which go to the upstream.
+        """
+        local = {}
+        for key in keys:
+            candidates = self._local_name_match(unique[key][0], top_k)
+            if candidates and candidates[0]["score"] >= settings.CVR_FUZZY_MIN_CONFIDENCE:
+                local[key] = candidates
+        return local, [key for key in keys if key not in local]
+
+    def _name_resolution_rows(self, names: list, query_name: str, rows: list, candidates: list = None, error: str = None):
+        """
+        Expands the result for one unique name into one result per input row.
+        """
+        best = candidates[0] if candidates else {}
+        for row in rows:
+            yield {
+                "row": row,
+                "name": names[row],
+                "normalized_name": query_name,
+                "cvr_number": best.get("cvr_number"),
+                "company_name": best.get("company_name"),
+                "score": best.get("score"),
+                "candidates": candidates or [],
+                "error": error,
+            }
 
-        data = response.json()
+    def _local_name_match(self, name: str, top_k: int):
+        """
+        Ranked candidates from the fuzzy matcher, or None when it is not built yet or the store
+        behind it is out of date.
+        """
+        if self.fuzzy_matcher is None or not self.fuzzy_matcher.ready or not self.store.is_current(settings.CVR_STORE_MAX_LAG):
+            return None
+        return self.fuzzy_matcher.match(name, top_k)
+
+    def _confident_cvr_id(self, company_name: str):
+        """
+        Returns the CVR ID of the best local match if its confidence reaches CVR_FUZZY_MIN_CONFIDENCE.
+        """
+        candidates = self._local_name_match(company_name, 1)
+        if candidates and candidates[0]["score"] >= settings.CVR_FUZZY_MIN_CONFIDENCE:
+            return candidates[0]["cvr_number"]
+        return None
+
+    def _name_match_result(self, name: str, source: str, candidates: list) -> dict:
+        return {
+            "name": name,
+            "normalized_name": split_legal_form(name)[0],
+            "source": source,
+            "candidates": candidates,
+        }
 
+    def _parse_cvr_id(self, data: dict) -> int:
         try:
             cvr_id = data['hits']['hits'][0]['_source']['Vrvirksomhed']['cvrNummer']
             print("CVR number of company:", cvr_id)
@@ -52,64 +222,74 @@ class CVRService:
         except Exception as e:
             raise Exception(f"An error occurred while parsing the CVR response: {str(e)}")
 
-    def get_companies_by_partial_name(self, partial_name: str) -> list:
-        """
-        Searches for companies by partial name and returns a list of full company names and CVR numbers.
-        """
-        # Initial query to get the total number of hits
+    def _partial_name_query(self, partial_name: str, size: int, search_after: list = None) -> dict:
         query = {
-            "size": 0,  # Set to 0 initially to only get the total count
+            "size": size,
             "query": {
                 "match_phrase_prefix": {
                     "Vrvirksomhed.virksomhedMetadata.nyesteNavn.navn": partial_name
                 }
-            }
+            },
+            "_source": {"includes": extractors.COMPANY_HEADER_FIELDS},
+            # A unique sort key lets search_after page through any number of hits
+            "sort": [{"Vrvirksomhed.cvrNummer": "asc"}]
         }
+        if search_after:
+            query["search_after"] = search_after
+        return query
 
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
+    def _encode_cursor(self, sort_values: list) -> str:
+        return base64.urlsafe_b64encode(json.dumps(sort_values).encode("utf-8")).decode("ascii")
 
-        data = response.json()
+    def _decode_cursor(self, cursor: str) -> list:
+        try:
+            sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except Exception:
+            raise Exception("Invalid cursor")
+        if not isinstance(sort_values, list):
+            raise Exception("Invalid cursor")
+        return sort_values
+
+    def _parse_company_page(self, data: dict, limit: int) -> dict:
+        """
+        Turns a search_after page fetched with size limit + 1 into results and the cursor of the next page.
+        """
+        hits = data['hits']['hits']
+        page = {"hits": {"hits": hits[:limit]}}
+        next_cursor = self._encode_cursor(hits[limit - 1]['sort']) if len(hits) > limit else None
+        return {
+            "total_results": self._parse_total_hits(data),
+            "results": self._parse_companies(page),
+            "next_cursor": next_cursor,
+        }
 
+    def _local_name_page(self, partial_name: str, limit: int, search_after: list):
+        """
+        Answers a partial-name page from the name index, or returns None when it is not built
+        yet or the store behind it is out of date.
+        """
+        if self.name_index is None or not self.name_index.ready or not self.store.is_current(settings.CVR_STORE_MAX_LAG):
+            return None
+        page = self.name_index.page(partial_name, limit, search_after)
+        next_search_after = page.pop("next_search_after")
+        page["next_cursor"] = self._encode_cursor(next_search_after) if next_search_after else None
+        return page
+
+    def _local_typeahead(self, prefix: str, limit: int):
+        if self.name_index is None or not self.name_index.ready or not self.store.is_current(settings.CVR_STORE_MAX_LAG):
+            return None
+        return self.name_index.search(prefix, limit)
+
+    def _parse_total_hits(self, data: dict) -> int:
         # Get the total number of hits (matching companies)
         total = data['hits']['total']
 
         # Handle both possible cases: total as an int or total as a dict
         if isinstance(total, dict):
-            total_hits = total['value']  # for newer versions where 'total' is a dict
-        else:
-            total_hits = total  # for older versions where 'total' is an int
-
-        if total_hits == 0:
-            return []  # No matches found
-
-        # Now that we know the total hits, fetch all results
-        query = {
-            "size": total_hits,  # Dynamically fetch all results
-            "query": {
-                "match_phrase_prefix": {
-                    "Vrvirksomhed.virksomhedMetadata.nyesteNavn.navn": partial_name
-                }
-            }
-        }
-
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
-
-        data = response.json()
+            return total['value']  # for newer versions where 'total' is a dict
+        return total  # for older versions where 'total' is an int
 
+    def _parse_companies(self, data: dict) -> list:
         results = []
         try:
             hits = data['hits']['hits']
@@ -125,14 +305,8 @@ class CVRService:
             raise Exception(f"Key error accessing the CVR data: {str(e)}")
         except Exception as e:
             raise Exception(f"An error occurred while parsing the CVR response: {str(e)}")
-        
-        
-    
 
-    def get_general_info_by_cvr_id(self, cvr_id: int) -> dict:
-        """
-        Searches for a company by CVR ID and returns its general information.
-        """
+    def _cvr_id_query(self, cvr_id: int, fields: list = None) -> dict:
         query = {
             "query": {
                 "match": {
@@ -140,618 +314,545 @@ class CVRService:
                 }
             }
         }
+        if fields is not None:
+            query["_source"] = {"includes": fields}
+        return query
 
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
-
-        data = response.json()
-
-        total_hits = data['hits']['total']
-        if isinstance(total_hits, dict):
-            total_hits = total_hits.get('value', 0)
-        elif isinstance(total_hits, int):
-            total_hits = total_hits
-        else:
-            raise Exception("Unexpected format for total hits")
-
-        if total_hits == 0:
-            raise Exception(f"No company found with CVR ID: {cvr_id}")
-
-        try:
-            company_data = data['hits']['hits'][0]['_source']['Vrvirksomhed']
-
-            # Extract the business type (correct field for business type)
-            virksomhed_metadata = company_data.get('virksomhedMetadata', {})
-            business_type_data = virksomhed_metadata.get('nyesteVirksomhedsform', {})
-            business_type = business_type_data.get('langBeskrivelse', 'Anpartsselskab')
-
-            # Handle beliggenhedsadresse, which might be a list
-            beliggenhedsadresse = company_data.get('beliggenhedsadresse', [])
-            if isinstance(beliggenhedsadresse, list) and beliggenhedsadresse:
-                beliggenhedsadresse = beliggenhedsadresse[-1]  # Take the first entry
-            
-            # Extract advertising protection
-            advertising_protection = "Yes" if company_data.get('reklamebeskyttet', False) else "No"    
-
-            # Extract general information
-            general_info = {
-                "company_name": virksomhed_metadata.get('nyesteNavn', {}).get('navn', 'N/A'),
-                "cvr_number": company_data.get('cvrNummer', 'N/A'),
-                "address": self._format_address(beliggenhedsadresse),
-                "postal_code": str(beliggenhedsadresse.get('postnummer', 'N/A')),
-                "city": beliggenhedsadresse.get('postdistrikt', 'N/A'),
-                "start_date": virksomhed_metadata.get('stiftelsesDato', 'N/A'),
-                "business_type": business_type,
-                "advertising_protection": advertising_protection,
-                "status": virksomhed_metadata.get('sammensatStatus', 'Normal')
-            }
-
-            return general_info
-
-        except KeyError as e:
-            raise Exception(f"Key error accessing the company data: {str(e)}")
-        except Exception as e:
-            raise Exception(f"An error occurred while parsing the company data: {str(e)}")
-
-
-
-
-    def _format_address(self, address_data: dict) -> str:
-        """
-        Helper method to format the company address.
+    def _cached_document(self, cvr_id: int, fields: list, use_cache: bool):
         """
-        # Handle lists properly and ensure safe access to address fields
-        if isinstance(address_data, list) and address_data:
-            address_data = address_data[0]  # Take the first entry if it’s a list
-
-        vejnavn = str(address_data.get('vejnavn', 'N/A')).strip()  # Convert to string and strip
-        husnummer = str(address_data.get('husnummerFra', '')).strip()  # Convert to string and strip
-        postnummer = str(address_data.get('postnummer', 'N/A')).strip()  # Convert to string and strip
-        postdistrikt = str(address_data.get('postdistrikt', 'N/A')).strip()  # Convert to string and strip
-        kommune = str(address_data.get('kommune', {}).get('navn', '')).strip()  # Convert to string and strip
-
-        # Combine address parts
-        address_parts = [vejnavn, husnummer, postnummer, postdistrikt, kommune]
-        formatted_address = ', '.join(part for part in address_parts if part)
-
-        return formatted_address if formatted_address else "N/A"
-
-
-
+        Looks the company up in the document cache.
 
-
-
-    def get_possible_ownership_info_by_cvr_id(self, cvr_id: int) -> dict:
+        Returns (company_data, fields_to_fetch). company_data is None when the cache holds no entry
+        with all requested fields; fields_to_fetch then merges the request with whatever is cached,
+        so the refreshed entry keeps serving the other extractors. A stale entry is still returned,
+        and a background refresh of it is started. On a cache miss the local company store is
+        tried before the upstream.
         """
-        Searches for a company by CVR ID and returns its possible legal and beneficial ownership information.
+        if use_cache:
+            entry = self.cache.lookup(cvr_id, accept=lambda cached: extractors.fields_cover(cached[0], fields))
+            if entry is not None:
+                (cached_fields, company_data), stale = entry
+                if stale and self.cache.begin_refresh(cvr_id):
+                    self._refresh_document(cvr_id, cached_fields)
+                return company_data, None
+
+            company_data = self._stored_document(cvr_id, fields)
+            if company_data is not None:
+                return company_data, None
+
+        cached = self.cache.peek(cvr_id)
+        if cached is not None:
+            return None, extractors.merge_fields(cached[0], fields)
+        return None, fields
+
+    def _store_document(self, cvr_id: int, fields: list, company_data: dict):
+        self.cache.set(cvr_id, (fields, company_data))
+
+    def _stored_document(self, cvr_id: int, fields: list):
         """
-        query = {
-            "query": {
-                "match": {
-                    "Vrvirksomhed.cvrNummer": cvr_id
-                }
-            }
-        }
-
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
-
-        data = response.json()
-        
-        try:
-            hits = data.get('hits', {}).get('hits', [])
-            if not hits:
-                raise ValueError("No hits found in response")
-
-            company_data = hits[0].get('_source', {}).get('Vrvirksomhed', {})
-            company_name = company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn', 'N/A')
-            cvr_number = company_data.get('cvrNummer', 'N/A')
-            possible_legal_owners, possible_beneficial_owners = [], []
-
-            # Extract possible ownership data
-            participant_relations = company_data.get('deltagerRelation', [])
-            organization_indicators = {"A/S", "ApS", "Inc.", "LLC", "S.A.", "P/S", "Ltd.", "I/S", "INC."}
-
-            for relation in participant_relations:
-                if relation is None or relation.get('deltager') is None:
-                    continue
-
-                deltagertype = relation.get('deltager', {}).get('enhedstype', "")
-                navne_list = relation.get('deltager', {}).get('navne', [])
-                for navn_entry in navne_list:
-                    owner_name = navn_entry.get('navn', "Unknown")
-                    
-                    if any(indicator in owner_name for indicator in organization_indicators) or deltagertype == "VIRKSOMHED":
-                        possible_legal_owners.append(owner_name)
-                    else:
-                        possible_beneficial_owners.append(owner_name)
-
-            result = {
-                "cvr_number": cvr_number,
-                "company_name": company_name,
-                "possible_legal_owners": list(dict.fromkeys(possible_legal_owners)),
-                "possible_beneficial_owners": list(dict.fromkeys(possible_beneficial_owners))
-            }
-            return result
-
-        except Exception as e:
-            raise Exception(f"An error occurred while parsing the company data: {str(e)}")
-
-
-
-
-
-
-    def get_key_individuals_by_cvr_id(self, cvr_id: int) -> dict:
+        Returns the company from the local store if it was synced recently and holds the requested fields.
         """
-        Searches for a company by CVR ID and returns key individuals like Management,
-        Board of Directors, Founders, and Fully Liable Partners.
+        if self.store is None or not self.store.is_current(settings.CVR_STORE_MAX_LAG):
+            return None
+        entry = self.store.get(cvr_id)
+        if entry is None or not extractors.fields_cover(entry[0], fields):
+            return None
+        self.store_hits += 1
+        self._store_document(cvr_id, *entry)
+        return entry[1]
+
+    def _check_not_found(self, cvr_id: int, use_cache: bool):
         """
-        query = {
-            "query": {
-                "match": {
-                    "Vrvirksomhed.cvrNummer": cvr_id
-                }
-            }
-        }
-
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
-
-        data = response.json()
-        hits = data.get('hits', {}).get('hits', [])
-
-        if not hits:
-            raise ValueError("No hits found for the provided CVR ID")
-
-        company_data = hits[0].get('_source', {}).get('Vrvirksomhed', {})
+        Raises the remembered error for a CVR ID the register recently did not know.
+        """
+        if use_cache:
+            message = self.cache.get_negative(cvr_id)
+            if message is not None:
+                raise Exception(message)
 
-        key_individuals = {
-            "management": [],
-            "board_of_directors": [],
-            "founders": [],
-            "fully_liable_partners": []
-        }
+    def _record_not_found(self, cvr_id: int) -> str:
+        message = f"No company found with CVR ID: {cvr_id}"
+        self.cache.set_negative(cvr_id, message)
+        return message
 
-        # Look for key individual roles in `deltagerRelation`
-        ledelsesorgan_data = company_data.get('deltagerRelation', [])
-        for entry in ledelsesorgan_data:
-            organisations = entry.get('organisationer', [])
-            for org in organisations:
-                hovedtype = org.get('hovedtype', None)
-                
-                # Skip unwanted hovedtype values
-                if hovedtype not in ["LEDELSESORGAN", "STIFTERE", "FULDT_ANSVARLIG_DELTAGERE"]:
-                    print(f"Skipping hovedtype: {hovedtype}")  # Log for debugging
-                    continue
-                       
-                # Set role name and extract name and address details
-                role_name = org.get('organisationsNavn', [{}])[0].get('navn', 'Unknown') if org.get('organisationsNavn') else 'Unknown'
-                individuals = entry.get('deltager', {}).get('navne', [{}])[0].get('navn', 'Unknown') if entry.get('deltager', {}).get('navne') else 'Unknown'
-
-                # Check for secret address
-                if entry.get('deltager', {}).get('adresseHemmelig', False):
-                    address = "Secret Address"
-                else:
-                    # Extract address based on the available fields
-                    beliggenhedsadresse = entry.get('deltager', {}).get('beliggenhedsadresse', [])
-                    address = "Unknown address"
-                    if beliggenhedsadresse and isinstance(beliggenhedsadresse, list):
-                        address_data = beliggenhedsadresse[0] if beliggenhedsadresse[0] is not None else {}
-                        if address_data.get('fritekst'):
-                            # Handle multi-line addresses in `fritekst`
-                            address = address_data['fritekst'].replace('\n', ', ').strip()
-                        else:
-                            # Safely get each part of the address, avoiding None values
-                            vejnavn = str(address_data.get('vejnavn', '') or '').strip()
-                            husnummer = str(address_data.get('husnummerFra', '') or '').strip()
-                            postnummer = str(address_data.get('postnummer', '') or '').strip()
-                            postdistrikt = str(address_data.get('postdistrikt', '') or '').strip()
-                            kommune = str((address_data.get('kommune') or {}).get('kommuneNavn', '') or '').strip()
-                            landekode = str(address_data.get('landekode', '') or '').strip()
-
-                            # Filter out empty strings and join remaining parts
-                            address_parts = [vejnavn, husnummer, postnummer, postdistrikt, kommune, landekode]
-                            address = ', '.join(part for part in address_parts if part) if any(address_parts) else "Unknown address"
-
-                print("hovedtype:",hovedtype)
-                print("role_name:",role_name)            
-                # Categorize based on the `hovedtype` field
-                if hovedtype == "LEDELSESORGAN":
-                    if role_name == "Bestyrelse":
-                        key_individuals["board_of_directors"].append({"name": individuals, "address": address})
-                    elif role_name == "Direktion":
-                        key_individuals["management"].append({"name": individuals, "address": address})
-                elif hovedtype == "STIFTERE":
-                    key_individuals["founders"].append({"name": individuals, "address": address})
-                elif hovedtype == "FULDT_ANSVARLIG_DELTAGERE":
-                    key_individuals["fully_liable_partners"].append({"name": individuals, "address": address})
-
-        return key_individuals
-
-
-
-
-    def get_ownership_info(self, cvr_id: int) -> OwnershipResponse:
+    def _cvr_ids_query(self, cvr_ids: list, fields: list = None) -> dict:
         query = {
+            "size": len(cvr_ids),
             "query": {
-                "match": {
-                    "Vrvirksomhed.cvrNummer": cvr_id
+                "terms": {
+                    "Vrvirksomhed.cvrNummer": cvr_ids
                 }
             }
         }
+        if fields is not None:
+            query["_source"] = {"includes": fields}
+        return query
 
-        response = requests.post(f"{self.base_url}", auth=self.auth, json=query)
-        if response.status_code != 200:
-            raise Exception(f"Query failed with status code {response.status_code}")
+    def _plan_batch(self, cvr_ids: list, fields: list, use_cache: bool, chunk_size: int):
+        """
+        Splits a batch into cached documents and the upstream `terms` queries needed for the rest.
 
-        data = response.json()
-        company_data = data['hits']['hits'][0]['_source']['Vrvirksomhed']
+        Returns (documents, chunks, errors) where chunks is a list of (cvr_ids, fields_to_fetch) with at
+        most chunk_size IDs each, and errors holds IDs recently found not to exist. IDs whose cache entry
+        holds other fields are grouped by the merged field set.
+        """
+        chunk_size = chunk_size or settings.CVR_BATCH_CHUNK_SIZE
+        documents, misses, errors = {}, {}, {}
+        for cvr_id in dict.fromkeys(cvr_ids):
+            message = self.cache.get_negative(cvr_id) if use_cache else None
+            if message is not None:
+                errors[cvr_id] = message
+                continue
+            company_data, fetch_fields = self._cached_document(cvr_id, fields, use_cache)
+            if company_data is not None:
+                documents[cvr_id] = company_data
+            else:
+                key = tuple(fetch_fields) if fetch_fields is not None else None
+                misses.setdefault(key, []).append(cvr_id)
 
-        legal_owners, beneficial_owners, terminated_owners = [], [], []
+        chunks = []
+        for key, ids in misses.items():
+            fetch_fields = list(key) if key is not None else None
+            for start in range(0, len(ids), chunk_size):
+                chunks.append((ids[start:start + chunk_size], fetch_fields))
+        return documents, chunks, errors
 
-        for relation in company_data.get('deltagerRelation', []):
-            if relation.get('deltager') is None:
+    def _collect_chunk(self, data: dict, cvr_ids: list, fetch_fields: list, documents: dict, errors: dict):
+        """
+        Stores the documents of one `terms` response and records the IDs it did not return.
+        """
+        for hit in data['hits']['hits']:
+            company_data = hit['_source']['Vrvirksomhed']
+            cvr_id = company_data.get('cvrNummer')
+            if cvr_id in cvr_ids:
+                documents[cvr_id] = company_data
+                self._store_document(cvr_id, fetch_fields, company_data)
+
+        for cvr_id in cvr_ids:
+            if cvr_id not in documents:
+                errors[cvr_id] = self._record_not_found(cvr_id)
+
+    def _extract_batch(self, section: str, cvr_ids: list, documents: dict, errors: dict) -> dict:
+        """
+        Runs one extractor over every fetched document, keeping per-ID errors instead of failing the batch.
+        """
+        extractor = DOSSIER_SECTIONS[section][0]
+        results = {}
+        for cvr_id in dict.fromkeys(cvr_ids):
+            if cvr_id not in documents:
                 continue
-            
-            navne = relation.get('deltager', {}).get('navne', [])
-            organisationer = relation.get('organisationer', [])
-
-            owner_name = None
-            for navn_entry in navne:
-                owner_name = navn_entry['navn']  # Get the last name in the sequence
-
-            # Format the owner's address
-            address = self._format_owner_address(relation.get("deltager", {}).get("beliggenhedsadresse", []))
-
-            for org in organisationer:
-                org_name = org.get('organisationsNavn', [{}])[0].get('navn')
-                if org_name == "EJERREGISTER":
-                    owner_type = "Legal"
-                elif org_name == "Reelle ejere":
-                    owner_type = "Beneficial"
-                else:
-                    continue
-
-                # Process ownership attributes
-                ownership_percentage, voting_percentage, start_date, end_date = (
-                    self._get_ownership_details(org)
-                )
-
-                ownership_info = OwnershipInfo(
-                    owner_name=owner_name,
-                    ownership_percentage=ownership_percentage,
-                    voting_percentage=voting_percentage,
-                    ownership_type="Terminated" if end_date else owner_type,
-                    start_date=start_date,
-                    end_date=end_date,
-                    address=address
-                )
-
-                if end_date:  # Classify as terminated if end_date is present
-                    terminated_owners.append(ownership_info)
-                elif owner_type == "Legal":
-                    legal_owners.append(ownership_info)
-                else:
-                    beneficial_owners.append(ownership_info)
-
-        return OwnershipResponse(
-            cvr_number=cvr_id,
-            company_name=company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn', 'N/A'),
-            legal_owners=legal_owners,
-            beneficial_owners=beneficial_owners,
-            terminated_owners=terminated_owners
-        )
-
-    def _format_owner_address(self, address_data: list) -> str:
+            try:
+                results[cvr_id] = extractor(documents[cvr_id], cvr_id)
+            except Exception as e:
+                errors[cvr_id] = str(e)
+        return {"results": results, "errors": errors}
+
+    def _validate_batch(self, section: str, cvr_ids: list, chunk_size: int):
+        if section not in DOSSIER_SECTIONS:
+            raise Exception(f"Unknown batch section: {section}")
+        if len(cvr_ids) > settings.CVR_BATCH_MAX_IDS:
+            raise Exception(f"A batch may contain at most {settings.CVR_BATCH_MAX_IDS} CVR IDs")
+        if chunk_size is not None and not 1 <= chunk_size <= settings.CVR_BATCH_MAX_IDS:
+            raise Exception(f"chunk_size must be between 1 and {settings.CVR_BATCH_MAX_IDS}")
+
+    def _parse_company_document(self, data: dict, cvr_id: int) -> dict:
         """
-        Formats the address for a single owner using available information.
-        If `fritekst` is provided, it uses it directly; otherwise, it constructs the address.
+        Returns the `Vrvirksomhed` document from a CVR ID search response.
         """
-        if not address_data:
-            return "N/A"
-
-        # Use the most recent address (last in list)
-        latest_address = address_data[-1] if address_data else {}
-
-        # Use `fritekst` if available
-        if latest_address.get("fritekst"):
-            formatted_address = latest_address["fritekst"].replace("\n", ", ").strip()
-        else:
-            # Construct address manually if `fritekst` is not available
-            vejnavn = str(latest_address.get("vejnavn") or "").strip()
-            husnummer = str(latest_address.get("husnummerFra") or "").strip()
-            bogstav = str(latest_address.get("bogstavFra") or "").strip()
-            etage = str(latest_address.get("etage") or "").strip()
-            sidedoer = str(latest_address.get("sidedoer") or "").strip()
-            postnummer = str(latest_address.get("postnummer") or "").strip()
-            postdistrikt = str(latest_address.get("postdistrikt") or "").strip()
-            
-            kommune = str(latest_address.get("kommune", {}).get("kommuneNavn") or "").strip() \
-                if isinstance(latest_address.get("kommune"), dict) else ""
-            
-            address_parts = [
-                vejnavn,
-                f"{husnummer}{bogstav}" if husnummer or bogstav else "",
-                etage,
-                sidedoer,
-                f"{postnummer} {postdistrikt}".strip() if postnummer or postdistrikt else "",
-                kommune
-            ]
+        total_hits = data['hits']['total']
+        if isinstance(total_hits, dict):
+            total_hits = total_hits.get('value', 0)
+        elif not isinstance(total_hits, int):
+            raise Exception("Unexpected format for total hits")
 
-            formatted_address = ', '.join(part for part in address_parts if part) if address_parts else "N/A"
+        hits = data['hits']['hits']
+        if total_hits == 0 or not hits:
+            raise Exception(self._record_not_found(cvr_id))
 
-        # Append the country code if available
-        landekode = latest_address.get("landekode")
-        if landekode:
-            formatted_address = f"{formatted_address}, {landekode}"
+        return hits[0]['_source']['Vrvirksomhed']
 
-        return formatted_address if formatted_address else "N/A"
+    def _resolve_sections(self, sections: list) -> list:
+        """
+        Validates the requested dossier sections. No sections means all of them.
+        """
+        if not sections:
+            return list(DOSSIER_SECTIONS)
 
+        unknown = [section for section in sections if section not in DOSSIER_SECTIONS]
+        if unknown:
+            raise Exception(f"Unknown dossier section(s): {', '.join(unknown)}. Valid sections: {', '.join(DOSSIER_SECTIONS)}")
+        return list(dict.fromkeys(sections))
 
+    def _dossier_fields(self, sections: list) -> list:
+        section_fields = [DOSSIER_SECTIONS[section][1] for section in sections]
+        return extractors.merge_fields(extractors.COMPANY_HEADER_FIELDS, *section_fields)
 
+    def _ownership_max_depth(self, max_depth: int) -> int:
+        max_depth = settings.CVR_OWNERSHIP_MAX_DEPTH if max_depth is None else max_depth
+        if not 1 <= max_depth <= settings.CVR_OWNERSHIP_MAX_DEPTH:
+            raise Exception(f"max_depth must be between 1 and {settings.CVR_OWNERSHIP_MAX_DEPTH}")
+        return max_depth
 
-    def _get_ownership_details(self, organisation):
+    def _ownership_level(self, frontier: list, companies: dict, depth: int, max_depth: int) -> tuple:
         """
-        Extracts ownership details including ownership percentage, voting percentage,
-        start date, and end date (for terminated owners).
+        Returns (level, truncated): the frontier companies to expand at this depth, within max_depth
+        and CVR_OWNERSHIP_MAX_COMPANIES, and whether any of the frontier was left out.
         """
-        ownership_percentage = voting_percentage = start_date = end_date = None
+        if depth >= max_depth:
+            return [], bool(frontier)
+        budget = max(settings.CVR_OWNERSHIP_MAX_COMPANIES - len(companies), 0)
+        return frontier[:budget], len(frontier) > budget
 
-        for medlemsData in organisation.get("medlemsData", []):
-            for attr in medlemsData.get("attributter", []):
-                if attr["type"] == "EJERANDEL_PROCENT":
-                    for value in attr["vaerdier"]:
-                        # Capture ownership percentage, start date, and end date
-                        ownership_percentage = value["vaerdi"]
-                        start_date = value["periode"].get("gyldigFra")
-                        end_date = value["periode"].get("gyldigTil")
-                        
-                elif attr["type"] == "EJERANDEL_STEMMERET_PROCENT":
-                    for value in attr["vaerdier"]:
-                        # Capture voting percentage for the corresponding period
-                        if start_date == value["periode"].get("gyldigFra") and end_date == value["periode"].get("gyldigTil"):
-                            voting_percentage = value["vaerdi"]
-
-        return ownership_percentage, voting_percentage, start_date, end_date
-
-   
-
-    def _get_current_attribute_value(self, organisation, attribute_type):
+    def _plan_ownership_level(self, level: list, companies: dict, use_cache: bool) -> list:
         """
-        Helper to fetch a specific attribute value (e.g., 'EJERANDEL_PROCENT') and its start date (gyldigFra)
-        from the organisation data. Only considers the attribute if 'gyldigTil' is null, meaning the owner is current.
+        Fills `companies` from the ownership cache and returns the CVR IDs whose documents are still needed.
         """
-        for medlemsData in organisation.get("medlemsData", []):
-            for attr in medlemsData.get("attributter", []):
-                if attr["type"] == attribute_type:
-                    # Check if 'gyldigTil' is null for current ownership
-                    for value in attr["vaerdier"]:
-                        if value["periode"].get("gyldigTil") is None:
-                            return value["vaerdi"], value["periode"].get("gyldigFra")
-        return None, None  # Return None for both if not found
+        missing = []
+        for cvr_id in level:
+            node = self.ownership_cache.get(cvr_id) if use_cache else None
+            if node is not None:
+                companies[cvr_id] = node
+            else:
+                missing.append(cvr_id)
+        return missing
+
+    def _collect_ownership_level(self, cvr_ids: list, documents: dict, errors: dict, companies: dict):
+        for cvr_id in cvr_ids:
+            company_data = documents.get(cvr_id)
+            if company_data is None:
+                companies[cvr_id] = {"company_name": None, "owners": [], "error": errors.get(cvr_id, "Not found")}
+                continue
+            node = {
+                "company_name": company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn'),
+                "owners": extractors.extract_current_owners(company_data),
+                "error": None,
+            }
+            self.ownership_cache.set(cvr_id, node)
+            companies[cvr_id] = node
 
+    def _ownership_frontier(self, level: list, companies: dict) -> list:
+        """
+        Returns the corporate owners of a level that have not been expanded yet.
+        """
+        return list(dict.fromkeys(
+            owner["cvr_number"]
+            for cvr_id in level
+            for owner in companies[cvr_id]["owners"]
+            if owner["cvr_number"] is not None and owner["cvr_number"] not in companies
+        ))
+
+    def _build_ownership_graph(self, cvr_id: int, companies: dict, truncated: bool) -> dict:
+        error = companies[cvr_id].get("error")
+        if error:
+            raise Exception(error)
+        return build_ownership_graph(cvr_id, companies, truncated)
+
+    def _build_dossier(self, company_data: dict, cvr_id: int, sections: list) -> dict:
+        """
+        Runs only the requested extractors over one already-fetched company document. The
+        participant sections are built together in one pass over `deltagerRelation`.
+        """
+        dossier = {
+            "cvr_number": company_data.get('cvrNummer', cvr_id),
+            "company_name": company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn', 'N/A'),
+        }
+        participant_sections = [section for section in sections if section in extractors.PARTICIPANT_VIEWS]
+        views = extractors.extract_participant_views(company_data, cvr_id, participant_sections) if participant_sections else {}
+        for section in sections:
+            if section in views:
+                dossier[section] = views[section]
+            else:
+                extractor = DOSSIER_SECTIONS[section][0]
+                dossier[section] = extractor(company_data, cvr_id)
+        return dossier
 
 
+class CVRService(_CVRServiceBase):
+    def __init__(self, cache: DocumentCache = None, store: CompanyStore = None):
+        super().__init__(cache, store)
+        self.client = CVRClient(
+            base_url=self.base_url,
+            auth=self.auth,
+            pool_connections=settings.CVR_HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.CVR_HTTP_POOL_MAXSIZE,
+            pool_block=settings.CVR_HTTP_POOL_BLOCK,
+            connect_timeout=settings.CVR_HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.CVR_HTTP_READ_TIMEOUT,
+        )
+        self.single_flight = SingleFlight()
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=settings.CVR_CACHE_REFRESH_WORKERS, thread_name_prefix="cvr-refresh")
 
+    def get_cvr_id_by_company_name(self, company_name: str) -> int:
+        """
+        Searches for a company by name and returns its CVR-ID. A confident local fuzzy match
+        answers without the upstream.
+        """
+        cvr_id = self._confident_cvr_id(company_name)
+        if cvr_id is not None:
+            return cvr_id
+        data = self.client.search(self._company_name_query(company_name))
+        return self._parse_cvr_id(data)
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import os
-import time
-
-class PDFService:
-    def __init__(self):
-        self.base_url = "https://datacvr.virk.dk/gateway/pdf/hentVirksomhedsvisningSomPdf"
-        self.download_dir = os.path.abspath("./downloads")  # Use absolute path for clarity
-        os.makedirs(self.download_dir, exist_ok=True)  # Ensure download directory exists
-        self.driver = None   # make sure attribute always exists
-
-        # Setup Selenium WebDriver with Chrome options
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--headless")  # Headless mode
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.69 Safari/537.36")
-        chrome_options.add_experimental_option("prefs", {
-            "download.default_directory": self.download_dir,
-            "download.prompt_for_download": False,
-            "plugins.always_open_pdf_externally": True,  # Ensure PDFs are downloaded directly
-        })
-        
-        # Selenium Manager auto-installs correct driver
-        self.driver = webdriver.Chrome(options=chrome_options)
-
-        # ChromeDriver configuration
-        # The only thing need to change depends on the device
-        """
-        service = Service(r"for_selenium\chromedriver-win64\chromedriver.exe")
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        """
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless=new")
-        driver = webdriver.Chrome(options=options)  # Selenium will auto-download + match the driver
-    def wait_for_pdf_download(self, expected_filename: str, timeout: int = 60) -> str:
-        """
-        Waits for the PDF download to complete and returns the full file path.
-        """
-        for _ in range(timeout):
-            # Check if the file or partially downloaded file exists
-            for filename in os.listdir(self.download_dir):
-                if filename.startswith(expected_filename) and not filename.endswith(".crdownload"):
-                    return os.path.join(self.download_dir, filename)
-            time.sleep(1)  # Wait for a second before retrying
-        raise Exception("PDF download timed out or file not found.")
-
-    def download_pdf(self, cvr_id: int) -> dict:
-        """
-        Downloads the PDF for a given CVR ID and waits for it to complete.
+    def match_company_name(self, name: str, top_k: int = None) -> dict:
+        """
+        Returns ranked candidates for a company name with their confidence, from the local fuzzy
+        matcher when it is available and from the upstream `match` query otherwise.
+        """
+        top_k = top_k or settings.CVR_BULK_TOP_K
+        candidates = self._local_name_match(name, top_k)
+        if candidates is not None:
+            return self._name_match_result(name, "local", candidates)
+        data = self.client.search(self._name_candidates_query(normalize_company_name(name), top_k))
+        return self._name_match_result(name, "upstream", self._parse_name_candidates(data))
+
+    def search_companies_by_partial_name(self, partial_name: str, limit: int, cursor: str = None) -> dict:
+        """
+        Returns one page of companies matching a partial name, ordered by CVR number.
 
         Args:
-            cvr_id (int): The CVR ID of the company.
+            partial_name (str): Prefix of the company name.
+            limit (int): Maximum number of companies in the page.
+            cursor (str): Opaque cursor from the previous page; None for the first page.
 
         Returns:
-            dict: A dictionary with file path, file name, and a message.
+            dict: total_results, results (company_name / cvr_number) and next_cursor (None on the last page).
         """
-        try:
-            url = f"{self.base_url}?cvrnummer={cvr_id}&locale=en"
-            print(f"Navigating to URL: {url}")
-            self.driver.get(url)
-            print("URL loaded in browser. Waiting for PDF download...")
-
-            # Wait for the file to download
-            expected_filename = f"{cvr_id}+-+Full+view"
-            downloaded_file_path = self.wait_for_pdf_download(expected_filename)
-            print(f"PDF downloaded to: {downloaded_file_path}")
+        search_after = self._decode_cursor(cursor) if cursor else None
+        page = self._local_name_page(partial_name, limit, search_after)
+        if page is not None:
+            return page
+        data = self.client.search(self._partial_name_query(partial_name, limit + 1, search_after))
+        return self._parse_company_page(data, limit)
+
+    def typeahead(self, prefix: str, limit: int = 10) -> list:
+        """
+        Returns the best matches for a name prefix, from the name index when it is available.
+        Without the index the first page of the upstream search is returned.
+        """
+        results = self._local_typeahead(prefix, limit)
+        if results is not None:
+            return results
+        return self.search_companies_by_partial_name(prefix, limit)["results"]
 
-            # Success response
-            return {
-                "file_path": downloaded_file_path,
-                "file_name": os.path.basename(downloaded_file_path),
-                "message": "PDF downloaded successfully."
-            }
+    def iter_companies_by_partial_name(self, partial_name: str, page_size: int = None):
+        """
+        Yields every company matching a partial name, fetching one page at a time so memory stays flat.
+        """
+        page_size = page_size or settings.CVR_SEARCH_PAGE_SIZE
+        cursor = None
+        while True:
+            page = self.search_companies_by_partial_name(partial_name, page_size, cursor)
+            for company in page["results"]:
+                yield company
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
 
-        except Exception as e:
-            print(f"Error downloading PDF: {e}")
-            raise Exception(f"Error downloading PDF: {e}")
+    def get_companies_by_partial_name(self, partial_name: str) -> list:
+        """
+        Searches for companies by partial name and returns a list of full company names and CVR numbers.
+        """
+        return list(self.iter_companies_by_partial_name(partial_name))
 
-    def close_driver(self):
+    def get_company_document(self, cvr_id: int, use_cache: bool = True, fields: list = None) -> dict:
         """
-        Manually close the WebDriver when no longer needed.
+        Returns the `Vrvirksomhed` document for a CVR ID, served from the document cache when possible.
+
+        Args:
+            cvr_id (int): The CVR ID of the company.
+            use_cache (bool): When False the cache is bypassed and refreshed with the upstream document.
+            fields (list): `_source` paths to fetch; None fetches the full document.
         """
+        self._check_not_found(cvr_id, use_cache)
+        company_data, fetch_fields = self._cached_document(cvr_id, fields, use_cache)
+        if company_data is not None:
+            return company_data
+
+        # Concurrent requests for the same company share one upstream query and parse
+        (fetched_fields, company_data), shared = self.single_flight.do(cvr_id, self._fetch_document, cvr_id, fetch_fields)
+        if shared and not extractors.fields_cover(fetched_fields, fields):
+            # The shared query fetched another projection; fetch the merged fields once for all such callers
+            company_data, fetch_fields = self._cached_document(cvr_id, fields, True)
+            if company_data is None:
+                (fetched_fields, company_data), shared = self.single_flight.do(
+                    (cvr_id, tuple(fetch_fields or ())), self._fetch_document, cvr_id, fetch_fields)
+        return company_data
+
+    def _refresh_document(self, cvr_id: int, fields: list):
+        self._refresh_executor.submit(self._run_refresh, cvr_id, fields)
+
+    def _run_refresh(self, cvr_id: int, fields: list):
         try:
-            self.driver.quit()
+            self.single_flight.do(cvr_id, self._fetch_document, cvr_id, fields)
         except Exception as e:
-            print(f"Error closing the driver: {e}")
-
-
+            print(f"Background refresh of CVR ID {cvr_id} failed: {e}")
+        finally:
+            self.cache.end_refresh(cvr_id)
 
+    def _fetch_document(self, cvr_id: int, fetch_fields: list) -> tuple:
+        data = self.client.search(self._cvr_id_query(cvr_id, fetch_fields))
+        company_data = self._parse_company_document(data, cvr_id)
+        self._store_document(cvr_id, fetch_fields, company_data)
+        return fetch_fields, company_data
 
+    def get_general_info_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns its general information.
+        """
+        company_data = self.get_company_document(cvr_id, use_cache, extractors.GENERAL_INFO_FIELDS)
+        return extractors.extract_general_info(company_data)
 
+    def get_possible_ownership_info_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns its possible legal and beneficial ownership information.
+        """
+        company_data = self.get_company_document(cvr_id, use_cache, extractors.POSSIBLE_OWNERSHIP_FIELDS)
+        return extractors.extract_possible_ownership_info(company_data)
 
+    def get_key_individuals_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns key individuals like Management,
+        Board of Directors, Founders, and Fully Liable Partners.
+        """
+        company_data = self.get_company_document(cvr_id, use_cache, extractors.KEY_INDIVIDUALS_FIELDS)
+        return extractors.extract_key_individuals(company_data)
 
+    def get_ownership_info(self, cvr_id: int, use_cache: bool = True) -> OwnershipResponse:
+        company_data = self.get_company_document(cvr_id, use_cache, extractors.OWNERSHIP_FIELDS)
+        return extractors.extract_ownership_info(company_data, cvr_id)
 
+    def get_company_dossier(self, cvr_id: int, sections: list = None, use_cache: bool = True) -> dict:
+        """
+        Fetches the company document once and returns the requested views of it.
 
+        Args:
+            cvr_id (int): The CVR ID of the company.
+            sections (list): Any of DOSSIER_SECTIONS; all sections when empty.
+            use_cache (bool): When False the cache is bypassed and refreshed with the upstream document.
+        """
+        sections = self._resolve_sections(sections)
+        company_data = self.get_company_document(cvr_id, use_cache, self._dossier_fields(sections))
+        return self._build_dossier(company_data, cvr_id, sections)
 
+    def get_company_documents(self, cvr_ids: list, use_cache: bool = True, fields: list = None,
+                              chunk_size: int = None):
+        """
+        Returns the `Vrvirksomhed` documents for many CVR IDs using one `terms` query per chunk.
 
+        Args:
+            cvr_ids (list): CVR IDs to resolve; duplicates are fetched once.
+            use_cache (bool): When False the cache is bypassed and refreshed with the upstream documents.
+            fields (list): `_source` paths to fetch; None fetches the full documents.
+            chunk_size (int): IDs per upstream query; defaults to CVR_BATCH_CHUNK_SIZE.
 
+        Returns:
+            tuple: (documents keyed by CVR ID, error messages keyed by CVR ID)
+        """
+        documents, chunks, errors = self._plan_batch(cvr_ids, fields, use_cache, chunk_size)
+        for chunk_ids, fetch_fields in chunks:
+            try:
+                data = self.client.search(self._cvr_ids_query(chunk_ids, fetch_fields))
+                self._collect_chunk(data, chunk_ids, fetch_fields, documents, errors)
+            except Exception as e:
+                for cvr_id in chunk_ids:
+                    errors[cvr_id] = str(e)
+        return documents, errors
+
+    def get_batch(self, section: str, cvr_ids: list, use_cache: bool = True, chunk_size: int = None) -> dict:
+        """
+        Extracts one view (a DOSSIER_SECTIONS key) for many CVR IDs.
 
+        Returns:
+            dict: results and errors, both keyed by CVR ID.
+        """
+        self._validate_batch(section, cvr_ids, chunk_size)
+        fields = self._dossier_fields([section])
+        documents, errors = self.get_company_documents(cvr_ids, use_cache, fields, chunk_size)
+        return self._extract_batch(section, cvr_ids, documents, errors)
 
+    def get_ownership_graph(self, cvr_id: int, max_depth: int = None, use_cache: bool = True) -> dict:
+        """
+        Walks the corporate owners above a company level by level and returns the ownership graph
+        with effective shares, ultimate owners and cycles (see build_ownership_graph).
 
+        Each level is fetched with one `terms` query per CVR_BATCH_CHUNK_SIZE companies, and the
+        owners of every company are kept in the ownership cache, so groups that overlap with an
+        earlier graph are mostly expanded without the upstream.
 
+        Args:
+            cvr_id (int): The CVR ID of the company.
+            max_depth (int): Levels of owners to walk; defaults to CVR_OWNERSHIP_MAX_DEPTH.
+            use_cache (bool): When False every company is refetched and the caches refreshed.
+        """
+        max_depth = self._ownership_max_depth(max_depth)
+        companies, frontier, depth, truncated = {}, [cvr_id], 0, False
+        while frontier:
+            level, cut = self._ownership_level(frontier, companies, depth, max_depth)
+            truncated = truncated or cut
+            if not level:
+                break
+            missing = self._plan_ownership_level(level, companies, use_cache)
+            if missing:
+                documents, errors = self.get_company_documents(missing, use_cache, extractors.OWNERSHIP_GRAPH_FIELDS)
+                self._collect_ownership_level(missing, documents, errors, companies)
+            frontier = self._ownership_frontier(level, companies)
+            depth += 1
+        return self._build_ownership_graph(cvr_id, companies, truncated)
+
+    def get_person_info_by_name(self, name: str = None, unit_number: int = None) -> dict:
+        """
+        Returns a participant and every company and role they appear in, from the participant
+        index of the company store. Indexed lookups, so this stays fast for people with hundreds
+        of roles. Refused while the store lags the register by more than CVR_STORE_MAX_LAG.
 
+        Args:
+            name (str): Participant name; case and spacing are ignored.
+            unit_number (int): The participant's `enhedsNummer`, required when several participants share the name.
+        """
+        if self.store is None:
+            raise Exception("Person lookups are served from the local company store: set CVR_STORE_ENABLED=true "
+                            "and run python -m app.services.company_sync")
+        if not self.store.is_current(settings.CVR_STORE_MAX_LAG):
+            raise Exception(f"The local company store has not completed a sync in the last {settings.CVR_STORE_MAX_LAG:.0f} "
+                            "seconds (CVR_STORE_MAX_LAG); run python -m app.services.company_sync")
+        roles = self.store.participant_roles(unit_number=unit_number, name=name)
+        if not roles:
+            raise Exception(f"No participant found with {'unit number ' + str(unit_number) if unit_number is not None else 'name: ' + name}")
+
+        units = list(dict.fromkeys(role["unit_number"] for role in roles))
+        if len(units) > 1:
+            listed = ", ".join(str(unit) for unit in units[:20])
+            raise Exception(f"{len(units)} participants are named {name}; pass one of their unit numbers: {listed}")
+
+        person = roles[0]
+        affiliations = list(dict.fromkeys(
+            (role["company_name"] or "N/A", role["cvr"], role["role"], role["role_type"]) for role in roles))
+        return {
+            "full_name": person["name"],
+            "unit_number": person["unit_number"],
+            "address": person["address"] or "N/A",
+            "postal_code": person["postal_code"] or "N/A",
+            "city": person["city"] or "N/A",
+            "affiliations": [
+                {"company_name": company_name, "cvr_number": cvr, "role": role, "role_type": role_type}
+                for company_name, cvr, role, role_type in affiliations
+            ],
+        }
 
-    
-    
-    
     #Doesn't work part starts here
     ###
     ###
     ###
-    
-    def get_person_info_by_name(self, name: str) -> dict:
-        """
-        Searches for a person by name and returns their full name.
-        """
-        query = {
-            "query": {
-                "match": {
-                    "Vrvirksomhed.personer.navn": name
-                }
-            }
-        }
 
-        response = requests.post(
-            f"{self.base_url}/person-search-endpoint",  # Update with actual endpoint URL
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"Person search query failed with status code {response.status_code}")
-
-        data = response.json()
-
-        # Handle parsing of person data here
-        person_data = data['hits']['hits'][0]['_source']['Vrvirksomhed']['personer']
-
-        try:
-            full_name = person_data['navn']
-            return {
-                "full_name": full_name
-            }
-        except KeyError as e:
-            raise Exception(f"Key error accessing person data: {str(e)}")
-        except Exception as e:
-            raise Exception(f"An error occurred while parsing person data: {str(e)}")
-
-    
-    
-    
-
-    
-    
-    
-    #not working correctly    
+    #not working correctly
     def get_company_data_by_cvr_id(self, cvr_id: int) -> dict:
         """
         Searches for a company by CVR ID and returns all relevant data about the company.
         """
-        query = {
-            "query": {
-                "match": {
-                    "Vrvirksomhed.cvrNummer": cvr_id
-                }
-            }
-        }
-
-        response = requests.post(
-            f"{self.base_url}",
-            auth=self.auth,
-            json=query
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"ElasticSearch query failed with status code {response.status_code}")
-
-        data = response.json()
-        print("0")
-
-        total_hits = data['hits']['total']
-        if isinstance(total_hits, dict):
-            total_hits = total_hits.get('value', 0)
-        elif isinstance(total_hits, int):
-            total_hits = total_hits
-        else:
-            raise Exception("Unexpected format for total hits")
-
-        if total_hits == 0:
-            raise Exception(f"No company found with CVR ID: {cvr_id}")
+        company_data = self.get_company_document(cvr_id)
 
         try:
-            company_data = data['hits']['hits'][0]['_source']['Vrvirksomhed']
-
             # Safely access virksomhed_metadata
             virksomhed_metadata = company_data.get('virksomhedMetadata', {})
             if isinstance(virksomhed_metadata, list):
@@ -761,7 +862,6 @@ class PDFService:
             post_address = company_data.get('postadresse', [])
             if not post_address:
                 post_address = company_data.get('beliggenhedsadresse', [])
-                print(f"Raw beliggenhedsadresse data: {post_address}")  # Debugging
 
             if isinstance(post_address, list) and post_address:
                 post_address = post_address[0]
@@ -795,14 +895,9 @@ class PDFService:
                 registered_capital = registered_capital[0]
             if isinstance(registered_capital, dict):
                 registered_capital = registered_capital.get('kapital', 'N/A')
-            elif isinstance(registered_capital, str):
-                registered_capital = registered_capital
-            else:
+            elif not isinstance(registered_capital, str):
                 registered_capital = "N/A"
 
-            print(f"registered_capital after conversion: {registered_capital}")
-
-
             # Return structured company data
             return {
                 "cvr_id": company_data.get('cvrNummer'),
@@ -811,7 +906,7 @@ class PDFService:
                 "registration_date": virksomhed_metadata.get('stiftelsesDato', "N/A"),
                 "termination_date": virksomhed_metadata.get('ophørsDato', "N/A"),
                 "status": virksomhed_metadata.get('sammensatStatus', "N/A"),
-                "address": self._format_address(post_address),
+                "address": extractors.format_address(post_address),
                 "industry_code": industry_info.get('branchetekst', "N/A"),
                 "contact_information": contact_info.get('kontaktoplysning', "N/A"),
                 "number_of_employees": employee_data.get('antalAnsatte', "N/A"),
@@ -824,32 +919,325 @@ class PDFService:
         except Exception as e:
             raise Exception(f"An error occurred while parsing the company data: {str(e)}")
 
+
+
+
+class AsyncCVRService(_CVRServiceBase):
+    """
+    asyncio-native counterpart of CVRService. Every lookup awaits the upstream query
+    instead of blocking a thread, so one worker can keep many requests in flight.
+    """
+
+    def __init__(self, cache: DocumentCache = None, store: CompanyStore = None):
+        super().__init__(cache, store)
+        self.client = AsyncCVRClient(
+            base_url=self.base_url,
+            auth=self.auth,
+            max_connections=settings.CVR_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.CVR_ASYNC_MAX_KEEPALIVE_CONNECTIONS,
+            connect_timeout=settings.CVR_HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.CVR_HTTP_READ_TIMEOUT,
+        )
+        self.single_flight = AsyncSingleFlight()
+        self._refresh_tasks = set()
+        self._refresh_semaphore = None
+        self._cache_limiter = None
+
+    @property
+    def _cache_blocks(self) -> bool:
+        # The SQLite cache and the company store block on disk and (de)serialize whole documents
+        return isinstance(self.cache, SharedDocumentCache) or self.store is not None
+
+    async def _cache_call(self, func, *args):
+        """
+        Runs a method that reads or writes the document cache, in a worker thread when the cache blocks.
+
+        Deserializing a large document holds the GIL throughout, so these calls run one at a time:
+        the event loop then waits for at most one of them instead of one per thread.
+        """
+        if not self._cache_blocks:
+            return func(*args)
+        if self._cache_limiter is None:
+            self._cache_limiter = anyio.CapacityLimiter(CACHE_THREADS)
+        return await anyio.to_thread.run_sync(func, *args, limiter=self._cache_limiter)
+
+    async def get_cvr_id_by_company_name(self, company_name: str) -> int:
+        """
+        Searches for a company by name and returns its CVR-ID. A confident local fuzzy match
+        answers without the upstream.
+        """
+        cvr_id = self._confident_cvr_id(company_name)
+        if cvr_id is not None:
+            return cvr_id
+        data = await self.client.search(self._company_name_query(company_name))
+        return self._parse_cvr_id(data)
+
+    async def match_company_name(self, name: str, top_k: int = None) -> dict:
+        """
+        Returns ranked candidates for a company name with their confidence, from the local fuzzy
+        matcher when it is available and from the upstream `match` query otherwise.
+        """
+        top_k = top_k or settings.CVR_BULK_TOP_K
+        candidates = self._local_name_match(name, top_k)
+        if candidates is not None:
+            return self._name_match_result(name, "local", candidates)
+        data = await self.client.search(self._name_candidates_query(normalize_company_name(name), top_k))
+        return self._name_match_result(name, "upstream", self._parse_name_candidates(data))
+
+    async def search_companies_by_partial_name(self, partial_name: str, limit: int, cursor: str = None) -> dict:
+        """
+        Returns one page of companies matching a partial name, ordered by CVR number.
+        """
+        search_after = self._decode_cursor(cursor) if cursor else None
+        page = self._local_name_page(partial_name, limit, search_after)
+        if page is not None:
+            return page
+        data = await self.client.search(self._partial_name_query(partial_name, limit + 1, search_after))
+        return self._parse_company_page(data, limit)
+
+    async def typeahead(self, prefix: str, limit: int = 10) -> list:
+        """
+        Returns the best matches for a name prefix, from the name index when it is available.
+        Without the index the first page of the upstream search is returned.
+        """
+        results = self._local_typeahead(prefix, limit)
+        if results is not None:
+            return results
+        return (await self.search_companies_by_partial_name(prefix, limit))["results"]
+
+    async def iter_companies_by_partial_name(self, partial_name: str, page_size: int = None):
+        """
+        Yields every company matching a partial name, fetching one page at a time so memory stays flat.
         """
-    def _format_address(self, address_data: dict) -> str:
+        page_size = page_size or settings.CVR_SEARCH_PAGE_SIZE
+        cursor = None
+        while True:
+            page = await self.search_companies_by_partial_name(partial_name, page_size, cursor)
+            for company in page["results"]:
+                yield company
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    async def get_companies_by_partial_name(self, partial_name: str) -> list:
         """
-        #Helper method to format the company address.
+        Searches for companies by partial name and returns a list of full company names and CVR numbers.
         """
-        if isinstance(address_data, list) and len(address_data) > 0:
-            address_data = address_data[0]  # If address is a list, take the first item
+        return [company async for company in self.iter_companies_by_partial_name(partial_name)]
 
-        # Use .get() to safely access address components, and avoid including empty strings
-        vejnavn = address_data.get('vejnavn', '').strip()
-        husnummer = address_data.get('husnummerFra', '').strip()
-        bogstav = address_data.get('bogstavFra', '').strip()
-        etage = address_data.get('etage', '').strip()
-        postnummer = str(address_data.get('postnummer', '')).strip()
-        postdistrikt = address_data.get('postdistrikt', '').strip()
-        kommune = address_data.get('kommune', {}).get('kommuneNavn', '').strip()
+    async def get_company_document(self, cvr_id: int, use_cache: bool = True, fields: list = None) -> dict:
+        """
+        Returns the `Vrvirksomhed` document for a CVR ID, served from the document cache when possible.
+        """
+        await self._cache_call(self._check_not_found, cvr_id, use_cache)
+        company_data, fetch_fields = await self._cache_call(self._cached_document, cvr_id, fields, use_cache)
+        if company_data is not None:
+            return company_data
+
+        # Concurrent requests for the same company share one upstream query and parse
+        (fetched_fields, company_data), shared = await self.single_flight.do(
+            cvr_id, self._fetch_document, cvr_id, fetch_fields)
+        if shared and not extractors.fields_cover(fetched_fields, fields):
+            # The shared query fetched another projection; fetch the merged fields once for all such callers
+            company_data, fetch_fields = await self._cache_call(self._cached_document, cvr_id, fields, True)
+            if company_data is None:
+                (fetched_fields, company_data), shared = await self.single_flight.do(
+                    (cvr_id, tuple(fetch_fields or ())), self._fetch_document, cvr_id, fetch_fields)
+        return company_data
+
+    def _refresh_document(self, cvr_id: int, fields: list):
+        if self._cache_blocks:
+            # Called from the threadpool by _cached_document; the task is started on the event loop
+            anyio.from_thread.run_sync(self._start_refresh, cvr_id, fields)
+        else:
+            self._start_refresh(cvr_id, fields)
 
-        # Construct the full address
-        address_parts = [vejnavn, husnummer + bogstav, etage, postnummer + ' ' + postdistrikt, kommune]
-        formatted_address = ', '.join(part for part in address_parts if part)
+    def _start_refresh(self, cvr_id: int, fields: list):
+        task = asyncio.ensure_future(self._run_refresh(cvr_id, fields))
+        self._refresh_tasks.add(task)  # Keeps the task referenced until it finishes
+        task.add_done_callback(self._refresh_tasks.discard)
 
-        # Return the formatted address or "N/A" if it's empty
-        return formatted_address if formatted_address else "N/A"
-    """
+    async def _run_refresh(self, cvr_id: int, fields: list):
+        if self._refresh_semaphore is None:
+            self._refresh_semaphore = asyncio.Semaphore(settings.CVR_CACHE_REFRESH_WORKERS)
+        try:
+            async with self._refresh_semaphore:
+                await self.single_flight.do(cvr_id, self._fetch_document, cvr_id, fields)
+        except Exception as e:
+            print(f"Background refresh of CVR ID {cvr_id} failed: {e}")
+        finally:
+            await self._cache_call(self.cache.end_refresh, cvr_id)
+
+    async def _fetch_document(self, cvr_id: int, fetch_fields: list) -> tuple:
+        data = await self.client.search(self._cvr_id_query(cvr_id, fetch_fields))
+        company_data = await self._cache_call(self._parse_and_store_document, data, cvr_id, fetch_fields)
+        return fetch_fields, company_data
 
+    def _parse_and_store_document(self, data: dict, cvr_id: int, fetch_fields: list) -> dict:
+        company_data = self._parse_company_document(data, cvr_id)
+        self._store_document(cvr_id, fetch_fields, company_data)
+        return company_data
 
-        
+    async def get_general_info_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns its general information.
+        """
+        company_data = await self.get_company_document(cvr_id, use_cache, extractors.GENERAL_INFO_FIELDS)
+        return extractors.extract_general_info(company_data)
 
+    async def get_possible_ownership_info_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns its possible legal and beneficial ownership information.
+        """
+        company_data = await self.get_company_document(cvr_id, use_cache, extractors.POSSIBLE_OWNERSHIP_FIELDS)
+        return extractors.extract_possible_ownership_info(company_data)
+
+    async def get_key_individuals_by_cvr_id(self, cvr_id: int, use_cache: bool = True) -> dict:
+        """
+        Searches for a company by CVR ID and returns key individuals like Management,
+        Board of Directors, Founders, and Fully Liable Partners.
+        """
+        company_data = await self.get_company_document(cvr_id, use_cache, extractors.KEY_INDIVIDUALS_FIELDS)
+        return extractors.extract_key_individuals(company_data)
 
+    async def get_ownership_info(self, cvr_id: int, use_cache: bool = True) -> OwnershipResponse:
+        company_data = await self.get_company_document(cvr_id, use_cache, extractors.OWNERSHIP_FIELDS)
+        return extractors.extract_ownership_info(company_data, cvr_id)
+
+    async def get_company_dossier(self, cvr_id: int, sections: list = None, use_cache: bool = True) -> dict:
+        """
+        Fetches the company document once and returns the requested views of it.
+        """
+        sections = self._resolve_sections(sections)
+        company_data = await self.get_company_document(cvr_id, use_cache, self._dossier_fields(sections))
+        return self._build_dossier(company_data, cvr_id, sections)
+
+    async def get_company_documents(self, cvr_ids: list, use_cache: bool = True, fields: list = None,
+                                    chunk_size: int = None):
+        """
+        Returns the `Vrvirksomhed` documents for many CVR IDs using one `terms` query per chunk.
+        Chunks are fetched concurrently, bounded by CVR_BATCH_CONCURRENCY.
+
+        Returns:
+            tuple: (documents keyed by CVR ID, error messages keyed by CVR ID)
+        """
+        documents, chunks, errors = await self._cache_call(self._plan_batch, cvr_ids, fields, use_cache, chunk_size)
+        semaphore = asyncio.Semaphore(settings.CVR_BATCH_CONCURRENCY)
+
+        async def fetch(chunk_ids, fetch_fields):
+            async with semaphore:
+                try:
+                    data = await self.client.search(self._cvr_ids_query(chunk_ids, fetch_fields))
+                    await self._cache_call(self._collect_chunk, data, chunk_ids, fetch_fields, documents, errors)
+                except Exception as e:
+                    for cvr_id in chunk_ids:
+                        errors[cvr_id] = str(e)
+
+        await asyncio.gather(*(fetch(chunk_ids, fetch_fields) for chunk_ids, fetch_fields in chunks))
+        return documents, errors
+
+    async def get_batch(self, section: str, cvr_ids: list, use_cache: bool = True, chunk_size: int = None) -> dict:
+        """
+        Extracts one view (a DOSSIER_SECTIONS key) for many CVR IDs.
+
+        Returns:
+            dict: results and errors, both keyed by CVR ID.
+        """
+        self._validate_batch(section, cvr_ids, chunk_size)
+        fields = self._dossier_fields([section])
+        documents, errors = await self.get_company_documents(cvr_ids, use_cache, fields, chunk_size)
+        return self._extract_batch(section, cvr_ids, documents, errors)
+
+    async def get_ownership_graph(self, cvr_id: int, max_depth: int = None, use_cache: bool = True) -> dict:
+        """
+        Walks the corporate owners above a company level by level and returns the ownership graph.
+        The chunks of each level are fetched concurrently.
+        """
+        max_depth = self._ownership_max_depth(max_depth)
+        companies, frontier, depth, truncated = {}, [cvr_id], 0, False
+        while frontier:
+            level, cut = self._ownership_level(frontier, companies, depth, max_depth)
+            truncated = truncated or cut
+            if not level:
+                break
+            missing = self._plan_ownership_level(level, companies, use_cache)
+            if missing:
+                documents, errors = await self.get_company_documents(missing, use_cache, extractors.OWNERSHIP_GRAPH_FIELDS)
+                self._collect_ownership_level(missing, documents, errors, companies)
+            frontier = self._ownership_frontier(level, companies)
+            depth += 1
+        # The path walk is CPU-bound for large groups, so it runs off the event loop
+        return await run_in_threadpool(self._build_ownership_graph, cvr_id, companies, truncated)
+
+    async def resolve_names(self, names: list, top_k: int = None, batch_size: int = None, concurrency: int = None):
+        """
+        Resolves many company names to CVR numbers, yielding one result per input row as batches complete.
+
+        Identical names (after normalization) are queried once. Names the local fuzzy matcher resolves
+        confidently are answered as soon as their chunk is matched in the threadpool; the rest are
+        sent in `_msearch` batches of batch_size, with at most `concurrency` batches in flight.
+
+        Args:
+            names (list): Company names in input order.
+            top_k (int): Number of ranked candidates returned per name.
+            batch_size (int): Names per `_msearch` request.
+            concurrency (int): Maximum concurrent `_msearch` requests.
+        """
+        top_k = top_k or settings.CVR_BULK_TOP_K
+        batch_size = batch_size or settings.CVR_BULK_MSEARCH_BATCH_SIZE
+        semaphore = asyncio.Semaphore(concurrency or settings.CVR_BULK_CONCURRENCY)
+        completed = asyncio.Queue()
+
+        async def run(batch):
+            async with semaphore:
+                try:
+                    queries = [self._name_candidates_query(unique[key][0], top_k) for key in batch]
+                    responses = await self.client.msearch(queries)
+                    results = []
+                    for key, response in zip(batch, responses):
+                        try:
+                            results.append((key, self._parse_name_candidates(response), None))
+                        except Exception as e:
+                            results.append((key, None, str(e)))
+                except Exception as e:
+                    results = [(key, None, str(e)) for key in batch]
+                await completed.put(results)
+
+        def upstream_rows(results):
+            for key, candidates, error in results:
+                query_name, rows = unique[key]
+                yield from self._name_resolution_rows(names, query_name, rows, candidates, error)
+
+        # Normalizing and fuzzy matching are CPU-bound, so they run in the threadpool; the local
+        # matching goes chunk by chunk, and the upstream batches start while later chunks are matched
+        unique = await run_in_threadpool(self._unique_names, names)
+        keys = list(unique)
+        tasks, pending, received = [], [], 0
+        try:
+            for start in range(0, len(keys), LOCAL_MATCH_CHUNK_SIZE):
+                local, remaining = await run_in_threadpool(
+                    self._match_names_locally, unique, keys[start:start + LOCAL_MATCH_CHUNK_SIZE], top_k)
+                for key, candidates in local.items():
+                    query_name, rows = unique[key]
+                    for result in self._name_resolution_rows(names, query_name, rows, candidates):
+                        yield result
+                pending.extend(remaining)
+                while len(pending) >= batch_size:
+                    tasks.append(asyncio.create_task(run(pending[:batch_size])))
+                    pending = pending[batch_size:]
+                while not completed.empty():
+                    received += 1
+                    for result in upstream_rows(completed.get_nowait()):
+                        yield result
+            if pending:
+                tasks.append(asyncio.create_task(run(pending)))
+
+            for _ in range(len(tasks) - received):
+                for result in upstream_rows(await completed.get()):
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def close(self):
+        await self.client.aclose()
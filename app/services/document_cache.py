@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU cache with a time-to-live for CVR company documents.
+
+    Entries are keyed by CVR number. The least recently used entry is evicted once
+    `max_entries` is reached. An entry is fresh for `ttl` seconds, then stale for another
+    `stale_ttl` seconds, during which `lookup` still serves it so the caller can refresh it in
+    the background; after that it is treated as a miss.
+
+    CVR numbers the register does not know are remembered separately for `negative_ttl`
+    seconds, so repeated lookups of invalid IDs do not reach the upstream.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0, enabled: bool = True,
+                 stale_ttl: float = 0.0, negative_ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.negative_hits = 0
+        self.refreshes = 0
+
+    def lookup(self, key, accept=None):
+        """
+        Returns (value, is_stale) for a cached key, or None on a miss or expired entry.
+
+        Args:
+            key: The cache key.
+            accept (callable): Optional predicate; a cached value it rejects counts as a miss.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if accept is not None and not accept(value):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return value, True
+            self.hits += 1
+            return value, False
+
+    def get(self, key, accept=None):
+        """
+        Returns the cached value for the key if it is fresh, or None.
+        """
+        entry = self.lookup(key, accept)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def peek(self, key):
+        """
+        Returns the cached value, fresh or stale, without touching the statistics or the LRU order.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl + self.stale_ttl:
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._negative.pop(key, None)
+            self._refreshing.discard(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def begin_refresh(self, key) -> bool:
+        """
+        Claims the background refresh of a stale key. Returns False if one is already running.
+        The claim ends when the key is set, invalidated or passed to `end_refresh`.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set_negative(self, key, message: str):
+        """
+        Remembers that a lookup for the key failed with `message`.
+        """
+        if not self.enabled or self.negative_ttl <= 0:
+            return
+
+        with self._lock:
+            self._negative[key] = (time.monotonic(), message)
+            self._negative.move_to_end(key)
+            while len(self._negative) > self.max_entries:
+                self._negative.popitem(last=False)
+
+    def get_negative(self, key):
+        """
+        Returns the remembered failure message for the key, or None.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._negative.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.negative_ttl:
+                del self._negative[key]
+                return None
+            self.negative_hits += 1
+            return entry[1]
+
+    def invalidate(self, key) -> bool:
+        """
+        Removes a single entry, including a remembered failure. Returns True if the key was cached.
+        """
+        with self._lock:
+            self._refreshing.discard(key)
+            negative = self._negative.pop(key, None) is not None
+            return self._entries.pop(key, None) is not None or negative
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+            self._refreshing.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "stale_ttl_seconds": self.stale_ttl,
+                "negative_ttl_seconds": self.negative_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "refreshes": self.refreshes,
+                "refreshes_in_flight": len(self._refreshing),
+                "negative_entries": len(self._negative),
+                "negative_hits": self.negative_hits,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,128 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+# How completed downloads are detected in this process, reported in the metrics
+DETECTION_MODE = "inotify" if _libc is not None else "polling"
+
+
+def is_complete_download(filename: str) -> bool:
+    """
+    True for a finished download; Chrome writes into `.crdownload` and hidden temporary files first.
+    """
+    return not filename.startswith(".") and not filename.endswith((".crdownload", ".tmp"))
+
+
+def _find_completed(directory: str):
+    for filename in sorted(os.listdir(directory)):
+        if is_complete_download(filename):
+            return os.path.join(directory, filename)
+    return None
+
+
+class _InotifyWatch:
+    """
+    Watches one directory for files that are closed after writing or moved into it.
+    """
+
+    def __init__(self, directory: str):
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if _libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+        # poll() rather than select(), which cannot wait on descriptors numbered 1024 or above
+        self.poller = select.poll()
+        self.poller.register(self.fd, select.POLLIN)
+
+    def read_names(self, timeout: float) -> list:
+        """
+        Blocks up to `timeout` seconds and returns the file names of the events received.
+        """
+        if not self.poller.poll(max(timeout, 0) * 1000):
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            names.append(os.fsdecode(buffer[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def wait_for_download(directory: str, timeout: float, poll_interval: float = 0.1) -> str:
+    """
+    Waits until a completed file appears in `directory` and returns its full path.
+
+    Uses inotify on Linux, so the file is reported as soon as Chrome renames the `.crdownload`
+    into place, and falls back to polling every `poll_interval` seconds elsewhere.
+
+    Args:
+        directory (str): A download directory owned by a single job.
+        timeout (float): Seconds to wait before giving up.
+        poll_interval (float): Seconds between directory scans when inotify is unavailable.
+    """
+    deadline = time.monotonic() + timeout
+    watch = None
+    if _libc is not None:
+        try:
+            watch = _InotifyWatch(directory)
+        except OSError as e:
+            print(f"inotify unavailable, polling {directory}: {e}")
+
+    try:
+        # Scanned after the watch is registered, so a file completed before that is not missed
+        file_path = _find_completed(directory)
+        while file_path is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception("PDF download timed out or file not found.")
+            if watch is not None:
+                names = watch.read_names(remaining)
+                completed = [name for name in names if is_complete_download(name)]
+                if completed:
+                    file_path = os.path.join(directory, completed[0])
+            else:
+                time.sleep(min(poll_interval, remaining))
+                file_path = _find_completed(directory)
+        return file_path
+    finally:
+        if watch is not None:
+            watch.close()
@@ -0,0 +1,504 @@
+import re
+from functools import lru_cache
+
+from app.dtos.cvr_dto import OwnershipResponse, OwnershipInfo
+
+# Name fragments that mark a participant as a legal entity rather than a person
+ORGANIZATION_INDICATORS = {"A/S", "ApS", "Inc.", "LLC", "S.A.", "P/S", "Ltd.", "I/S", "INC."}
+_ORGANIZATION_INDICATOR = re.compile("|".join(re.escape(indicator) for indicator in sorted(ORGANIZATION_INDICATORS)))
+
+# Views built by the single pass over `deltagerRelation`
+PARTICIPANT_VIEWS = ("ownership", "key_individuals", "possible_ownership")
+OWNERSHIP_ORGANISATIONS = {"EJERREGISTER": "Legal", "Reelle ejere": "Beneficial"}
+KEY_INDIVIDUAL_TYPES = {"LEDELSESORGAN", "STIFTERE", "FULDT_ANSVARLIG_DELTAGERE"}
+
+# Address fields read by the formatters, in argument order; the municipality name follows them.
+# Participants recur across the documents of a batch, export or sync, so formatted addresses are
+# memoized on these values.
+_OWNER_ADDRESS_FIELDS = ("fritekst", "vejnavn", "husnummerFra", "bogstavFra", "etage", "sidedoer",
+                         "postnummer", "postdistrikt", "landekode")
+_INDIVIDUAL_ADDRESS_FIELDS = ("fritekst", "vejnavn", "husnummerFra", "postnummer", "postdistrikt", "landekode")
+ADDRESS_MEMO_SIZE = 65536
+
+# `_source` paths each extractor reads. Queries request only these instead of the full document.
+COMPANY_HEADER_FIELDS = [
+    "Vrvirksomhed.cvrNummer",
+    "Vrvirksomhed.virksomhedMetadata.nyesteNavn.navn",
+]
+GENERAL_INFO_FIELDS = COMPANY_HEADER_FIELDS + [
+    "Vrvirksomhed.reklamebeskyttet",
+    "Vrvirksomhed.beliggenhedsadresse",
+    "Vrvirksomhed.virksomhedMetadata.nyesteVirksomhedsform.langBeskrivelse",
+    "Vrvirksomhed.virksomhedMetadata.stiftelsesDato",
+    "Vrvirksomhed.virksomhedMetadata.sammensatStatus",
+]
+PARTICIPANT_FIELDS = COMPANY_HEADER_FIELDS + [
+    "Vrvirksomhed.deltagerRelation.deltager.enhedstype",
+    "Vrvirksomhed.deltagerRelation.deltager.navne",
+    "Vrvirksomhed.deltagerRelation.deltager.beliggenhedsadresse",
+    "Vrvirksomhed.deltagerRelation.deltager.adresseHemmelig",
+    "Vrvirksomhed.deltagerRelation.organisationer",
+]
+POSSIBLE_OWNERSHIP_FIELDS = PARTICIPANT_FIELDS
+KEY_INDIVIDUALS_FIELDS = PARTICIPANT_FIELDS
+OWNERSHIP_FIELDS = PARTICIPANT_FIELDS
+OWNERSHIP_GRAPH_FIELDS = COMPANY_HEADER_FIELDS + [
+    "Vrvirksomhed.deltagerRelation.deltager.enhedsNummer",
+    "Vrvirksomhed.deltagerRelation.deltager.enhedstype",
+    "Vrvirksomhed.deltagerRelation.deltager.forretningsnoegle",
+    "Vrvirksomhed.deltagerRelation.deltager.navne",
+    "Vrvirksomhed.deltagerRelation.organisationer",
+]
+
+
+def merge_fields(*field_groups) -> list:
+    """
+    Combines `_source` field declarations into one sorted list, dropping paths
+    already covered by a parent path. A None group means the full document.
+    """
+    if any(group is None for group in field_groups):
+        return None
+
+    merged = []
+    for path in sorted(set(path for group in field_groups for path in group)):
+        if not fields_cover(merged, [path]):
+            merged.append(path)
+    return merged
+
+
+def fields_cover(available, requested) -> bool:
+    """
+    True if every requested path is contained in one of the available paths.
+    None stands for the full document on either side.
+    """
+    if available is None:
+        return True
+    if requested is None:
+        return False
+    return all(
+        any(path == parent or path.startswith(parent + ".") for parent in available)
+        for path in requested
+    )
+
+
+def extract_general_info(company_data: dict) -> dict:
+    """
+    Extracts the general company information from a `Vrvirksomhed` document.
+    """
+    try:
+        # Extract the business type (correct field for business type)
+        virksomhed_metadata = company_data.get('virksomhedMetadata', {})
+        business_type_data = virksomhed_metadata.get('nyesteVirksomhedsform', {})
+        business_type = business_type_data.get('langBeskrivelse', 'Anpartsselskab')
+
+        # Handle beliggenhedsadresse, which might be a list
+        beliggenhedsadresse = company_data.get('beliggenhedsadresse', [])
+        if isinstance(beliggenhedsadresse, list) and beliggenhedsadresse:
+            beliggenhedsadresse = beliggenhedsadresse[-1]  # Take the first entry
+
+        # Extract advertising protection
+        advertising_protection = "Yes" if company_data.get('reklamebeskyttet', False) else "No"
+
+        # Extract general information
+        general_info = {
+            "company_name": virksomhed_metadata.get('nyesteNavn', {}).get('navn', 'N/A'),
+            "cvr_number": company_data.get('cvrNummer', 'N/A'),
+            "address": format_address(beliggenhedsadresse),
+            "postal_code": str(beliggenhedsadresse.get('postnummer', 'N/A')),
+            "city": beliggenhedsadresse.get('postdistrikt', 'N/A'),
+            "start_date": virksomhed_metadata.get('stiftelsesDato', 'N/A'),
+            "business_type": business_type,
+            "advertising_protection": advertising_protection,
+            "status": virksomhed_metadata.get('sammensatStatus', 'Normal')
+        }
+
+        return general_info
+
+    except KeyError as e:
+        raise Exception(f"Key error accessing the company data: {str(e)}")
+    except Exception as e:
+        raise Exception(f"An error occurred while parsing the company data: {str(e)}")
+
+
+def format_address(address_data: dict) -> str:
+    """
+    Helper method to format the company address.
+    """
+    # Handle lists properly and ensure safe access to address fields
+    if isinstance(address_data, list) and address_data:
+        address_data = address_data[0]  # Take the first entry if it’s a list
+
+    vejnavn = str(address_data.get('vejnavn', 'N/A')).strip()  # Convert to string and strip
+    husnummer = str(address_data.get('husnummerFra', '')).strip()  # Convert to string and strip
+    postnummer = str(address_data.get('postnummer', 'N/A')).strip()  # Convert to string and strip
+    postdistrikt = str(address_data.get('postdistrikt', 'N/A')).strip()  # Convert to string and strip
+    kommune = str(address_data.get('kommune', {}).get('navn', '')).strip()  # Convert to string and strip
+
+    # Combine address parts
+    address_parts = [vejnavn, husnummer, postnummer, postdistrikt, kommune]
+    formatted_address = ', '.join(part for part in address_parts if part)
+
+    return formatted_address if formatted_address else "N/A"
+
+
+def extract_participant_views(company_data: dict, cvr_id: int, views=PARTICIPANT_VIEWS) -> dict:
+    """
+    Builds the participant views of a `Vrvirksomhed` document in one walk over `deltagerRelation`.
+
+    Each relation is visited once for all requested views, and its addresses are formatted at
+    most once per style, only when a view needs them.
+
+    Args:
+        company_data (dict): The `Vrvirksomhed` document.
+        cvr_id (int): CVR ID reported in the ownership view.
+        views: Any of PARTICIPANT_VIEWS.
+
+    Returns:
+        dict: {view: result}, where the results are those of extract_ownership_info,
+        extract_key_individuals and extract_possible_ownership_info.
+    """
+    want_ownership = "ownership" in views
+    want_key_individuals = "key_individuals" in views
+    want_possible_ownership = "possible_ownership" in views
+    walk_organisations = want_ownership or want_key_individuals
+
+    legal_owners, beneficial_owners, terminated_owners = [], [], []
+    key_individuals = {
+        "management": [],
+        "board_of_directors": [],
+        "founders": [],
+        "fully_liable_partners": []
+    }
+    possible_legal_owners, possible_beneficial_owners = [], []
+
+    for relation in company_data.get('deltagerRelation', []):
+        if relation is None:
+            continue
+        participant = relation.get('deltager')
+        anonymous = participant is None
+        if anonymous:
+            # A relation without a `deltager` is still listed as an 'Unknown' key individual; the
+            # ownership views skip it. A null `deltager` counts as absent, since the `_source`
+            # projection drops it
+            if not want_key_individuals:
+                continue
+            participant = {}
+        navne = participant.get('navne', [])
+
+        if want_possible_ownership:
+            deltagertype = participant.get('enhedstype', "")
+            for navn_entry in navne:
+                owner_name = navn_entry.get('navn', "Unknown")
+                if deltagertype == "VIRKSOMHED" or _ORGANIZATION_INDICATOR.search(owner_name):
+                    possible_legal_owners.append(owner_name)
+                else:
+                    possible_beneficial_owners.append(owner_name)
+
+        if not walk_organisations:
+            continue
+        owner_address = individual_address = None
+        for org in relation.get('organisationer', []):
+            hovedtype = org.get('hovedtype', None)
+            if want_key_individuals and hovedtype in KEY_INDIVIDUAL_TYPES:
+                role_name = org.get('organisationsNavn', [{}])[0].get('navn', 'Unknown') if org.get('organisationsNavn') else 'Unknown'
+                if individual_address is None:
+                    individual_address = format_individual_address(participant)
+                individual = {"name": navne[0].get('navn', 'Unknown') if navne else 'Unknown', "address": individual_address}
+
+                if hovedtype == "LEDELSESORGAN":
+                    if role_name == "Bestyrelse":
+                        key_individuals["board_of_directors"].append(individual)
+                    elif role_name == "Direktion":
+                        key_individuals["management"].append(individual)
+                elif hovedtype == "STIFTERE":
+                    key_individuals["founders"].append(individual)
+                else:
+                    key_individuals["fully_liable_partners"].append(individual)
+
+            if not want_ownership or anonymous:
+                continue
+            owner_type = OWNERSHIP_ORGANISATIONS.get(org.get('organisationsNavn', [{}])[0].get('navn'))
+            if owner_type is None:
+                continue
+            if owner_address is None:
+                owner_address = format_owner_address(participant.get("beliggenhedsadresse", []))
+
+            ownership_percentage, voting_percentage, start_date, end_date = get_ownership_details(org)
+            ownership_info = OwnershipInfo(
+                owner_name=navne[-1]['navn'] if navne else None,  # The latest name
+                ownership_percentage=ownership_percentage,
+                voting_percentage=voting_percentage,
+                ownership_type="Terminated" if end_date else owner_type,
+                start_date=start_date,
+                end_date=end_date,
+                address=owner_address
+            )
+
+            if end_date:  # Classify as terminated if end_date is present
+                terminated_owners.append(ownership_info)
+            elif owner_type == "Legal":
+                legal_owners.append(ownership_info)
+            else:
+                beneficial_owners.append(ownership_info)
+
+    company_name = company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn', 'N/A')
+    results = {}
+    if want_ownership:
+        results["ownership"] = OwnershipResponse(
+            cvr_number=cvr_id,
+            company_name=company_name,
+            legal_owners=legal_owners,
+            beneficial_owners=beneficial_owners,
+            terminated_owners=terminated_owners
+        )
+    if want_key_individuals:
+        results["key_individuals"] = key_individuals
+    if want_possible_ownership:
+        results["possible_ownership"] = {
+            "cvr_number": company_data.get('cvrNummer', 'N/A'),
+            "company_name": company_name,
+            "possible_legal_owners": list(dict.fromkeys(possible_legal_owners)),
+            "possible_beneficial_owners": list(dict.fromkeys(possible_beneficial_owners))
+        }
+    return results
+
+
+def extract_possible_ownership_info(company_data: dict) -> dict:
+    """
+    Classifies every participant of a `Vrvirksomhed` document as a possible legal or beneficial owner.
+    """
+    try:
+        views = extract_participant_views(company_data, company_data.get('cvrNummer'), ("possible_ownership",))
+        return views["possible_ownership"]
+    except Exception as e:
+        raise Exception(f"An error occurred while parsing the company data: {str(e)}")
+
+
+def extract_key_individuals(company_data: dict) -> dict:
+    """
+    Extracts Management, Board of Directors, Founders and Fully Liable Partners from a `Vrvirksomhed` document.
+    """
+    views = extract_participant_views(company_data, company_data.get('cvrNummer'), ("key_individuals",))
+    return views["key_individuals"]
+
+
+def extract_ownership_info(company_data: dict, cvr_id: int) -> OwnershipResponse:
+    """
+    Extracts legal, beneficial and terminated owners from the `EJERREGISTER` and `Reelle ejere`
+    organisations of a `Vrvirksomhed` document.
+    """
+    return extract_participant_views(company_data, cvr_id, ("ownership",))["ownership"]
+
+
+def extract_current_owners(company_data: dict) -> list:
+    """
+    Returns the current legal owners (`EJERREGISTER` entries without an end date) of a
+    `Vrvirksomhed` document. Corporate owners (enhedstype VIRKSOMHED) carry their CVR number,
+    which the register keeps in `forretningsnoegle`; shares are fractions (0.25 for 25 %).
+    """
+    owners = []
+    for relation in company_data.get('deltagerRelation', []):
+        participant = relation.get('deltager')
+        if participant is None:
+            continue
+
+        for org in relation.get('organisationer', []):
+            if org.get('organisationsNavn', [{}])[0].get('navn') != "EJERREGISTER":
+                continue
+            ownership_percentage, voting_percentage, start_date, end_date = get_ownership_details(org)
+            if end_date:
+                continue
+
+            corporate = participant.get('enhedstype') == "VIRKSOMHED" and participant.get('forretningsnoegle') is not None
+            navne = participant.get('navne', [])
+            owners.append({
+                "owner_type": "company" if corporate else "person",
+                "cvr_number": int(participant['forretningsnoegle']) if corporate else None,
+                "unit_number": participant.get('enhedsNummer'),
+                "name": navne[-1]['navn'] if navne else None,
+                "ownership_share": parse_share(ownership_percentage),
+                "voting_share": parse_share(voting_percentage),
+            })
+    return owners
+
+
+def extract_participant_roles(company_data: dict) -> list:
+    """
+    Returns one row per participant and role (`organisationer` entry) of a `Vrvirksomhed` document,
+    for the reverse participant index of the company store.
+    """
+    company_name = company_data.get('virksomhedMetadata', {}).get('nyesteNavn', {}).get('navn')
+    roles = []
+    for relation in company_data.get('deltagerRelation', []):
+        participant = (relation or {}).get('deltager')
+        if participant is None:
+            continue
+        navne = participant.get('navne') or []
+        name = navne[-1].get('navn') if navne else None
+        if not name:
+            continue
+
+        addresses = participant.get('beliggenhedsadresse') or []
+        latest_address = (addresses[-1] if addresses else None) or {}
+        if participant.get('adresseHemmelig', False):
+            address, postal_code, city = "Secret Address", "N/A", "N/A"
+        else:
+            address = format_owner_address(addresses)
+            postal_code = str(latest_address.get('postnummer') or "N/A")
+            city = str(latest_address.get('postdistrikt') or "N/A")
+
+        for org in relation.get('organisationer') or []:
+            roles.append({
+                "unit_number": participant.get('enhedsNummer'),
+                "name": name,
+                "participant_type": participant.get('enhedstype'),
+                "company_name": company_name,
+                "role": (org.get('organisationsNavn') or [{}])[0].get('navn', 'Unknown'),
+                "role_type": org.get('hovedtype'),
+                "address": address,
+                "postal_code": postal_code,
+                "city": city,
+            })
+    return roles
+
+
+def participant_name_key(name: str) -> str:
+    """
+    Lookup key for a participant name; names that differ only by case or spacing share a key.
+    """
+    return " ".join(str(name).casefold().split())
+
+
+def parse_share(value):
+    """
+    Converts a registered share such as "0.3333" to a float, or None if it is missing or malformed.
+    """
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def format_owner_address(address_data: list) -> str:
+    """
+    Formats the address for a single owner using available information.
+    If `fritekst` is provided, it uses it directly; otherwise, it constructs the address.
+    """
+    if not address_data:
+        return "N/A"
+
+    # Use the most recent address (last in list)
+    latest_address = address_data[-1]
+    kommune = latest_address.get("kommune")
+    parts = tuple(map(latest_address.get, _OWNER_ADDRESS_FIELDS)) + (
+        kommune.get("kommuneNavn") if isinstance(kommune, dict) else None,)
+    return _memoized(_format_owner_address_parts, parts)
+
+
+def format_individual_address(participant: dict) -> str:
+    """
+    Formats the first address of a key individual, or "Secret Address" if it is protected.
+    """
+    if participant.get('adresseHemmelig', False):
+        return "Secret Address"
+
+    beliggenhedsadresse = participant.get('beliggenhedsadresse', [])
+    if not beliggenhedsadresse or not isinstance(beliggenhedsadresse, list):
+        return "Unknown address"
+    address_data = beliggenhedsadresse[0] if beliggenhedsadresse[0] is not None else {}
+    parts = tuple(map(address_data.get, _INDIVIDUAL_ADDRESS_FIELDS)) + (
+        (address_data.get('kommune') or {}).get('kommuneNavn'),)
+    return _memoized(_format_individual_address_parts, parts)
+
+
+def _memoized(formatter, parts: tuple) -> str:
+    try:
+        return formatter(*parts)
+    except TypeError:  # An unhashable field value, which the memo cannot key on
+        return formatter.__wrapped__(*parts)
+
+
+@lru_cache(maxsize=ADDRESS_MEMO_SIZE)
+def _format_owner_address_parts(fritekst, vejnavn, husnummer, bogstav, etage, sidedoer,
+                                postnummer, postdistrikt, landekode, kommune) -> str:
+    # Use `fritekst` if available
+    if fritekst:
+        formatted_address = fritekst.replace("\n", ", ").strip()
+    else:
+        # Construct address manually if `fritekst` is not available
+        vejnavn = str(vejnavn or "").strip()
+        husnummer = str(husnummer or "").strip()
+        bogstav = str(bogstav or "").strip()
+        etage = str(etage or "").strip()
+        sidedoer = str(sidedoer or "").strip()
+        postnummer = str(postnummer or "").strip()
+        postdistrikt = str(postdistrikt or "").strip()
+        kommune = str(kommune or "").strip()
+
+        address_parts = [
+            vejnavn,
+            f"{husnummer}{bogstav}" if husnummer or bogstav else "",
+            etage,
+            sidedoer,
+            f"{postnummer} {postdistrikt}".strip() if postnummer or postdistrikt else "",
+            kommune
+        ]
+
+        formatted_address = ', '.join(part for part in address_parts if part)
+
+    # Append the country code if available
+    if landekode:
+        formatted_address = f"{formatted_address}, {landekode}"
+
+    return formatted_address if formatted_address else "N/A"
+
+
+@lru_cache(maxsize=ADDRESS_MEMO_SIZE)
+def _format_individual_address_parts(fritekst, vejnavn, husnummer, postnummer, postdistrikt, landekode, kommune) -> str:
+    if fritekst:
+        # Handle multi-line addresses in `fritekst`
+        return fritekst.replace('\n', ', ').strip()
+
+    # Filter out empty strings and join remaining parts, avoiding None values
+    address_parts = [str(part or '').strip() for part in (vejnavn, husnummer, postnummer, postdistrikt, kommune, landekode)]
+    return ', '.join(part for part in address_parts if part) if any(address_parts) else "Unknown address"
+
+
+def get_ownership_details(organisation):
+    """
+    Extracts ownership details including ownership percentage, voting percentage,
+    start date, and end date (for terminated owners).
+    """
+    ownership_percentage = voting_percentage = start_date = end_date = None
+
+    for medlemsData in organisation.get("medlemsData", []):
+        for attr in medlemsData.get("attributter", []):
+            if attr["type"] == "EJERANDEL_PROCENT":
+                for value in attr["vaerdier"]:
+                    # Capture ownership percentage, start date, and end date
+                    ownership_percentage = value["vaerdi"]
+                    start_date = value["periode"].get("gyldigFra")
+                    end_date = value["periode"].get("gyldigTil")
+
+            elif attr["type"] == "EJERANDEL_STEMMERET_PROCENT":
+                for value in attr["vaerdier"]:
+                    # Capture voting percentage for the corresponding period
+                    if start_date == value["periode"].get("gyldigFra") and end_date == value["periode"].get("gyldigTil"):
+                        voting_percentage = value["vaerdi"]
+
+    return ownership_percentage, voting_percentage, start_date, end_date
+
+
+def get_current_attribute_value(organisation, attribute_type):
+    """
+    Helper to fetch a specific attribute value (e.g., 'EJERANDEL_PROCENT') and its start date (gyldigFra)
+    from the organisation data. Only considers the attribute if 'gyldigTil' is null, meaning the owner is current.
+    """
+    for medlemsData in organisation.get("medlemsData", []):
+        for attr in medlemsData.get("attributter", []):
+            if attr["type"] == attribute_type:
+                # Check if 'gyldigTil' is null for current ownership
+                for value in attr["vaerdier"]:
+                    if value["periode"].get("gyldigTil") is None:
+                        return value["vaerdi"], value["periode"].get("gyldigFra")
+    return None, None  # Return None for both if not found
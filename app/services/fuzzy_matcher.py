@@ -0,0 +1,434 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+
+from app.services.extractors import ORGANIZATION_INDICATORS
+
+# Legal-form tokens stripped from both ends of a name before matching
+LEGAL_FORMS = {indicator.casefold() for indicator in ORGANIZATION_INDICATORS}
+# Postings scanned per lookup, rarest trigram first. Names made only of common trigrams stop
+# early, which bounds the lookup time at the cost of possibly missing a weak candidate.
+MAX_SCANNED_POSTINGS = 2000
+# Candidates verified per lookup, picked by the number of rare trigrams they share with the query
+MAX_CANDIDATES = 50
+# Words at least this long are also indexed under each of their one-letter deletions,
+# which finds a word one typo away with a few hash lookups
+MIN_DELETE_WORD_LENGTH = 4
+# Groups of the rarest query word checked against the next rarest word when there are too
+# many to score; beyond this the lookup falls back to the trigram postings
+MAX_INTERSECTED_GROUPS = 1000
+# Renamed companies leave dead entries behind; the index is rebuilt once they exceed this share
+MAX_DEAD_SHARE = 0.2
+QUERY_MEMO_SIZE = 10000
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def split_legal_form(name: str) -> tuple:
+    """
+    Normalizes a company name for matching and separates its legal form.
+
+    "DSV Solutions A/S" and "dsv  solutions" both become ("dsv solutions", ...): Unicode NFKC,
+    case folded, legal-form tokens from ORGANIZATION_INDICATORS removed from either end, and
+    punctuation replaced by single spaces.
+
+    Returns:
+        tuple: (canonical name, legal form or None)
+    """
+    tokens = unicodedata.normalize("NFKC", str(name)).casefold().split()
+    legal_form = None
+    while tokens and tokens[-1] in LEGAL_FORMS:
+        legal_form = tokens.pop()
+    while tokens and tokens[0] in LEGAL_FORMS:
+        legal_form = legal_form or tokens[0]
+        tokens.pop(0)
+    canonical = _NON_WORD.sub(" ", " ".join(tokens)).strip()
+    if not canonical:  # The name is only a legal form
+        canonical = _NON_WORD.sub(" ", unicodedata.normalize("NFKC", str(name)).casefold()).strip()
+    return canonical, legal_form
+
+
+def _slot_size(slot: tuple) -> int:
+    return slot[0]
+
+
+def trigrams(canonical: str) -> set:
+    """
+    Character trigrams of every word, padded so that word starts and ends carry extra weight.
+    """
+    grams = set()
+    for word in canonical.split():
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+class _TrigramIndex:
+    """
+    Company entries grouped by canonical name, with trigram postings lists over the groups.
+
+    Companies sharing a canonical name share one group, so duplicates cost one posting per
+    trigram in total. Trigrams are stored as integer ids: `grams[group]` holds a group's ids for
+    verification and `postings[id]` the groups containing it.
+
+    Words get ids too: `word_groups[id]` lists the groups containing the word, and `deletes` maps
+    every one-letter deletion of a word to its id (or a tuple of ids), so a misspelled query
+    word is corrected with hash lookups instead of a postings scan.
+
+    Lookups run concurrently with `add`, so lists that lookups iterate are replaced, not
+    changed in place, and new groups are published last.
+    """
+
+    def __init__(self):
+        self.cvrs = array("q")
+        self.names = []
+        self.legal_forms = []
+        self.entry_groups = array("i")
+        self.by_cvr = {}
+        self.dead = 0
+        self.group_ids = {}
+        self.members = []
+        self.grams = []
+        self.gram_ids = {}
+        self.postings = []
+        self.word_ids = {}
+        self.word_groups = []
+        self.deletes = {}
+
+    def add(self, cvr: int, name: str):
+        entry = self.by_cvr.get(cvr)
+        if entry is not None:
+            if self.names[entry] == name:
+                return
+            group = self.entry_groups[entry]
+            self.members[group] = [member for member in self.members[group] if member != entry]
+            self.dead += 1
+
+        canonical, legal_form = split_legal_form(name)
+        group = self.group_ids.get(canonical)
+        if group is None:
+            # Published to the postings lists and group_ids last, so concurrent lookups never
+            # reach a group before its trigrams are stored
+            group = len(self.members)
+            ids = array("i")
+            for gram in trigrams(canonical):
+                gram_id = self.gram_ids.get(gram)
+                if gram_id is None:
+                    gram_id = len(self.postings)
+                    self.postings.append(array("i"))
+                    self.gram_ids[gram] = gram_id
+                ids.append(gram_id)
+            self.grams.append(ids)
+            self.members.append([])
+            for gram_id in ids:
+                self.postings[gram_id].append(group)
+            for word in set(canonical.split()):
+                self.word_groups[self._word_id(word)].append(group)
+            self.group_ids[canonical] = group
+
+        entry = len(self.names)
+        self.cvrs.append(cvr)
+        self.names.append(name)
+        self.legal_forms.append(legal_form)
+        self.entry_groups.append(group)
+        self.members[group] = self.members[group] + [entry]
+        self.by_cvr[cvr] = entry
+
+    def _word_id(self, word: str) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is not None:
+            return word_id
+        word_id = len(self.word_groups)
+        self.word_groups.append(array("i"))
+        if len(word) >= MIN_DELETE_WORD_LENGTH:
+            for index in range(len(word)):
+                deletion = word[:index] + word[index + 1:]
+                known = self.deletes.get(deletion)
+                if known is None:
+                    self.deletes[deletion] = word_id
+                elif known != word_id and (type(known) is int or word_id not in known):
+                    self.deletes[deletion] = (known, word_id) if type(known) is int else known + (word_id,)
+        self.word_ids[word] = word_id
+        return word_id
+
+    def corrections(self, word: str) -> set:
+        """
+        Ids of the indexed words at most one insertion, deletion, substitution or transposition away.
+        """
+        deletions = [word[:index] + word[index + 1:] for index in range(len(word))]
+        found = set(map(self.word_ids.get, deletions))
+        for known in map(self.deletes.get, deletions + [word]):
+            if type(known) is tuple:
+                found.update(known)
+            else:
+                found.add(known)
+        found.discard(None)
+        if not found and len(word) > MIN_DELETE_WORD_LENGTH:
+            # Two typos: words reached by deleting two letters of the query, or one letter of each
+            deletions = {deletion[:index] + deletion[index + 1:]
+                         for deletion in deletions for index in range(len(deletion))}
+            found = set(map(self.word_ids.get, deletions))
+            for known in map(self.deletes.get, deletions):
+                if type(known) is tuple:
+                    found.update(known)
+                else:
+                    found.add(known)
+            found.discard(None)
+        return found
+
+
+class FuzzyMatcher:
+    """
+    Local company-name-to-CVR matcher built on a trigram inverted index.
+
+    Names that are equal after normalization are answered from a hash lookup with confidence 1.0.
+    Any other name is scored by trigram Jaccard similarity against the groups holding its rarest
+    words, each word as typed or corrected by up to two typos. Names without a candidate there
+    are scored against the groups sharing most of their rarest trigrams: a candidate with
+    similarity `min_similarity` or more must contain one of the rarest len - needed + 1 of them,
+    and MAX_SCANNED_POSTINGS and MAX_CANDIDATES bound the work for names made of common ones.
+    Candidates with the same legal form as the query win ties.
+
+    The index is filled from the company store and refreshed incrementally: a renamed company
+    gets a new entry and its old one is dropped from its name group. Rebuilds happen on a new index that is
+    swapped in when complete, so lookups never see a partial one. The memo is only touched
+    under its own lock, as lookups run on several threads.
+
+    Args:
+        min_similarity (float): Candidates scoring below this are not returned.
+    """
+
+    def __init__(self, min_similarity: float = 0.3):
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._memo_lock = threading.Lock()
+        self._index = _TrigramIndex()
+        self._memo = OrderedDict()
+        self._thread = None
+        self._stop = threading.Event()
+        self.synced_until = None
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.last_refresh_seconds = 0.0
+        self.lookups = 0
+        self.exact_matches = 0
+        self.memo_hits = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshes > 0
+
+    def load(self, companies: dict, synced_until: float = None):
+        """
+        Replaces the whole index with {cvr: name}.
+        """
+        index = _TrigramIndex()
+        for cvr, name in companies.items():
+            index.add(cvr, name)
+        with self._lock:
+            self._index = index
+            self._memo = OrderedDict()
+            self.synced_until = synced_until
+            self.rebuilds += 1
+
+    def apply_changes(self, changes: dict, synced_until: float = None):
+        """
+        Adds or renames companies from {cvr: name}.
+        """
+        with self._lock:
+            index = self._index
+            for cvr, name in changes.items():
+                index.add(cvr, name)
+            if changes:
+                self._memo = OrderedDict()
+            if synced_until is not None:
+                self.synced_until = synced_until
+        if index.dead > MAX_DEAD_SHARE * len(index.names):
+            self.load({cvr: index.names[entry] for cvr, entry in index.by_cvr.items()}, self.synced_until)
+
+    def refresh_from_store(self, store):
+        """
+        Loads the companies the store received since the previous refresh (all of them the first time).
+        """
+        start = time.perf_counter()
+        changes, synced_until = {}, self.synced_until
+        for cvr, name, status, synced_at in store.iter_names(self.synced_until):
+            if name:
+                changes[cvr] = name
+            synced_until = synced_at if synced_until is None else max(synced_until, synced_at)
+        if self.synced_until is None:
+            self.load(changes, synced_until)
+        else:
+            self.apply_changes(changes, synced_until)
+        self.refreshes += 1
+        self.last_refresh_seconds = time.perf_counter() - start
+
+    def match(self, name: str, top_k: int = 3) -> list:
+        """
+        Returns up to top_k candidates (company_name, cvr_number, score), best first. The score
+        is the confidence between 0 and 1; 1.0 means the names are equal after normalization.
+        """
+        self.lookups += 1
+        memo_key = (name, top_k)
+        with self._memo_lock:
+            # A refresh swaps in a new memo; answers computed before it go to the old one
+            memo = self._memo
+            cached = memo.get(memo_key)
+        if cached is not None:
+            self.memo_hits += 1
+            return cached
+
+        index = self._index
+        canonical, legal_form = split_legal_form(name)
+        group = index.group_ids.get(canonical)
+        if group is not None and index.members[group]:
+            self.exact_matches += 1
+            groups = [(1.0, group)]
+        else:
+            groups = self._score(index, canonical)
+
+        # Best score first, then the query's legal form, then the lowest CVR number
+        scored = sorted([(score, index.legal_forms[entry] == legal_form, -index.cvrs[entry], entry)
+                         for score, group in groups for entry in index.members[group]], reverse=True)
+        results = [
+            {"company_name": index.names[entry], "cvr_number": -negative_cvr, "score": round(score, 4)}
+            for score, _, negative_cvr, entry in scored[:top_k]
+        ]
+        with self._memo_lock:
+            memo[memo_key] = results
+            if len(memo) > QUERY_MEMO_SIZE:
+                memo.popitem(last=False)
+        return results
+
+    def _score(self, index: _TrigramIndex, canonical: str) -> list:
+        """
+        Returns (similarity, group) for groups at or above min_similarity, best first.
+
+        The candidates are the groups holding the query's rarest words, each word taken as typed
+        or corrected by one typo. Queries without a scoring candidate there, such as words run
+        together or two typos in one word, fall back to the trigram postings.
+        """
+        words = set(canonical.split())
+        grams = set()
+        for word in words:
+            padded = f"  {word} "
+            grams.update([padded[start:start + 3] for start in range(len(padded) - 2)])
+        query = set(map(index.gram_ids.get, grams))
+        query.discard(None)
+        size, min_similarity, members, group_grams = len(grams), self.min_similarity, index.members, index.grams
+
+        scored = []
+        for group in self._word_candidates(index, words):
+            candidate = group_grams[group]
+            shared = len(query.intersection(candidate))
+            similarity = shared / (size + len(candidate) - shared)
+            if similarity >= min_similarity and members[group]:
+                scored.append((similarity, group))
+        if not scored:
+            scored = self._scan_postings(index, query, size)
+        scored.sort(reverse=True)
+        return scored
+
+    def _word_candidates(self, index: _TrigramIndex, words: set) -> set:
+        """
+        Groups containing the rarest query word, and the next rarest ones while they fit in MAX_CANDIDATES.
+        """
+        word_ids, word_groups = index.word_ids, index.word_groups
+        slots = []
+        for word in words:
+            word_id = word_ids.get(word)
+            if word_id is not None:
+                slots.append((len(word_groups[word_id]), (word_id,)))
+            else:
+                corrected = index.corrections(word)
+                if corrected:
+                    slots.append((sum([len(word_groups[word_id]) for word_id in corrected]), corrected))
+        slots.sort(key=_slot_size)
+
+        candidates, size = set(), 0
+        for slot_size, slot_ids in slots:
+            if size + slot_size > MAX_CANDIDATES:
+                break
+            size += slot_size
+            for word_id in slot_ids:
+                candidates.update(word_groups[word_id])
+        if not candidates and len(slots) > 1 and slots[0][0] <= MAX_INTERSECTED_GROUPS:
+            # Too many groups hold the rarest word; keep those also holding the next rarest one
+            rarest = set()
+            for word_id in slots[0][1]:
+                rarest.update(word_groups[word_id])
+            for word_id in slots[1][1]:
+                candidates.update(rarest.intersection(word_groups[word_id]))
+            if len(candidates) > MAX_CANDIDATES:
+                candidates = set()
+        return candidates
+
+    def _scan_postings(self, index: _TrigramIndex, query: set, size: int) -> list:
+        """
+        Scores the groups sharing most of the query's rarest trigrams; returns (similarity, group).
+        """
+        known = list(query)
+        # A group sharing `needed` of the query trigrams contains one of the rarest
+        # len(known) - needed + 1 of them
+        needed = max(1, int(self.min_similarity * size + 0.9999))
+        if len(known) < needed:
+            return []
+        postings_lists = sorted((index.postings[gram_id] for gram_id in known), key=len)
+        counts, scanned = Counter(), 0
+        for postings in postings_lists[:len(known) - needed + 1]:
+            if scanned and scanned + len(postings) > MAX_SCANNED_POSTINGS:
+                break
+            counts.update(postings)
+            scanned += len(postings)
+
+        scored = []
+        for group in heapq.nlargest(MAX_CANDIDATES, counts, key=counts.__getitem__):
+            candidate = index.grams[group]
+            shared = len(query.intersection(candidate))
+            similarity = shared / (size + len(candidate) - shared)
+            if similarity >= self.min_similarity and index.members[group]:
+                scored.append((similarity, group))
+        return scored
+
+    def start(self, store, interval: float):
+        """
+        Builds the index and keeps refreshing it from the store every `interval` seconds on a daemon thread.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.refresh_from_store(store)
+                except Exception as e:
+                    print(f"Refreshing the fuzzy name matcher failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=run, name="fuzzy-matcher-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "ready": self.ready,
+            "companies": len(index.by_cvr),
+            "distinct_names": len(index.group_ids),
+            "dead_entries": index.dead,
+            "trigrams": len(index.postings),
+            "synced_until": self.synced_until,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3),
+            "lookups": self.lookups,
+            "exact_matches": self.exact_matches,
+            "memo_hits": self.memo_hits,
+        }
@@ -0,0 +1,372 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from array import array
+
+# Changed companies kept in the delta segment before it is merged into the base segment
+MERGE_THRESHOLD = 50000
+# Answers for prefixes up to this length are memoized until the next refresh,
+# since they match a large part of the register
+MEMO_PREFIX_LENGTH = 2
+MEMO_MAX_ENTRIES = 4096
+# Keys per block of the rank index; a typeahead query scans at most two partial blocks
+RANK_BLOCK_SIZE = 512
+
+_TOKEN = re.compile(r"\w+")
+
+
+def name_tokens(name: str) -> list:
+    """
+    Splits a company name into lowercase word tokens, like the ElasticSearch standard analyzer.
+    """
+    return _TOKEN.findall(str(name).casefold())
+
+
+def is_ceased(status: str) -> bool:
+    status = str(status or "").casefold()
+    return "ophørt" in status or "opløst" in status
+
+
+def rank_key(position: int, ceased: bool, name: str, cvr: int) -> int:
+    """
+    Typeahead rank packed into one integer, lower first: names matching from their first word,
+    then active companies, then shorter names, then the lower CVR number.
+    """
+    return ((position > 0) << 62) | (bool(ceased) << 61) | (min(len(name), 0xFFFFF) << 40) | cvr
+
+
+class _Segment:
+    """
+    Immutable sorted array of every token-suffix of every company name.
+
+    "Nordisk Data A/S" is stored under "nordisk data a s", "data a s", "a s" and "s", so a
+    phrase prefix that starts at any word of the name is one bisect away. refs and positions
+    hold, for each key, the company slot and the word the key starts at.
+
+    ranks holds each key's typeahead rank as one integer. block_order holds the key indexes
+    of every RANK_BLOCK_SIZE block in rank order, so the best companies for a prefix are found
+    by merging the blocks inside its range and stopping after `limit`, instead of collecting
+    every match. cvr_order and block_cvrs do the same by CVR number for paging, and a page
+    resumes from search_after by bisecting block_cvrs.
+
+    Args:
+        companies (dict): {cvr: (name, ceased)}
+    """
+
+    def __init__(self, companies: dict):
+        self.cvrs = array("q")
+        self.names = []
+        self.ceased = bytearray()
+        rows = []
+        for cvr, (name, ceased) in companies.items():
+            slot = len(self.names)
+            self.cvrs.append(cvr)
+            self.names.append(name)
+            self.ceased.append(ceased)
+            tokens = name_tokens(name)
+            for position in range(len(tokens)):
+                rows.append((" ".join(tokens[position:]), slot, min(position, 255)))
+        rows.sort()
+        self.keys = [row[0] for row in rows]
+        self.refs = array("i", (row[1] for row in rows))
+        self.positions = bytes(row[2] for row in rows)
+        company_ranks = [rank_key(0, ceased, name, cvr) for cvr, name, ceased in zip(self.cvrs, self.names, self.ceased)]
+        later_word = rank_key(1, False, "", 0)
+        self.ranks = array("q", [company_ranks[slot] | later_word if position else company_ranks[slot]
+                                 for _, slot, position in rows])
+        self.block_order = array("i")
+        self.cvr_order = array("i")
+        key_cvrs = array("q", [self.cvrs[slot] for slot in self.refs])
+        for start in range(0, len(rows), RANK_BLOCK_SIZE):
+            block = range(start, min(start + RANK_BLOCK_SIZE, len(rows)))
+            self.block_order.extend(sorted(block, key=self.ranks.__getitem__))
+            self.cvr_order.extend(sorted(block, key=key_cvrs.__getitem__))
+        self.block_cvrs = array("q", [key_cvrs[index] for index in self.cvr_order])
+
+    def key_range(self, phrase: str) -> tuple:
+        start = bisect.bisect_left(self.keys, phrase)
+        return start, bisect.bisect_left(self.keys, phrase + "\U0010ffff", start)
+
+    def count(self, phrase: str, overridden: dict = None) -> int:
+        """
+        Number of companies matching the phrase, not counting the CVR numbers in `overridden`.
+        """
+        start, end = self.key_range(phrase)
+        slots = set(self.refs[start:end])
+        if not overridden:
+            return len(slots)
+        cvrs = set(map(self.cvrs.__getitem__, slots))
+        return len(cvrs) - len(cvrs.intersection(overridden))
+
+    @staticmethod
+    def _blocks(start: int, end: int) -> tuple:
+        """
+        Splits the key range start:end into the keys outside whole blocks and the whole blocks.
+        """
+        first_block = -(-start // RANK_BLOCK_SIZE)
+        last_block = end // RANK_BLOCK_SIZE
+        if first_block >= last_block:
+            return range(start, end), range(0)  # No whole block in the range
+        edges = list(range(start, first_block * RANK_BLOCK_SIZE)) + list(range(last_block * RANK_BLOCK_SIZE, end))
+        return edges, range(first_block, last_block)
+
+    def best(self, phrase: str, limit: int, overridden: dict = None) -> list:
+        """
+        Returns (rank, slot) for the `limit` best-ranked companies matching the phrase, skipping
+        the CVR numbers in `overridden`.
+        """
+        edges, blocks = self._blocks(*self.key_range(phrase))
+
+        # Heap of (rank, key index, position in block_order or -1 for a key outside a whole block)
+        heap = [(self.ranks[index], index, -1) for index in edges]
+        order = self.block_order
+        for block in blocks:
+            position = block * RANK_BLOCK_SIZE
+            heap.append((self.ranks[order[position]], order[position], position))
+        heapq.heapify(heap)
+
+        found, seen = [], set()
+        while heap and len(found) < limit:
+            rank, index, position = heap[0]
+            if position >= 0 and (position + 1) % RANK_BLOCK_SIZE:
+                following = order[position + 1]
+                heapq.heapreplace(heap, (self.ranks[following], following, position + 1))
+            else:
+                heapq.heappop(heap)
+            slot = self.refs[index]
+            cvr = self.cvrs[slot]
+            if cvr in seen or (overridden is not None and cvr in overridden):
+                continue
+            seen.add(cvr)
+            found.append((rank, slot))
+        return found
+
+    def lowest(self, phrase: str, limit: int, after: int = None, overridden: dict = None) -> list:
+        """
+        Returns (cvr, slot) for the `limit` lowest CVR numbers above `after` matching the phrase,
+        skipping the CVR numbers in `overridden`.
+        """
+        edges, blocks = self._blocks(*self.key_range(phrase))
+        cvrs, refs, order, block_cvrs = self.cvrs, self.refs, self.cvr_order, self.block_cvrs
+
+        # Heap of (cvr, key index, position in cvr_order or -1 for a key outside a whole block)
+        heap = [(cvrs[refs[index]], index, -1) for index in edges]
+        if after is not None:
+            heap = [item for item in heap if item[0] > after]
+        for block in blocks:
+            position = block * RANK_BLOCK_SIZE
+            if after is not None:
+                block_end = position + RANK_BLOCK_SIZE
+                position = bisect.bisect_right(block_cvrs, after, position, block_end)
+                if position == block_end:
+                    continue  # The whole block is at or below `after`
+            heap.append((block_cvrs[position], order[position], position))
+        heapq.heapify(heap)
+
+        found = []
+        while heap and len(found) < limit:
+            cvr, index, position = heap[0]
+            if position >= 0 and (position + 1) % RANK_BLOCK_SIZE:
+                following = position + 1
+                heapq.heapreplace(heap, (block_cvrs[following], order[following], following))
+            else:
+                heapq.heappop(heap)
+            # Keys of one company have the same CVR number, so they leave the heap one after another
+            if (found and found[-1][0] == cvr) or (overridden is not None and cvr in overridden):
+                continue
+            found.append((cvr, refs[index]))
+        return found
+
+
+class _Snapshot:
+    def __init__(self, base: _Segment, delta: _Segment, changed: dict):
+        self.base = base
+        self.delta = delta
+        self.changed = changed  # Companies in the delta segment, which override their base entries
+        self.memo = {}
+
+
+class NameIndex:
+    """
+    In-memory company-name index answering prefix and typeahead queries without the upstream.
+
+    Names live in two sorted token-suffix arrays: a large base segment and a small delta segment
+    with the companies changed since the base was built. A refresh rebuilds only the delta,
+    and merges it into a new base once it exceeds MERGE_THRESHOLD companies. Both are swapped
+    in as one snapshot, so queries never take a lock and never see a half-applied refresh.
+
+    Matching follows `match_phrase_prefix`: every word of the query must match a word of the name
+    in order, the last one as a prefix.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.synced_until = None
+        self.refreshes = 0
+        self.merges = 0
+        self.last_refresh_seconds = 0.0
+        self.queries = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        """
+        Typeahead: the best `limit` companies for a prefix. Names starting with the prefix rank
+        before names containing it later, active companies before ceased ones, then shorter names.
+        """
+        snapshot = self._require_snapshot()
+        phrase = " ".join(name_tokens(prefix))
+        if not phrase:
+            return []
+        self.queries += 1
+
+        memo_key = (phrase, limit)
+        if len(phrase) <= MEMO_PREFIX_LENGTH and memo_key in snapshot.memo:
+            return snapshot.memo[memo_key]
+
+        best = heapq.nsmallest(limit, [
+            (rank, segment, slot)
+            for segment, overridden in ((snapshot.base, snapshot.changed), (snapshot.delta, None))
+            for rank, slot in segment.best(phrase, limit, overridden)
+        ], key=lambda item: item[0])
+        results = [{"company_name": segment.names[slot], "cvr_number": segment.cvrs[slot]} for _, segment, slot in best]
+        if len(phrase) <= MEMO_PREFIX_LENGTH and len(snapshot.memo) < MEMO_MAX_ENTRIES:
+            snapshot.memo[memo_key] = results
+        return results
+
+    def page(self, prefix: str, limit: int, search_after: list = None) -> dict:
+        """
+        Returns one page of matches ordered by CVR number, in the shape of the upstream
+        partial-name search: total_results, results and the sort values of the last result.
+        """
+        snapshot = self._require_snapshot()
+        self.queries += 1
+        phrase = " ".join(name_tokens(prefix))
+        if not phrase:
+            return {"total_results": 0, "results": [], "next_search_after": None}
+        after = search_after[0] if search_after else None
+
+        lowest = heapq.nsmallest(limit + 1, [
+            (cvr, segment, slot)
+            for segment, overridden in ((snapshot.base, snapshot.changed), (snapshot.delta, None))
+            for cvr, slot in segment.lowest(phrase, limit + 1, after, overridden)
+        ], key=lambda item: item[0])
+        return {
+            "total_results": self._total(snapshot, phrase),
+            "results": [{"company_name": segment.names[slot], "cvr_number": cvr} for cvr, segment, slot in lowest[:limit]],
+            "next_search_after": [lowest[limit - 1][0]] if len(lowest) > limit else None,
+        }
+
+    def _total(self, snapshot: _Snapshot, phrase: str) -> int:
+        """
+        Number of companies matching the phrase. Counting touches every match, so the counts of
+        phrases matching more than a block of keys are memoized until the next refresh.
+        """
+        memo_key = ("total", phrase)
+        total = snapshot.memo.get(memo_key)
+        if total is None:
+            total = snapshot.base.count(phrase, snapshot.changed) + snapshot.delta.count(phrase)
+            start, end = snapshot.base.key_range(phrase)
+            if end - start > RANK_BLOCK_SIZE and len(snapshot.memo) < MEMO_MAX_ENTRIES:
+                snapshot.memo[memo_key] = total
+        return total
+
+    def _require_snapshot(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise Exception("The company name index has not been built yet")
+        return snapshot
+
+    def load(self, companies: dict, synced_until: float = None):
+        """
+        Replaces the whole index with {cvr: (name, status)}.
+        """
+        companies = {cvr: (name, is_ceased(status)) for cvr, (name, status) in companies.items()}
+        with self._refresh_lock:
+            self._snapshot = _Snapshot(_Segment(companies), _Segment({}), {})
+            self.synced_until = synced_until
+
+    def apply_changes(self, changes: dict, synced_until: float = None):
+        """
+        Applies {cvr: (name, status)} for new or changed companies.
+        """
+        changes = {cvr: (name, is_ceased(status)) for cvr, (name, status) in changes.items()}
+        with self._refresh_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                self._snapshot = _Snapshot(_Segment(changes), _Segment({}), {})
+            elif changes:
+                changed = dict(snapshot.changed)
+                changed.update(changes)
+                if len(changed) > MERGE_THRESHOLD:
+                    base = snapshot.base
+                    companies = {cvr: (base.names[slot], base.ceased[slot]) for slot, cvr in enumerate(base.cvrs)}
+                    companies.update(changed)
+                    self._snapshot = _Snapshot(_Segment(companies), _Segment({}), {})
+                    self.merges += 1
+                else:
+                    self._snapshot = _Snapshot(snapshot.base, _Segment(changed), changed)
+            if synced_until is not None:
+                self.synced_until = synced_until
+
+    def refresh_from_store(self, store):
+        """
+        Loads the companies the store received since the previous refresh (all of them the first time).
+        """
+        start = time.perf_counter()
+        since = self.synced_until
+        changes, synced_until = {}, self.synced_until
+        for cvr, name, status, synced_at in store.iter_names(since):
+            changes[cvr] = (name or "", status)
+            synced_until = synced_at if synced_until is None else max(synced_until, synced_at)
+        if since is None:
+            self.load(changes, synced_until)
+        else:
+            self.apply_changes(changes, synced_until)
+        self.refreshes += 1
+        self.last_refresh_seconds = time.perf_counter() - start
+
+    def start(self, store, interval: float):
+        """
+        Builds the index and keeps refreshing it from the store every `interval` seconds on a daemon thread.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.refresh_from_store(store)
+                except Exception as e:
+                    print(f"Refreshing the company name index failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=run, name="name-index-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"ready": False, "refreshes": self.refreshes}
+        return {
+            "ready": True,
+            "base_companies": len(snapshot.base.cvrs),
+            "delta_companies": len(snapshot.changed),
+            "keys": len(snapshot.base.keys) + len(snapshot.delta.keys),
+            "synced_until": self.synced_until,
+            "refreshes": self.refreshes,
+            "merges": self.merges,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3),
+            "queries": self.queries,
+        }
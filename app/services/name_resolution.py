@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Header cells recognised as the company-name column of an uploaded CSV
+NAME_COLUMNS = {"name", "company_name", "company", "navn", "virksomhed"}
+
+
+def normalize_company_name(name: str) -> str:
+    """
+    Cleans a company name for querying: Unicode NFKC form, collapsed whitespace, no surrounding spaces.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", str(name))).strip()
+
+
+def name_key(name: str) -> str:
+    """
+    Deduplication key for a company name; names that differ only by case or spacing share a key.
+    """
+    return normalize_company_name(name).casefold()
+
+
+def read_names(content: bytes, filename: str = "", content_type: str = "") -> list:
+    """
+    Reads company names from an uploaded CSV or NDJSON file.
+
+    CSV files use the first column whose header is one of NAME_COLUMNS, or the first column when
+    there is no recognised header. NDJSON lines may be objects with a "name" key or plain JSON strings.
+
+    Returns:
+        list: The names in file order, empty rows skipped.
+    """
+    text = content.decode("utf-8-sig")
+    is_ndjson = filename.lower().endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type
+    if not is_ndjson and not filename.lower().endswith(".csv"):
+        first_line = text.lstrip()[:1]
+        is_ndjson = first_line in ("{", '"')
+
+    names = []
+    if is_ndjson:
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                raise Exception(f"Invalid JSON on line {line_number}")
+            name = entry.get("name") if isinstance(entry, dict) else entry
+            if name:
+                names.append(str(name))
+        return names
+
+    rows = csv.reader(io.StringIO(text))
+    header = next(rows, None)
+    if header is None:
+        return names
+
+    column = next((index for index, cell in enumerate(header) if cell.strip().lower() in NAME_COLUMNS), None)
+    if column is None:
+        column = 0
+        rows = [header] + list(rows)  # No header: the first row is data
+    for row in rows:
+        if len(row) > column and row[column].strip():
+            names.append(row[column])
+    return names
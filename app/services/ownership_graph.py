@@ -0,0 +1,131 @@
+from collections import deque
+
+# Steps of the path walk per graph: owners followed, cycles met and ultimate owners reached.
+# Dense groups with many cross-holdings have exponentially many paths and stop here.
+MAX_PATH_STEPS = 20000
+
+
+def node_id(owner: dict) -> str:
+    """
+    Graph node ID of an owner: "cvr:<CVR number>" for companies, "unit:<enhedsNummer>" for
+    persons, and "name:<name>" for persons the register gives no unit number.
+    """
+    if owner["cvr_number"] is not None:
+        return f"cvr:{owner['cvr_number']}"
+    if owner.get("unit_number") is not None:
+        return f"unit:{owner['unit_number']}"
+    return f"name:{owner.get('name')}"
+
+
+def build_ownership_graph(cvr_id: int, companies: dict, truncated: bool = False) -> dict:
+    """
+    Builds the ownership graph above one company from the owner lists of the companies walked.
+
+    Effective shares multiply the ownership shares along every simple path from an owner down to
+    the company and add up over the paths. A path that reaches a company already on it is a
+    cycle: it is reported once per set of companies in `cycles` and not followed further. The
+    walk takes at most MAX_PATH_STEPS steps, then `truncated` is set. Ultimate owners are the owners at
+    the end of a path: persons, companies without registered owners, and companies that were not
+    expanded because of the depth or size limits (then `truncated` is set).
+
+    Args:
+        cvr_id (int): The company the graph is built for.
+        companies (dict): {cvr: {"company_name", "owners", "error"}} for every company expanded,
+            with owners as returned by extractors.extract_current_owners.
+        truncated (bool): Whether the traversal stopped before every owner was expanded.
+
+    Returns:
+        dict: cvr_number, company_name, nodes, edges, ultimate_owners, cycles and truncated.
+    """
+    root = companies[cvr_id]
+    nodes = {
+        f"cvr:{cvr_id}": {
+            "id": f"cvr:{cvr_id}", "node_type": "company", "cvr_number": cvr_id, "unit_number": None,
+            "name": root["company_name"], "depth": 0, "expanded": True, "error": None,
+        }
+    }
+    edges = []
+    queue = deque([cvr_id])
+    while queue:
+        cvr = queue.popleft()
+        company = companies.get(cvr)
+        if company is None or company.get("error"):
+            continue
+        depth = nodes[f"cvr:{cvr}"]["depth"] + 1
+        for owner in company["owners"]:
+            key = node_id(owner)
+            edges.append({
+                "owner": key,
+                "owned": f"cvr:{cvr}",
+                "ownership_share": owner["ownership_share"],
+                "voting_share": owner["voting_share"],
+            })
+            if key in nodes:
+                continue
+            owner_cvr = owner["cvr_number"]
+            expanded = companies.get(owner_cvr) if owner_cvr is not None else None
+            nodes[key] = {
+                "id": key,
+                "node_type": owner["owner_type"],
+                "cvr_number": owner_cvr,
+                "unit_number": owner.get("unit_number"),
+                "name": expanded["company_name"] if expanded and expanded["company_name"] else owner["name"],
+                "depth": depth,
+                "expanded": expanded is not None and not expanded.get("error"),
+                "error": expanded.get("error") if expanded else None,
+            }
+            if owner_cvr is not None:
+                queue.append(owner_cvr)
+
+    ultimate, cycles = {}, {}
+    steps = [0]
+
+    def walk(cvr: int, share, path: list):
+        for owner in companies[cvr]["owners"]:
+            if steps[0] >= MAX_PATH_STEPS:
+                return
+            steps[0] += 1
+            owner_share = owner["ownership_share"]
+            path_share = share * owner_share if share is not None and owner_share is not None else None
+            owner_cvr = owner["cvr_number"]
+            if owner_cvr is not None and owner_cvr in path:
+                # path[i] is owned by path[i + 1] and the last company by the first
+                cycle = path[path.index(owner_cvr):]
+                start = cycle.index(min(cycle))
+                cycles.setdefault(frozenset(cycle), cycle[start:] + cycle[:start])
+                continue
+            company = companies.get(owner_cvr) if owner_cvr is not None else None
+            if company is not None and company["owners"]:
+                walk(owner_cvr, path_share, path + [owner_cvr])
+                continue
+
+            key = node_id(owner)
+            entry = ultimate.setdefault(key, {
+                "id": key,
+                "node_type": owner["owner_type"],
+                "cvr_number": owner_cvr,
+                "name": nodes[key]["name"],
+                "effective_share": None,
+                "paths": 0,
+            })
+            entry["paths"] += 1
+            if path_share is not None:
+                entry["effective_share"] = (entry["effective_share"] or 0.0) + path_share
+
+    if not root.get("error"):
+        walk(cvr_id, 1.0, [cvr_id])
+
+    for entry in ultimate.values():
+        if entry["effective_share"] is not None:
+            entry["effective_share"] = round(entry["effective_share"], 6)
+    return {
+        "cvr_number": cvr_id,
+        "company_name": root["company_name"] or "N/A",
+        "nodes": list(nodes.values()),
+        "edges": edges,
+        "ultimate_owners": sorted(
+            ultimate.values(),
+            key=lambda entry: (entry["effective_share"] is None, -(entry["effective_share"] or 0.0), entry["id"])),
+        "cycles": list(cycles.values()),
+        "truncated": truncated or steps[0] >= MAX_PATH_STEPS,
+    }
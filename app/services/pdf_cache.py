@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+class PDFCache:
+    """
+    Content-addressed on-disk cache for downloaded company PDFs.
+
+    Files are stored once under their SHA-256 digest, and an index maps (CVR ID, locale) to a
+    digest. Entries older than `ttl` seconds are treated as misses, and the least recently used
+    entries are evicted once the stored files exceed `max_bytes`. The index is written to
+    `index.json` so the cache survives restarts.
+    """
+
+    def __init__(self, root: str, ttl: float = 86400.0, max_bytes: int = 1024 ** 3, enabled: bool = True):
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.index_path = os.path.join(self.root, "index.json")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if enabled:
+            os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def _key(cvr_id: int, locale: str) -> str:
+        return f"{cvr_id}:{locale}"
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.pdf")
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Oldest access first, so the LRU order survives a restart
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if os.path.exists(self._object_path(entry["digest"])):
+                self._entries[key] = entry
+
+    def _save_index(self):
+        temporary_path = f"{self.index_path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(temporary_path, self.index_path)
+
+    def _total_bytes(self) -> int:
+        sizes = {entry["digest"]: entry["size"] for entry in self._entries.values()}
+        return sum(sizes.values())
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        if all(other["digest"] != entry["digest"] for other in self._entries.values()):
+            try:
+                os.remove(self._object_path(entry["digest"]))
+            except OSError:
+                pass
+
+    def _response(self, entry: dict) -> dict:
+        return {
+            "file_path": self._object_path(entry["digest"]),
+            "file_name": entry["file_name"],
+            "digest": entry["digest"],
+            "size": entry["size"],
+        }
+
+    def get(self, cvr_id: int, locale: str = "en"):
+        """
+        Returns the cached file for a CVR ID and locale, or None on a miss or expired entry.
+
+        Returns:
+            dict: file_path, file_name, digest and size of the cached PDF.
+        """
+        if not self.enabled:
+            return None
+
+        key = self._key(cvr_id, locale)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if time.time() - entry["stored_at"] > self.ttl or not os.path.exists(self._object_path(entry["digest"])):
+                self._remove(key)
+                self._save_index()
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            entry["last_access"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._response(entry)
+
+    def put(self, cvr_id: int, locale: str, source_path: str, file_name: str = None) -> dict:
+        """
+        Moves a downloaded file into the cache and returns the cached entry.
+        """
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digest = digest.hexdigest()
+        size = os.path.getsize(source_path)
+
+        if not self.enabled:
+            return {"file_path": source_path, "file_name": file_name or os.path.basename(source_path),
+                    "digest": digest, "size": size}
+
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        key = self._key(cvr_id, locale)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if os.path.exists(object_path):
+                os.remove(source_path)  # Identical content is already stored
+            else:
+                shutil.move(source_path, object_path)
+
+            now = time.time()
+            self._entries[key] = {
+                "digest": digest,
+                "size": size,
+                "file_name": file_name or os.path.basename(source_path),
+                "stored_at": now,
+                "last_access": now,
+            }
+            while len(self._entries) > 1 and self._total_bytes() > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._save_index()
+            return self._response(self._entries[key])
+
+    def invalidate(self, cvr_id: int, locale: str = "en") -> bool:
+        """
+        Removes a single entry. Returns True if the key was cached.
+        """
+        key = self._key(cvr_id, locale)
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self._save_index()
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
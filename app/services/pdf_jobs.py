@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Seconds between sweeps for expired jobs and state files
+PRUNE_INTERVAL = 60.0
+
+
+class PDFJob:
+    def __init__(self, cvr_id: int, locale: str, use_cache: bool, client: str, priority: int):
+        self.id = uuid.uuid4().hex
+        self.cvr_id = cvr_id
+        self.locale = locale
+        self.use_cache = use_cache
+        self.client = client
+        self.priority = priority
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "cvr_id": self.cvr_id,
+            "locale": self.locale,
+            "priority": self.priority,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "file_name": self.result["file_name"] if self.result else None,
+            "file_path": self.result["file_path"] if self.result else None,
+            "digest": self.result["digest"] if self.result else None,
+            "error": self.error,
+        }
+
+
+class PDFJobQueue:
+    """
+    Runs PDF downloads in the background so HTTP requests only enqueue them.
+
+    Jobs are taken in priority order (lower number first). Within a priority, clients are served
+    round-robin, so one client submitting hundreds of CVR IDs cannot starve the others. Scheduler
+    threads hand jobs to `PDFService.download_pdf`, which runs them on the browser pool.
+
+    Job states are also written to `state_dir`, so any worker process sharing the download
+    directory can answer status requests for a job.
+
+    Args:
+        pdf_service (PDFService): Service that performs the downloads.
+        workers (int): Scheduler threads, normally the browser pool size.
+        state_dir (str): Directory for the job state files.
+        max_queued (int): Jobs allowed to wait at once.
+        retention (float): Seconds a finished job stays queryable.
+    """
+
+    def __init__(self, pdf_service, workers: int, state_dir: str, max_queued: int = 1000, retention: float = 3600.0):
+        self.pdf_service = pdf_service
+        self.state_dir = os.path.abspath(state_dir)
+        self.max_queued = max_queued
+        self.retention = retention
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        self._jobs = {}
+        self._pending = {}  # priority -> {client: deque of jobs}
+        self._rotation = {}  # priority -> deque of clients with pending jobs
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._save_lock = threading.Lock()
+        self._closed = False
+        self._last_prune = 0.0
+        self.completed = 0
+        self.failed = 0
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, cvr_id: int, locale: str = "en", use_cache: bool = True, client: str = "anonymous",
+               priority: int = 5) -> PDFJob:
+        """
+        Queues a PDF download and returns the job. A PDF already in the cache completes the job at once.
+        """
+        self._prune()
+        job = PDFJob(cvr_id, locale, use_cache, client, priority)
+        cached = self.pdf_service.cache.get(cvr_id, locale) if use_cache else None
+        if cached is not None:
+            job.state = DONE
+            job.finished_at = job.started_at = job.created_at
+            job.result = cached
+            with self._condition:
+                self._jobs[job.id] = job
+                self.completed += 1
+            self._save(job)
+            return job
+
+        with self._condition:
+            if self._closed:
+                raise Exception("PDF job queue is closed.")
+            if self._queued >= self.max_queued:
+                raise Exception("Too many queued PDF jobs, try again later.")
+            self._jobs[job.id] = job
+            clients = self._pending.setdefault(priority, {})
+            if client not in clients:
+                clients[client] = deque()
+                self._rotation.setdefault(priority, deque()).append(client)
+            clients[client].append(job)
+            self._queued += 1
+            self._condition.notify()
+        self._save(job)
+        return job
+
+    def _next_job(self) -> PDFJob:
+        """
+        Pops the next job: highest priority first, then round-robin over that priority's clients.
+        Must be called with the condition held.
+        """
+        priority = min(self._rotation)
+        rotation = self._rotation[priority]
+        client = rotation.popleft()
+        jobs = self._pending[priority][client]
+        job = jobs.popleft()
+        if jobs:
+            rotation.append(client)
+        else:
+            del self._pending[priority][client]
+            if not rotation:
+                del self._rotation[priority]
+                del self._pending[priority]
+        self._queued -= 1
+        return job
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._rotation and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job = self._next_job()
+                job.state = RUNNING
+                job.started_at = time.time()
+            self._save(job)
+
+            try:
+                result = self.pdf_service.download_pdf(job.cvr_id, job.locale, job.use_cache)
+                with self._condition:
+                    job.result = result
+                    job.state = DONE
+                    job.finished_at = time.time()
+                    self.completed += 1
+            except Exception as e:
+                with self._condition:
+                    job.error = str(e)
+                    job.state = FAILED
+                    job.finished_at = time.time()
+                    self.failed += 1
+            self._save(job)
+            self._prune()
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job: PDFJob):
+        """
+        Writes the job's current state. Saves are serialized, so the last write always holds the latest state.
+        """
+        with self._save_lock:
+            temporary_path = f"{self._state_path(job.id)}.tmp"
+            try:
+                with open(temporary_path, "w") as f:
+                    json.dump(job.to_dict(), f)
+                os.replace(temporary_path, self._state_path(job.id))
+            except OSError as e:
+                print(f"Error saving state of PDF job {job.id}: {e}")
+
+    def _prune(self):
+        """
+        Forgets finished jobs older than the retention period, at most every PRUNE_INTERVAL seconds.
+
+        State files not updated for the retention period are deleted too, including those of jobs
+        submitted to other worker processes, which may have exited since.
+        """
+        now = time.time()
+        cutoff = now - self.retention
+        with self._condition:
+            if now - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            active = {job_id for job_id, job in self._jobs.items() if job.finished_at is None}
+
+        try:
+            entries = list(os.scandir(self.state_dir))
+        except OSError as e:
+            print(f"Error listing PDF job states in {self.state_dir}: {e}")
+            return
+        for entry in entries:
+            if entry.name.split(".")[0] in active:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def get(self, job_id: str):
+        """
+        Returns the job's state as a dict, or None for an unknown or expired job.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+
+        # Submitted to another worker process
+        if len(job_id) != 32 or not all(character in "0123456789abcdef" for character in job_id):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "queued": self._queued,
+                "running": sum(1 for job in self._jobs.values() if job.state == RUNNING),
+                "queued_by_priority": {
+                    priority: sum(len(jobs) for jobs in clients.values())
+                    for priority, clients in sorted(self._pending.items())
+                },
+                "clients_waiting": sum(len(rotation) for rotation in self._rotation.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "workers": len(self._threads),
+            }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,234 @@
+from app.services.browser_pool import BrowserPool
+from app.services.cvr_service import settings
+from app.services import download_watcher
+from app.services.pdf_cache import PDFCache
+from app.services.single_flight import SingleFlight
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+
+def create_chrome_driver(download_dir: str):
+    """
+    Starts a headless Chrome that saves PDFs straight into `download_dir`.
+    """
+    from selenium import webdriver  # Imported on first use, it is slow to import and only needed for PDFs
+
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless=new")  # Headless mode
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.6778.69 Safari/537.36")
+    chrome_options.add_experimental_option("prefs", {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "plugins.always_open_pdf_externally": True,  # Ensure PDFs are downloaded directly
+    })
+
+    # Selenium Manager auto-installs correct driver
+    # To use a local driver instead:
+    # service = Service(r"for_selenium\chromedriver-win64\chromedriver.exe")
+    # return webdriver.Chrome(service=service, options=chrome_options)
+    return webdriver.Chrome(options=chrome_options)
+
+
+def set_download_directory(driver, download_dir: str):
+    """
+    Points the browser's downloads at `download_dir` through the DevTools protocol.
+    """
+    behavior = {"behavior": "allow", "downloadPath": download_dir}
+    try:
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", behavior)
+    except Exception:
+        driver.execute_cdp_cmd("Page.setDownloadBehavior", behavior)  # Older Chrome versions
+
+
+class _ZipStream:
+    """
+    Write-only, non-seekable file object that collects what zipfile writes until it is drained.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class PDFService:
+    def __init__(self, pool_size: int = None, driver_factory=create_chrome_driver):
+        self.base_url = "https://datacvr.virk.dk/gateway/pdf/hentVirksomhedsvisningSomPdf"
+        self.download_dir = os.path.abspath(settings.PDF_DOWNLOAD_DIR)  # Use absolute path for clarity
+        os.makedirs(self.download_dir, exist_ok=True)  # Ensure download directory exists
+
+        # Browsers are launched by warm_up() or the first download, never at construction
+        self.pool = BrowserPool(
+            driver_factory,
+            size=pool_size or settings.PDF_POOL_SIZE,
+            download_root=self.download_dir,
+            max_jobs_per_worker=settings.PDF_MAX_JOBS_PER_BROWSER,
+            checkout_timeout=settings.PDF_CHECKOUT_TIMEOUT,
+        )
+        self.cache = PDFCache(
+            settings.PDF_CACHE_DIR,
+            ttl=settings.PDF_CACHE_TTL,
+            max_bytes=settings.PDF_CACHE_MAX_BYTES,
+            enabled=settings.PDF_CACHE_ENABLED,
+        )
+        self.single_flight = SingleFlight()
+
+    def warm_up(self, wait: bool = False):
+        """
+        Launches the browser pool in the background so the first downloads do not pay for a Chrome start-up.
+        """
+        self.pool.start(wait=wait)
+
+    def is_ready(self) -> bool:
+        """
+        True once at least one browser can take a download.
+        """
+        return self.pool.ready
+
+    def wait_for_pdf_download(self, download_dir: str, timeout: int = None) -> str:
+        """
+        Waits for the PDF download to complete in the job's `download_dir` and returns the full file path.
+        """
+        timeout = timeout or settings.PDF_DOWNLOAD_TIMEOUT
+        return download_watcher.wait_for_download(download_dir, timeout, settings.PDF_DOWNLOAD_POLL_INTERVAL)
+
+    def download_pdf(self, cvr_id: int, locale: str = "en", use_cache: bool = True) -> dict:
+        """
+        Returns the PDF for a given CVR ID, from the PDF cache when possible.
+
+        Concurrent requests for the same CVR ID and locale share one browser navigation.
+
+        Args:
+            cvr_id (int): The CVR ID of the company.
+            locale (str): Language of the PDF, "en" or "da".
+            use_cache (bool): Set to False to force a fresh download.
+
+        Returns:
+            dict: A dictionary with file path, file name, content digest, and a message.
+        """
+        if use_cache:
+            cached = self.cache.get(cvr_id, locale)
+            if cached is not None:
+                return {
+                    "file_path": cached["file_path"],
+                    "file_name": cached["file_name"],
+                    "digest": cached["digest"],
+                    "message": "PDF served from cache."
+                }
+
+        result, shared = self.single_flight.do((cvr_id, locale), self._download_and_store, cvr_id, locale)
+        return {
+            "file_path": result["file_path"],
+            "file_name": result["file_name"],
+            "digest": result["digest"],
+            "message": "PDF downloaded successfully."
+        }
+
+    def _download_and_store(self, cvr_id: int, locale: str) -> dict:
+        """
+        Downloads the PDF with a pooled browser and moves it into the PDF cache.
+        """
+        downloaded_file_path = self._download_with_browser(cvr_id, locale)
+        entry = self.cache.put(cvr_id, locale, downloaded_file_path, os.path.basename(downloaded_file_path))
+        if self.cache.enabled:
+            shutil.rmtree(os.path.dirname(downloaded_file_path), ignore_errors=True)
+        return entry
+
+    def _download_with_browser(self, cvr_id: int, locale: str) -> str:
+        """
+        Downloads the PDF for a given CVR ID on a pooled browser and waits for it to complete.
+
+        Every job downloads into a fresh directory, so the first completed file in it is the job's PDF.
+
+        Returns:
+            str: Path of the downloaded file.
+        """
+        job_dir = tempfile.mkdtemp(prefix=f"{cvr_id}-", dir=self.download_dir)
+        try:
+            with self.pool.worker() as worker:
+                set_download_directory(worker.driver, job_dir)
+                url = f"{self.base_url}?cvrnummer={cvr_id}&locale={locale}"
+                print(f"Navigating to URL: {url} (browser worker {worker.id})")
+                worker.driver.get(url)
+                print("URL loaded in browser. Waiting for PDF download...")
+
+                # Wait for the file to download
+                downloaded_file_path = self.wait_for_pdf_download(job_dir)
+                print(f"PDF downloaded to: {downloaded_file_path}")
+                return downloaded_file_path
+
+        except Exception as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            print(f"Error downloading PDF: {e}")
+            raise Exception(f"Error downloading PDF: {e}")
+
+    def iter_pdf_bundle(self, cvr_ids: list, locale: str = "en", concurrency: int = None):
+        """
+        Yields a ZIP archive with the PDFs of many companies, in chunks, as the PDFs become available.
+
+        Missing PDFs are fetched in parallel through the PDF cache and browser pool, and each one is
+        written to the archive as soon as it completes. Entries are stored uncompressed (PDFs are
+        compressed already) and copied from disk in 1 MiB blocks, so memory stays bounded. CVR IDs
+        that fail are listed in an `errors.txt` entry at the end.
+
+        Args:
+            cvr_ids (list): CVR IDs to include; duplicates are included once.
+            locale (str): Language of the PDFs, "en" or "da".
+            concurrency (int): PDFs fetched at once, defaults to the browser pool size.
+        """
+        cvr_ids = list(dict.fromkeys(cvr_ids))
+        stream = _ZipStream()
+        executor = ThreadPoolExecutor(max_workers=concurrency or self.pool.size)
+        futures = {executor.submit(self.download_pdf, cvr_id, locale): cvr_id for cvr_id in cvr_ids}
+        errors = []
+        try:
+            with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+                for future in as_completed(futures):
+                    cvr_id = futures[future]
+                    try:
+                        result = future.result()
+                        info = zipfile.ZipInfo(f"{cvr_id}.pdf", time.localtime(os.path.getmtime(result["file_path"]))[:6])
+                        info.file_size = os.path.getsize(result["file_path"])
+                        with open(result["file_path"], "rb") as source, archive.open(info, "w") as entry:
+                            for block in iter(lambda: source.read(1024 * 1024), b""):
+                                entry.write(block)
+                                yield stream.drain()
+                    except Exception as e:
+                        errors.append(f"{cvr_id}: {e}")
+                    yield stream.drain()
+
+                if errors:
+                    archive.writestr("errors.txt", "\n".join(errors) + "\n")
+            yield stream.drain()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def pool_metrics(self) -> dict:
+        metrics = self.pool.metrics()
+        metrics["download_detection"] = download_watcher.DETECTION_MODE
+        metrics["single_flight"] = self.single_flight.stats()
+        return metrics
+
+    def close_driver(self):
+        """
+        Manually close the browser pool when no longer needed.
+        """
+        self.pool.close()
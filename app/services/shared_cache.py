@@ -0,0 +1,369 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class JSONSerializer:
+    """
+    Stores values as UTF-8 JSON. Tuples come back as lists, which unpack the same way.
+    """
+    name = "json"
+
+    @staticmethod
+    def dumps(value) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def loads(data: bytes):
+        return json.loads(data)
+
+
+class PickleSerializer:
+    """
+    Faster for large documents, but only use it when no other user can write the cache file.
+    """
+    name = "pickle"
+
+    @staticmethod
+    def dumps(value) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes):
+        return pickle.loads(data)
+
+
+SERIALIZERS = {serializer.name: serializer for serializer in (JSONSerializer, PickleSerializer)}
+
+# Seconds between writes of this process' hit counters to the shared stats table
+STATS_FLUSH_INTERVAL = 5.0
+# Seconds after which a refresh claimed by a process that died may be claimed again
+REFRESH_CLAIM_TIMEOUT = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_accessed_at ON documents (accessed_at);
+CREATE TABLE IF NOT EXISTS negatives (
+    key TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS negatives_stored_at ON negatives (stored_at);
+CREATE TABLE IF NOT EXISTS refreshing (
+    key TEXT PRIMARY KEY,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_stats (
+    pid INTEGER PRIMARY KEY,
+    hits INTEGER NOT NULL,
+    stale_hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    negative_hits INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SharedDocumentCache:
+    """
+    DocumentCache backed by an SQLite file, shared by every worker process on the host.
+
+    It has the same interface and fresh/stale/negative semantics as DocumentCache, so a hot
+    company document is fetched once per host instead of once per gunicorn worker. The database
+    runs in WAL mode, so readers never block each other. Values go through a pluggable serializer,
+    and each process reports its own hit counters to a shared table, so `stats` shows hit rates
+    per worker.
+
+    Args:
+        path (str): SQLite database file.
+        max_entries (int): Documents kept, and failures remembered; the oldest are deleted beyond this.
+        ttl (float): Seconds an entry is fresh.
+        enabled (bool): When False every lookup misses.
+        stale_ttl (float): Further seconds a stale entry is still served.
+        negative_ttl (float): Seconds an unknown key is remembered.
+        serializer: Object with dumps/loads, or a SERIALIZERS name.
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, ttl: float = 300.0, enabled: bool = True,
+                 stale_ttl: float = 0.0, negative_ttl: float = 0.0, serializer="json"):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        if isinstance(serializer, str):
+            if serializer not in SERIALIZERS:
+                raise Exception(f"Unknown cache serializer: {serializer}. Valid serializers: {', '.join(SERIALIZERS)}")
+            serializer = SERIALIZERS[serializer]
+        self.serializer = serializer
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.negative_hits = 0
+        self.refreshes = 0
+        if enabled:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        One connection per thread and process; connections are never shared across a fork.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        self._maybe_flush_stats()
+
+    def lookup(self, key, accept=None):
+        """
+        Returns (value, is_stale) for a cached key, or None on a miss or expired entry.
+        """
+        if not self.enabled:
+            return None
+
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, stored_at, accessed_at FROM documents WHERE key = ?", (str(key),)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        data, stored_at, accessed_at = row
+        now = time.time()
+        age = now - stored_at
+        if age > self.ttl + self.stale_ttl:
+            connection.execute("DELETE FROM documents WHERE key = ? AND stored_at = ?", (str(key), stored_at))
+            self._count("expirations")
+            self._count("misses")
+            return None
+
+        value = self.serializer.loads(data)
+        if accept is not None and not accept(value):
+            self._count("misses")
+            return None
+
+        if now - accessed_at > 1.0:  # Bounds the LRU bookkeeping to one write per key per second
+            connection.execute("UPDATE documents SET accessed_at = ? WHERE key = ?", (now, str(key)))
+        if age > self.ttl:
+            self._count("stale_hits")
+            return value, True
+        self._count("hits")
+        return value, False
+
+    def get(self, key, accept=None):
+        """
+        Returns the cached value for the key if it is fresh, or None.
+        """
+        entry = self.lookup(key, accept)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def peek(self, key):
+        """
+        Returns the cached value, fresh or stale, without touching the statistics or the LRU order.
+        """
+        if not self.enabled:
+            return None
+
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM documents WHERE key = ?", (str(key),)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl + self.stale_ttl:
+            return None
+        return self.serializer.loads(row[0])
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO documents (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (str(key), self.serializer.dumps(value), now, now))
+            connection.execute("DELETE FROM negatives WHERE key = ?", (str(key),))
+            connection.execute("DELETE FROM refreshing WHERE key = ?", (str(key),))
+            evicted = connection.execute(
+                "DELETE FROM documents WHERE key IN (SELECT key FROM documents ORDER BY accessed_at LIMIT "
+                "max((SELECT COUNT(*) FROM documents) - ?, 0))", (self.max_entries,)).rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def begin_refresh(self, key) -> bool:
+        """
+        Claims the background refresh of a stale key for this host. Returns False if another
+        thread or worker already runs it.
+        """
+        now = time.time()
+        connection = self._connection()
+        connection.execute("DELETE FROM refreshing WHERE key = ? AND claimed_at < ?",
+                           (str(key), now - REFRESH_CLAIM_TIMEOUT))
+        claimed = connection.execute(
+            "INSERT OR IGNORE INTO refreshing (key, claimed_at) VALUES (?, ?)", (str(key), now)).rowcount == 1
+        if claimed:
+            self._count("refreshes")
+        return claimed
+
+    def end_refresh(self, key):
+        self._connection().execute("DELETE FROM refreshing WHERE key = ?", (str(key),))
+
+    def set_negative(self, key, message: str):
+        """
+        Remembers that a lookup for the key failed with `message`.
+        """
+        if not self.enabled or self.negative_ttl <= 0:
+            return
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO negatives (key, message, stored_at) VALUES (?, ?, ?)",
+                (str(key), message, time.time()))
+            # Bounded like the documents, oldest failures first
+            connection.execute(
+                "DELETE FROM negatives WHERE key IN (SELECT key FROM negatives ORDER BY stored_at LIMIT "
+                "max((SELECT COUNT(*) FROM negatives) - ?, 0))", (self.max_entries,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_negative(self, key):
+        """
+        Returns the remembered failure message for the key, or None.
+        """
+        if not self.enabled:
+            return None
+
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT message, stored_at FROM negatives WHERE key = ?", (str(key),)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.negative_ttl:
+            connection.execute("DELETE FROM negatives WHERE key = ? AND stored_at = ?", (str(key), row[1]))
+            return None
+        self._count("negative_hits")
+        return row[0]
+
+    def invalidate(self, key) -> bool:
+        """
+        Removes a single entry, including a remembered failure. Returns True if the key was cached.
+        """
+        if not self.enabled:
+            return False
+
+        connection = self._connection()
+        removed = connection.execute("DELETE FROM documents WHERE key = ?", (str(key),)).rowcount
+        removed += connection.execute("DELETE FROM negatives WHERE key = ?", (str(key),)).rowcount
+        connection.execute("DELETE FROM refreshing WHERE key = ?", (str(key),))
+        return removed > 0
+
+    def clear(self):
+        if not self.enabled:
+            return
+
+        connection = self._connection()
+        for table in ("documents", "negatives", "refreshing"):
+            connection.execute(f"DELETE FROM {table}")
+
+    def _maybe_flush_stats(self, force: bool = False):
+        """
+        Writes this process' counters to the shared stats table, at most every STATS_FLUSH_INTERVAL seconds.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_flush < STATS_FLUSH_INTERVAL:
+                return
+            self._last_flush = now
+            if self._pid != os.getpid():
+                # Forked worker: start counting from zero under its own PID
+                self._pid = os.getpid()
+                self.hits = self.stale_hits = self.misses = self.negative_hits = 0
+            row = (self._pid, self.hits, self.stale_hits, self.misses, self.negative_hits, now)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO worker_stats (pid, hits, stale_hits, misses, negative_hits, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", row)
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False, "backend": "sqlite"}
+
+        self._maybe_flush_stats(force=True)
+        connection = self._connection()
+        entries = connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        negative_entries = connection.execute("SELECT COUNT(*) FROM negatives").fetchone()[0]
+        refreshes_in_flight = connection.execute("SELECT COUNT(*) FROM refreshing").fetchone()[0]
+        # Workers that have not reported for an hour are gone
+        connection.execute("DELETE FROM worker_stats WHERE updated_at < ?", (time.time() - 3600,))
+        workers = []
+        for pid, hits, stale_hits, misses, negative_hits, updated_at in connection.execute(
+                "SELECT pid, hits, stale_hits, misses, negative_hits, updated_at FROM worker_stats ORDER BY pid"):
+            lookups = hits + stale_hits + misses
+            workers.append({
+                "pid": pid,
+                "hits": hits,
+                "stale_hits": stale_hits,
+                "misses": misses,
+                "negative_hits": negative_hits,
+                "hit_rate": round((hits + stale_hits) / lookups, 4) if lookups else 0.0,
+                "updated_at": updated_at,
+            })
+
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "enabled": True,
+                "backend": "sqlite",
+                "path": self.path,
+                "serializer": getattr(self.serializer, "name", type(self.serializer).__name__),
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "stale_ttl_seconds": self.stale_ttl,
+                "negative_ttl_seconds": self.negative_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "refreshes": self.refreshes,
+                "refreshes_in_flight": refreshes_in_flight,
+                "negative_entries": negative_entries,
+                "negative_hits": self.negative_hits,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "workers": workers,
+            }
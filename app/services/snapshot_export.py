@@ -0,0 +1,258 @@
+"""
+Exports a snapshot of the whole CVR register to chunked Parquet files for analytics.
+
+The `Vrvirksomhed` index is paged through with search_after on cvrNummer, fetching only the
+`_source` fields the general-info and ownership extractors read. Pages are parsed by those
+extractors in a pool of worker processes while the next page downloads, and rows are written
+out every --rows-per-file rows, so memory stays bounded by a few pages and one file of rows.
+
+Output layout:
+    <out>/companies/part-00000.parquet   one row per company (the /get-general-info fields)
+    <out>/ownership/part-00000.parquet   one row per owner edge (the /get-ownership-info fields)
+    <out>/manifest.json                  row counts, files and throughput
+
+Parquet needs pyarrow (pip install pyarrow); --format csv writes the same parts as CSV without it.
+
+Usage:
+    python -m app.services.snapshot_export --out ./snapshot [--workers 4] [--page-size 1000]
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import Settings
+from app.services import extractors
+from app.services.cvr_client import CVRClient
+from dotenv import load_dotenv
+
+EXPORT_FIELDS = extractors.merge_fields(extractors.GENERAL_INFO_FIELDS, extractors.OWNERSHIP_FIELDS)
+
+COMPANY_COLUMNS = [
+    "cvr_number", "company_name", "address", "postal_code", "city", "start_date",
+    "business_type", "advertising_protection", "status",
+]
+OWNERSHIP_COLUMNS = [
+    "cvr_number", "company_name", "owner_name", "ownership_type", "ownership_percentage",
+    "voting_percentage", "start_date", "end_date", "address",
+]
+
+
+def parse_page(documents: list) -> tuple:
+    """
+    Runs the extractors over one page of `Vrvirksomhed` documents. Executed in the worker processes.
+
+    Returns:
+        tuple: (company rows, ownership rows, error messages)
+    """
+    companies, ownership, errors = [], [], []
+    for company_data in documents:
+        cvr_id = company_data.get('cvrNummer')
+        try:
+            companies.append(extractors.extract_general_info(company_data))
+            owners = extractors.extract_ownership_info(company_data, cvr_id)
+        except Exception as e:
+            errors.append(f"CVR ID {cvr_id}: {e}")
+            continue
+        for owner in owners.legal_owners + owners.beneficial_owners + owners.terminated_owners:
+            row = owner.model_dump()
+            row["cvr_number"] = cvr_id
+            row["company_name"] = owners.company_name
+            ownership.append(row)
+    return companies, ownership, errors
+
+
+class _PartWriter:
+    """
+    Buffers rows of one table and writes them as numbered part files of at most rows_per_file rows.
+    """
+
+    def __init__(self, directory: str, columns: list, rows_per_file: int, file_format: str):
+        self.directory = directory
+        self.columns = columns
+        self.rows_per_file = rows_per_file
+        self.file_format = file_format
+        self.rows = []
+        self.files = []
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+        if file_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise Exception("Parquet export needs pyarrow: pip install pyarrow, or use --format csv")
+            self._pyarrow = pyarrow
+            self._parquet = pyarrow.parquet
+            self._schema = pyarrow.schema([
+                (column, pyarrow.int64() if column == "cvr_number" else pyarrow.string()) for column in columns
+            ])
+
+    def add(self, rows: list):
+        self.rows.extend(rows)
+        while len(self.rows) >= self.rows_per_file:
+            self._write(self.rows[:self.rows_per_file])
+            self.rows = self.rows[self.rows_per_file:]
+
+    def close(self):
+        if self.rows or not self.files:
+            self._write(self.rows)
+        self.rows = []
+
+    def _write(self, rows: list):
+        path = os.path.join(self.directory, f"part-{len(self.files):05d}.{self.file_format}")
+        if self.file_format == "parquet":
+            columns = {
+                column: [row.get(column) if column == "cvr_number" else _text(row.get(column)) for row in rows]
+                for column in self.columns
+            }
+            self._parquet.write_table(self._pyarrow.table(columns, schema=self._schema), path, compression="zstd")
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(rows)
+        self.files.append(path)
+        self.written += len(rows)
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _pages(client: CVRClient, page_size: int):
+    """
+    Yields the `_source` documents of the whole index, one search_after page at a time.
+    """
+    search_after = None
+    while True:
+        query = {
+            "size": page_size,
+            "query": {"match_all": {}},
+            "_source": {"includes": EXPORT_FIELDS},
+            "sort": [{"Vrvirksomhed.cvrNummer": "asc"}],
+        }
+        if search_after:
+            query["search_after"] = search_after
+        hits = client.search(query)['hits']['hits']
+        if hits:
+            yield [hit['_source']['Vrvirksomhed'] for hit in hits]
+        if len(hits) < page_size:
+            return
+        search_after = hits[-1]['sort']
+
+
+def export_snapshot(client: CVRClient, out_dir: str, page_size: int = 1000, rows_per_file: int = 100000,
+                    workers: int = None, file_format: str = "parquet") -> dict:
+    """
+    Writes the companies and ownership tables of the whole register to out_dir.
+
+    Args:
+        client (CVRClient): Upstream client.
+        out_dir (str): Output directory; part files are numbered from 0 in each table directory.
+        page_size (int): Companies per upstream page.
+        rows_per_file (int): Rows per part file.
+        workers (int): Parser processes; 1 parses in this process. Defaults to the number of cores.
+        file_format (str): "parquet" or "csv".
+
+    Returns:
+        dict: The manifest, also written to out_dir/manifest.json.
+    """
+    if file_format not in ("parquet", "csv"):
+        raise Exception(f"Unknown export format: {file_format}. Valid formats: parquet, csv")
+    if glob.glob(os.path.join(out_dir, "*", "part-*")):
+        raise Exception(f"{out_dir} already contains a snapshot, export to an empty directory")
+    workers = workers or os.cpu_count() or 1
+    tables = {
+        "companies": _PartWriter(os.path.join(out_dir, "companies"), COMPANY_COLUMNS, rows_per_file, file_format),
+        "ownership": _PartWriter(os.path.join(out_dir, "ownership"), OWNERSHIP_COLUMNS, rows_per_file, file_format),
+    }
+    errors = []
+    pages = 0
+    start = time.perf_counter()
+
+    def collect(result):
+        companies, ownership, page_errors = result
+        tables["companies"].add(companies)
+        tables["ownership"].add(ownership)
+        errors.extend(page_errors)
+
+    if workers <= 1:
+        for documents in _pages(client, page_size):
+            collect(parse_page(documents))
+            pages += 1
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # At most two pages per worker are held in memory; results are written in page order
+            pending = []
+            for documents in _pages(client, page_size):
+                pending.append(executor.submit(parse_page, documents))
+                pages += 1
+                if len(pending) >= workers * 2:
+                    collect(pending.pop(0).result())
+            for future in pending:
+                collect(future.result())
+
+    for writer in tables.values():
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    companies = tables["companies"].written
+    manifest = {
+        "format": file_format,
+        "created_at": time.time(),
+        "seconds": round(elapsed, 3),
+        "pages": pages,
+        "workers": workers,
+        "companies_per_second": round(companies / elapsed, 1) if elapsed > 0 else 0.0,
+        "errors": len(errors),
+        "tables": {
+            name: {"rows": writer.written, "files": [os.path.relpath(path, out_dir) for path in writer.files]}
+            for name, writer in tables.items()
+        },
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    for error in errors[:10]:
+        print(f"Skipped company: {error}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument("--rows-per-file", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes, defaults to the number of cores")
+    args = parser.parse_args()
+
+    load_dotenv()
+    settings = Settings()
+    client = CVRClient(
+        base_url=settings.CVR_API_URL,
+        auth=(settings.CVR_API_USERNAME, settings.CVR_API_PASSWORD),
+        connect_timeout=settings.CVR_HTTP_CONNECT_TIMEOUT,
+        read_timeout=settings.CVR_HTTP_READ_TIMEOUT,
+    )
+    try:
+        manifest = export_snapshot(
+            client,
+            args.out,
+            page_size=args.page_size or settings.CVR_EXPORT_PAGE_SIZE,
+            rows_per_file=args.rows_per_file or settings.CVR_EXPORT_ROWS_PER_FILE,
+            workers=args.workers or settings.CVR_EXPORT_WORKERS or None,
+            file_format=args.format,
+        )
+    finally:
+        client.close()
+    tables = manifest["tables"]
+    print(f"Exported {tables['companies']['rows']} companies and {tables['ownership']['rows']} ownership edges "
+          f"in {manifest['seconds']} s ({manifest['companies_per_second']} companies/s) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
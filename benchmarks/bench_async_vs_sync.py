@@ -0,0 +1,69 @@
+"""
+Throughput of the sync (threadpool) and async request paths against a local mock ES server.
+
+The mock server runs in its own process, so only the client side shares this process's GIL.
+
+Usage:
+    python -m benchmarks.bench_async_vs_sync --requests 1000 --concurrency 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_es import MockESProcess, configure_environment, generate_index
+
+
+def run_sync(service, cvr_ids: list, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(service.get_general_info_by_cvr_id, cvr_ids))
+    return time.perf_counter() - start
+
+
+async def run_async(service, cvr_ids: list, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(cvr_id):
+        async with semaphore:
+            return await service.get_general_info_by_cvr_id(cvr_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(fetch(cvr_id) for cvr_id in cvr_ids))
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=1000, help="Distinct CVR IDs requested in turn")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="In-flight requests on the async path")
+    parser.add_argument("--threads", type=int, default=40, help="Worker threads on the sync path (FastAPI's default threadpool size)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Emulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies)
+    cvr_ids = [documents[i % len(documents)]["Vrvirksomhed"]["cvrNummer"] for i in range(args.requests)]
+
+    with MockESProcess(documents, latency=args.latency) as server:
+        configure_environment(server.url)
+        from app.services.cvr_service import AsyncCVRService, CVRService
+        from app.services.document_cache import DocumentCache
+
+        # Both paths must reach the upstream; a shared cache would answer the second run from the first
+        sync_elapsed = run_sync(CVRService(cache=DocumentCache(enabled=False)), cvr_ids, args.threads)
+        sync_upstream = server.requests
+        async_elapsed = asyncio.run(run_async(AsyncCVRService(cache=DocumentCache(enabled=False)), cvr_ids, args.concurrency))
+        async_upstream = server.requests - sync_upstream
+
+    # Concurrent requests for the same CVR ID share one upstream call (single flight), so with
+    # fewer companies than requests the upstream counts can be below the request count
+    print(f"{args.requests} requests over {args.companies} companies, upstream latency {args.latency * 1000:.0f} ms, cache disabled")
+    print(f"sync  ({args.threads} threads):   {sync_elapsed:7.2f} s  {args.requests / sync_elapsed:8.1f} req/s  {sync_upstream} upstream")
+    print(f"async ({args.concurrency} in flight): {async_elapsed:7.2f} s  {args.requests / async_elapsed:8.1f} req/s  {async_upstream} upstream")
+
+
+if __name__ == "__main__":
+    main()
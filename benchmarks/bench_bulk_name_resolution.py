@@ -0,0 +1,68 @@
+"""
+Throughput (names/second) of bulk name-to-CVR resolution against a local mock ES server.
+
+The input mimics a spreadsheet: names from the fixture index with varying case and spacing,
+plus duplicates, so the dedupe step is exercised as well as the `_msearch` batching.
+
+Usage:
+    python -m benchmarks.bench_bulk_name_resolution --names 5000 --duplicates 0.5 --latency 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.mock_es import MockESServer, configure_environment, generate_index
+
+
+def make_names(documents: list, count: int, duplicates: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        if names and rng.random() < duplicates:
+            names.append(rng.choice(names))
+            continue
+        name = rng.choice(documents)["Vrvirksomhed"]["virksomhedMetadata"]["nyesteNavn"]["navn"]
+        variant = rng.choice([str.upper, str.lower, str.title, lambda n: n.replace(" ", "  ")])
+        names.append(variant(name))
+    return names
+
+
+async def resolve(service, names: list, batch_size: int, concurrency: int) -> tuple:
+    matched = 0
+    start = time.perf_counter()
+    async for result in service.resolve_names(names, batch_size=batch_size, concurrency=concurrency):
+        matched += result["cvr_number"] is not None
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=500)
+    parser.add_argument("--names", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.5, help="Share of input rows repeating an earlier name")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Emulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies)
+    names = make_names(documents, args.names, args.duplicates)
+
+    with MockESServer(documents, latency=args.latency) as server:
+        configure_environment(server.url)
+        from app.services.cvr_service import AsyncCVRService
+        from app.services.name_resolution import name_key
+
+        elapsed, matched = asyncio.run(resolve(AsyncCVRService(), names, args.batch_size, args.concurrency))
+        upstream_requests = server.requests
+
+    print(f"{len(names)} names ({len(set(map(name_key, names)))} unique), {matched} matched")
+    print(f"{upstream_requests} _msearch requests, batch size {args.batch_size}, concurrency {args.concurrency}")
+    print(f"{elapsed:.2f} s  {len(names) / elapsed:.1f} names/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Accuracy and single-core throughput of the local fuzzy name matcher.
+
+Queries are names from a fixture index written the way people type them: other case and
+spacing, the legal form dropped or changed, and one or two typos. Every query is distinct, so
+the per-query memo never helps. A sample is also resolved with the upstream `match` query the
+/get-cvr-id endpoint used to trust, for comparison.
+
+Usage:
+    python -m benchmarks.bench_fuzzy_matcher --companies 50000 --queries 20000 --typos 0.5
+"""
+import argparse
+import random
+import string
+import time
+
+from benchmarks.mock_es import MockESServer, configure_environment, generate_index
+
+
+ONSETS = ["", "b", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "r", "s", "t", "v", "sk", "st", "tr", "br"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "æ", "ø", "å"]
+CODAS = ["", "", "n", "r", "l", "s", "t", "nd", "rk", "ng", "gaard", "sen", "lund", "borg"]
+
+
+def rename_companies(documents: list, seed: int = 3):
+    """
+    The fixture draws names from a few dozen words, so every trigram is common. This gives the
+    names the spread of a real register: one or two coined words, with syllables drawn
+    Zipf-distributed, in front of a fixture word and the legal form.
+    """
+    rng = random.Random(seed)
+    syllables = [onset + vowel + coda for onset in ONSETS for vowel in VOWELS for coda in CODAS]
+    rng.shuffle(syllables)
+    weights = [1 / rank for rank in range(1, len(syllables) + 1)]
+    for document in documents:
+        metadata = document["Vrvirksomhed"]["virksomhedMetadata"]
+        words = metadata["nyesteNavn"]["navn"].split()
+        coined = ["".join(rng.choices(syllables, weights, k=rng.randint(2, 3))).title()
+                  for _ in range(rng.randint(1, 2))]
+        name = " ".join(coined + words[1:])
+        metadata["nyesteNavn"]["navn"] = name
+        document["Vrvirksomhed"]["navne"][0]["navn"] = name
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    letters = list(name)
+    positions = [index for index, char in enumerate(letters) if char.isalpha()]
+    index = rng.choice(positions)
+    edit = rng.choice(["delete", "replace", "swap", "insert"])
+    if edit == "delete":
+        del letters[index]
+    elif edit == "replace":
+        letters[index] = rng.choice(string.ascii_lowercase)
+    elif edit == "swap" and index + 1 < len(letters):
+        letters[index], letters[index + 1] = letters[index + 1], letters[index]
+    else:
+        letters.insert(index, rng.choice(string.ascii_lowercase))
+    return "".join(letters)
+
+
+def make_queries(documents: list, count: int, typos: float, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    queries, seen = [], set()
+    while len(queries) < count:
+        company = rng.choice(documents)["Vrvirksomhed"]
+        name = company["virksomhedMetadata"]["nyesteNavn"]["navn"]
+        base, _, legal_form = name.rpartition(" ")
+        query = rng.choice([name, base, f"{base} {rng.choice(['A/S', 'ApS', 'a/s', 'APS'])}"])
+        query = rng.choice([str.upper, str.lower, str.title, lambda text: text.replace(" ", "  ")])(query)
+        if rng.random() < typos:
+            query = misspell(query, rng)
+            if rng.random() < 0.3:
+                query = misspell(query, rng)
+        if query not in seen:
+            seen.add(query)
+            queries.append((query, company["cvrNummer"], name))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--typos", type=float, default=0.5, help="Share of queries with one or two typos")
+    parser.add_argument("--upstream-sample", type=int, default=300)
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies, relations=1)
+    rename_companies(documents)
+    queries = make_queries(documents, args.queries, args.typos)
+    names = {document["Vrvirksomhed"]["cvrNummer"]: document["Vrvirksomhed"]["virksomhedMetadata"]["nyesteNavn"]["navn"]
+             for document in documents}
+
+    with MockESServer(documents) as server:
+        configure_environment(server.url)
+        from app.services.cvr_service import CVRService
+        from app.services.fuzzy_matcher import FuzzyMatcher, split_legal_form
+
+        matcher = FuzzyMatcher()
+        start = time.perf_counter()
+        matcher.load({cvr: name for cvr, name in names.items()})
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        answers = [matcher.match(query, 3) for query, _, _ in queries]
+        elapsed = time.perf_counter() - start
+
+        def correct(cvr, name):
+            # A query without the legal form cannot tell "X A/S" from "X ApS", so a company
+            # with the same name apart from the legal form counts as correct
+            return cvr is not None and split_legal_form(names[cvr])[0] == split_legal_form(name)[0]
+
+        local_correct = sum(
+            bool(candidates) and correct(candidates[0]["cvr_number"], name)
+            for candidates, (_, _, name) in zip(answers, queries))
+
+        service = CVRService()
+        sample = queries[:args.upstream_sample]
+        upstream_correct = 0
+        for query, _, name in sample:
+            try:
+                upstream_correct += correct(service.get_cvr_id_by_company_name(query), name)
+            except Exception:
+                pass
+        local_sample_correct = sum(
+            bool(candidates) and correct(candidates[0]["cvr_number"], name)
+            for candidates, (_, _, name) in zip(answers[:len(sample)], sample))
+
+    stats = matcher.stats()
+    print(f"{args.companies} companies indexed in {build_seconds:.2f} s ({stats['distinct_names']} distinct names, {stats['trigrams']} trigrams)")
+    print(f"{len(queries)} distinct queries ({args.typos:.0%} with typos): {elapsed:.2f} s, "
+          f"{len(queries) / elapsed:,.0f} lookups/s on one core, {stats['exact_matches']} exact after normalization")
+    print(f"top-1 correct: local {local_correct / len(queries):.1%}")
+    print(f"first {len(sample)} queries: local {local_sample_correct / len(sample):.1%}, "
+          f"upstream match {upstream_correct / len(sample):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency of partial-name search from the local name index versus the upstream match_phrase_prefix query.
+
+A fixture index is synced into a temporary company store, the name index is built from it, and
+the same typing sequences ("n", "no", "nor", ...) are answered by both paths. The first page of
+each answer is compared, and an incremental refresh after a batch of renames is timed as well.
+
+Usage:
+    python -m benchmarks.bench_name_index --companies 20000 --queries 200 --latency 0.02
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.mock_es import MockESServer, configure_environment, generate_index
+
+
+def typing_sequences(documents: list, count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    prefixes = []
+    while len(prefixes) < count:
+        name = rng.choice(documents)["Vrvirksomhed"]["virksomhedMetadata"]["nyesteNavn"]["navn"]
+        word = rng.choice(name.split()[:2])
+        prefixes.extend(word[:length] for length in range(1, len(word) + 1))
+    return prefixes[:count]
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--renames", type=int, default=500, help="Companies changed before the incremental refresh")
+    parser.add_argument("--latency", type=float, default=0.02, help="Emulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies, relations=1)
+    prefixes = typing_sequences(documents, args.queries)
+
+    with MockESServer(documents, latency=args.latency) as server:
+        configure_environment(server.url)
+        from app.repositories.company_store import CompanyStore
+        from app.services.company_sync import CompanySync
+        from app.services.cvr_client import CVRClient
+        from app.services.cvr_service import CVRService
+        from app.services.name_index import NameIndex
+
+        store = CompanyStore(os.path.join(tempfile.mkdtemp(prefix="bench-name-index-"), "companies.sqlite3"))
+        client = CVRClient(server.url, ("benchmark", "benchmark"))
+        sync = CompanySync(store, client, page_size=2000)
+        sync.run()
+
+        index = NameIndex()
+        start = time.perf_counter()
+        index.refresh_from_store(store)
+        build_seconds = time.perf_counter() - start
+
+        service = CVRService()  # No name index configured, so every search goes upstream
+        local, remote, agree = [], [], 0
+        for prefix in prefixes:
+            start = time.perf_counter()
+            local_page = index.page(prefix, args.limit)
+            local.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            remote_page = service.search_companies_by_partial_name(prefix, args.limit)
+            remote.append(time.perf_counter() - start)
+            agree += [company["cvr_number"] for company in local_page["results"]] == \
+                [company["cvr_number"] for company in remote_page["results"]]
+
+        typeahead = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.search(prefix, 10)
+            typeahead.append(time.perf_counter() - start)
+
+        for document in random.Random(3).sample(documents, min(args.renames, len(documents))):
+            company = document["Vrvirksomhed"]
+            company["virksomhedMetadata"]["nyesteNavn"]["navn"] = "Renamed " + company["virksomhedMetadata"]["nyesteNavn"]["navn"]
+            company["sidstIndlaest"] = "2099-01-01T00:00:00.000+02:00"
+        sync.run()
+        start = time.perf_counter()
+        index.refresh_from_store(store)
+        refresh_seconds = time.perf_counter() - start
+        renamed = index.page("renamed", args.renames + 1)["total_results"]
+        client.close()
+
+    print(f"{args.companies} companies, index built in {build_seconds:.2f} s ({index.stats()['keys']} keys)")
+    print(f"{'path':<22}{'median ms':>11}{'p99 ms':>9}")
+    for label, timings in (("index page", local), ("index typeahead", typeahead), ("upstream page", remote)):
+        print(f"{label:<22}{statistics.median(timings) * 1000:>11.3f}{percentile(timings, 0.99) * 1000:>9.3f}")
+    print(f"first pages identical for {agree}/{len(prefixes)} prefixes")
+    print(f"incremental refresh of {args.renames} renamed companies: {refresh_seconds * 1000:.1f} ms, "
+          f"{renamed} found under the new name")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Parse time of the participant sections of a dossier (ownership, key individuals, possible
+owners): one extractor pass per section vs the single pass of extract_participant_views.
+
+Documents are generated, or loaded from recorded search responses (the raw JSON written
+next to usage.md's example, `hits.hits[]._source.Vrvirksomhed`). Both variants must return
+the same views.
+
+Usage:
+    python -m benchmarks.bench_participant_extraction --companies 20 --relations 2000
+    python -m benchmarks.bench_participant_extraction --recorded cvr_raw_response3.txt
+"""
+import argparse
+import json
+import time
+
+from app.services import extractors
+from benchmarks.mock_es import generate_index
+
+
+def load_recorded(paths: list) -> list:
+    documents = []
+    for path in paths:
+        with open(path, "r") as file:
+            data = json.load(file)
+        documents.extend(hit["_source"]["Vrvirksomhed"] for hit in data["hits"]["hits"])
+    return documents
+
+
+def separate_passes(documents: list) -> list:
+    return [
+        {
+            "ownership": extractors.extract_ownership_info(document, document.get("cvrNummer")),
+            "key_individuals": extractors.extract_key_individuals(document),
+            "possible_ownership": extractors.extract_possible_ownership_info(document),
+        }
+        for document in documents
+    ]
+
+
+def single_pass(documents: list) -> list:
+    return [extractors.extract_participant_views(document, document.get("cvrNummer")) for document in documents]
+
+
+def clear_address_memo():
+    extractors._format_owner_address_parts.cache_clear()
+    extractors._format_individual_address_parts.cache_clear()
+
+
+def measure(variant, documents: list, repeat: int, cold: bool) -> float:
+    """
+    Best milliseconds per document over `repeat` runs; `cold` empties the address memo before each run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        if cold:
+            clear_address_memo()
+        start = time.perf_counter()
+        variant(documents)
+        best = min(best, time.perf_counter() - start)
+    return best / len(documents) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--relations", type=int, default=2000, help="deltagerRelation entries per document")
+    parser.add_argument("--recorded", nargs="+", help="Recorded search responses to use instead of generated documents")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.recorded:
+        documents = load_recorded(args.recorded)
+        source = f"{len(documents)} recorded documents"
+    else:
+        documents = [document["Vrvirksomhed"] for document in generate_index(args.companies, relations=args.relations)]
+        source = f"{args.companies} generated documents, {args.relations} relations each"
+    relations = sum(len(document.get("deltagerRelation") or []) for document in documents)
+    megabytes = sum(len(json.dumps(document)) for document in documents) / 1024 ** 2
+
+    expected = [
+        {view: result.model_dump() if view == "ownership" else result for view, result in views.items()}
+        for views in separate_passes(documents)
+    ]
+    actual = [
+        {view: result.model_dump() if view == "ownership" else result for view, result in views.items()}
+        for views in single_pass(documents)
+    ]
+    if actual != expected:
+        raise Exception("The single pass returned different views than the separate extractors")
+
+    print(f"{source}, {relations} relations, {megabytes:.1f} MB of JSON")
+    print(f"{'variant':<18}{'cold ms/doc':>14}{'warm ms/doc':>14}")
+    results = {}
+    for name, variant in (("separate passes", separate_passes), ("single pass", single_pass)):
+        results[name] = (
+            measure(variant, documents, args.repeat, cold=True),
+            measure(variant, documents, args.repeat, cold=False),
+        )
+        print(f"{name:<18}{results[name][0]:>14.2f}{results[name][1]:>14.2f}")
+    print(f"speedup: {results['separate passes'][0] / results['single pass'][0]:.2f}x cold, "
+          f"{results['separate passes'][1] / results['single pass'][1]:.2f}x warm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+End-to-end run of the snapshot export against a generated fixture index.
+
+Exports every company of a local mock ES server, reads the part files back and checks that
+each company appears exactly once and that the ownership edges match the extractor output.
+Exits with status 1 if the check fails, so it doubles as a pipeline test.
+
+Usage:
+    python -m benchmarks.bench_snapshot_export --companies 5000 --workers 4 --format parquet
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+import tempfile
+
+from benchmarks.mock_es import MockESServer, configure_environment, generate_index
+
+
+def read_table(directory: str, file_format: str) -> list:
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, f"part-*.{file_format}"))):
+        if file_format == "parquet":
+            import pyarrow.parquet
+            rows.extend(pyarrow.parquet.read_table(path).to_pylist())
+        else:
+            with open(path, newline="", encoding="utf-8") as f:
+                rows.extend({**row, "cvr_number": int(row["cvr_number"])} for row in csv.DictReader(f))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=5000)
+    parser.add_argument("--relations", type=int, default=8, help="deltagerRelation entries per company")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--rows-per-file", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--latency", type=float, default=0.0, help="Emulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies, relations=args.relations)
+    out_dir = tempfile.mkdtemp(prefix="snapshot-")
+
+    with MockESServer(documents, latency=args.latency) as server:
+        configure_environment(server.url)
+        from app.services import extractors
+        from app.services.cvr_client import CVRClient
+        from app.services.snapshot_export import export_snapshot
+
+        client = CVRClient(server.url, ("benchmark", "benchmark"))
+        manifest = export_snapshot(client, out_dir, page_size=args.page_size, rows_per_file=args.rows_per_file,
+                                   workers=args.workers, file_format=args.format)
+        client.close()
+
+    companies = read_table(os.path.join(out_dir, "companies"), args.format)
+    ownership = read_table(os.path.join(out_dir, "ownership"), args.format)
+    expected_edges = 0
+    for document in documents:
+        owners = extractors.extract_ownership_info(document["Vrvirksomhed"], document["Vrvirksomhed"]["cvrNummer"])
+        expected_edges += len(owners.legal_owners) + len(owners.beneficial_owners) + len(owners.terminated_owners)
+
+    print(f"{manifest['tables']['companies']['rows']} companies in {len(manifest['tables']['companies']['files'])} files, "
+          f"{manifest['tables']['ownership']['rows']} ownership edges in {len(manifest['tables']['ownership']['files'])} files")
+    print(f"{manifest['pages']} pages, {manifest['workers']} workers, {manifest['seconds']:.2f} s  "
+          f"{manifest['companies_per_second']} companies/s  -> {out_dir}")
+
+    failed = False
+    cvrs = [row["cvr_number"] for row in companies]
+    if sorted(cvrs) != sorted(document["Vrvirksomhed"]["cvrNummer"] for document in documents):
+        print("FAIL: exported companies do not match the index")
+        failed = True
+    if len(ownership) != expected_edges:
+        print(f"FAIL: {len(ownership)} ownership edges exported, {expected_edges} expected")
+        failed = True
+    if manifest["errors"]:
+        print(f"FAIL: {manifest['errors']} companies could not be parsed")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
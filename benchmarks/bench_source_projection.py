@@ -0,0 +1,61 @@
+"""
+Bytes transferred and JSON parse time per lookup, full `_source` vs per-extractor projection.
+
+Usage:
+    python -m benchmarks.bench_source_projection --companies 50 --relations 400
+"""
+import argparse
+import time
+
+from benchmarks.mock_es import MockESServer, configure_environment, generate_index
+
+
+def measure(service, cvr_ids: list, fields) -> dict:
+    before = service.client.pool_metrics()
+    start = time.perf_counter()
+    for cvr_id in cvr_ids:
+        service.get_company_document(cvr_id, use_cache=False, fields=fields)
+    elapsed = time.perf_counter() - start
+    after = service.client.pool_metrics()
+    count = len(cvr_ids)
+    return {
+        "kb_per_request": (after["bytes_received"] - before["bytes_received"]) / count / 1024,
+        "parse_ms_per_request": (after["total_parse_seconds"] - before["total_parse_seconds"]) / count * 1000,
+        "latency_ms_per_request": elapsed / count * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--relations", type=int, default=400, help="deltagerRelation entries per document")
+    args = parser.parse_args()
+
+    documents = generate_index(args.companies, relations=args.relations)
+    cvr_ids = [document["Vrvirksomhed"]["cvrNummer"] for document in documents]
+
+    with MockESServer(documents) as server:
+        configure_environment(server.url)
+        from app.services import extractors
+        from app.services.cvr_service import CVRService
+        from app.services.document_cache import DocumentCache
+
+        service = CVRService(cache=DocumentCache(enabled=False))
+        service.get_company_document(cvr_ids[0], use_cache=False)  # Warm up the connection
+
+        scenarios = [
+            ("full _source", None),
+            ("general info", extractors.GENERAL_INFO_FIELDS),
+            ("ownership", extractors.OWNERSHIP_FIELDS),
+            ("company header", extractors.COMPANY_HEADER_FIELDS),
+        ]
+        print(f"{args.companies} companies, {args.relations} relations each")
+        print(f"{'projection':<16}{'KB/request':>12}{'parse ms':>12}{'latency ms':>12}")
+        for name, fields in scenarios:
+            result = measure(service, cvr_ids, fields)
+            print(f"{name:<16}{result['kb_per_request']:>12.1f}{result['parse_ms_per_request']:>12.2f}"
+                  f"{result['latency_ms_per_request']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
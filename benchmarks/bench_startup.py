@@ -0,0 +1,95 @@
+"""
+Cold boot time of the API: importing `run`, running the startup handlers and answering the first request.
+
+Each run happens in a fresh interpreter, like a gunicorn worker after a redeploy. The script exits with
+status 1 when the median boot exceeds the budget, or when a module that should load lazily (selenium,
+pandas) is imported during boot, so it can guard CI.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --budget 2.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.mock_es import configure_environment
+
+LAZY_MODULES = ["selenium", "pandas"]
+
+CHILD = """
+import json, sys, time
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+import run
+imported = time.perf_counter()
+with TestClient(run.app) as client:
+    started = time.perf_counter()
+    status = client.get("/cvr/ready").status_code
+    answered = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "startup_seconds": started - imported,
+    "first_request_seconds": answered - started,
+    "total_seconds": answered - start,
+    "status": status,
+    "lazy_modules_loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def boot_once(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="Maximum median boot time in seconds")
+    parser.add_argument("--warm-up", action="store_true", help="Also launch the PDF browsers on startup")
+    args = parser.parse_args()
+
+    configure_environment("http://127.0.0.1:9/_search")  # Booting never contacts the upstream
+    env = dict(os.environ)
+    env["PDF_WARM_UP_ON_STARTUP"] = "true" if args.warm_up else "false"
+    env["PDF_DOWNLOAD_DIR"] = tempfile.mkdtemp(prefix="bench-startup-")
+    env["PDF_CACHE_DIR"] = os.path.join(env["PDF_DOWNLOAD_DIR"], "cache")
+    env["PDF_JOB_STATE_DIR"] = os.path.join(env["PDF_DOWNLOAD_DIR"], "jobs")
+
+    runs = [boot_once(env) for _ in range(args.runs)]
+    print(f"{'run':<5}{'import s':>10}{'startup s':>11}{'request s':>11}{'total s':>9}")
+    for number, run in enumerate(runs, start=1):
+        print(f"{number:<5}{run['import_seconds']:>10.3f}{run['startup_seconds']:>11.3f}"
+              f"{run['first_request_seconds']:>11.3f}{run['total_seconds']:>9.3f}")
+
+    median = statistics.median(run["total_seconds"] for run in runs)
+    # The warm-up imports selenium on a background thread by design
+    lazy_loaded = [] if args.warm_up else sorted({name for run in runs for name in run["lazy_modules_loaded"]})
+    print(f"median boot {median:.3f} s, budget {args.budget:.3f} s")
+
+    failed = False
+    if median > args.budget:
+        print("FAIL: boot time exceeds the budget")
+        failed = True
+    if lazy_loaded:
+        print(f"FAIL: imported during boot: {', '.join(lazy_loaded)}")
+        failed = True
+    if any(run["status"] != 200 for run in runs):
+        print("FAIL: readiness probe did not answer 200")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
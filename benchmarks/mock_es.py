@@ -0,0 +1,496 @@
+"""
+Local mock of the CVR ElasticSearch endpoint used by the benchmarks.
+
+It serves a generated fixture index of `Vrvirksomhed` documents over HTTP/1.1 with
+keep-alive and understands the subset of the query DSL that CVRService sends.
+An optional per-request latency emulates the round trip to the real register.
+"""
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = [
+    "Nordisk", "Dansk", "Jysk", "Fyns", "Sjælland", "Holm", "Skov", "Havn", "Lund", "Berg",
+    "Consulting", "Logistik", "Transport", "Invest", "Holding", "Ejendomme", "Byg", "Data",
+    "Solutions", "Trading", "Energi", "Marine", "Foods", "Design", "Service", "Partners",
+]
+LEGAL_FORMS = [
+    ("A/S", "Aktieselskab"),
+    ("ApS", "Anpartsselskab"),
+    ("I/S", "Interessentskab"),
+    ("P/S", "Partnerselskab"),
+]
+FIRST_NAMES = ["Henrik", "Anne", "Lars", "Mette", "Søren", "Camilla", "Jens", "Louise", "Peter", "Sofie"]
+LAST_NAMES = ["Andersen", "Nielsen", "Hansen", "Pedersen", "Jensen", "Larsen", "Sørensen", "Rasmussen"]
+CITIES = [(1000, "København K"), (8000, "Aarhus C"), (5000, "Odense C"), (9000, "Aalborg"), (6700, "Esbjerg")]
+
+
+def _address(rng: random.Random) -> dict:
+    postnummer, postdistrikt = rng.choice(CITIES)
+    return {
+        "vejnavn": f"{rng.choice(WORDS)}vej",
+        "husnummerFra": rng.randint(1, 200),
+        "bogstavFra": None,
+        "etage": None,
+        "sidedoer": None,
+        "postnummer": postnummer,
+        "postdistrikt": postdistrikt,
+        "kommune": {"kommuneNavn": postdistrikt.split(" ")[0].upper(), "navn": postdistrikt.split(" ")[0]},
+        "landekode": "DK",
+        "fritekst": None,
+    }
+
+
+def _attribute(attr_type: str, value: str, start: str, end: str = None) -> dict:
+    return {
+        "type": attr_type,
+        "vaerdier": [{"vaerdi": value, "periode": {"gyldigFra": start, "gyldigTil": end}}],
+    }
+
+
+def _organisation(hovedtype: str, navn: str, attributes: list = None) -> dict:
+    return {
+        "hovedtype": hovedtype,
+        "organisationsNavn": [{"navn": navn}],
+        "medlemsData": [{"attributter": attributes or []}],
+    }
+
+
+def generate_company(cvr: int, rng: random.Random, relations: int = 8, owner_cvrs: list = None) -> dict:
+    """
+    Generates one `Vrvirksomhed` document resembling the CVR register's layout.
+
+    Args:
+        cvr (int): CVR number of the company.
+        rng (random.Random): Random source, seeded for reproducible fixtures.
+        relations (int): Number of `deltagerRelation` entries; raise it to produce multi-MB documents.
+        owner_cvrs (list): CVR numbers that may appear as corporate owners of this company.
+    """
+    suffix, form = rng.choice(LEGAL_FORMS)
+    name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {suffix}"
+    updated = f"20{rng.randint(15, 24):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00.000+02:00"
+
+    deltager_relation = []
+    for index in range(relations):
+        corporate = owner_cvrs and index % 4 == 0
+        if corporate:
+            owner_cvr = rng.choice(owner_cvrs)
+            participant = {
+                "enhedsNummer": 4000000000 + owner_cvr,
+                "enhedstype": "VIRKSOMHED",
+                "forretningsnoegle": owner_cvr,
+                "navne": [{"navn": f"Owner {owner_cvr} Holding A/S", "periode": {"gyldigFra": "2010-01-01", "gyldigTil": None}}],
+                "beliggenhedsadresse": [_address(rng)],
+                "adresseHemmelig": False,
+            }
+        else:
+            person = rng.randint(0, 5000)
+            participant = {
+                "enhedsNummer": 4000000000 + person,
+                "enhedstype": "PERSON",
+                "forretningsnoegle": None,
+                "navne": [{"navn": f"{FIRST_NAMES[person % len(FIRST_NAMES)]} {LAST_NAMES[person % len(LAST_NAMES)]}",
+                           "periode": {"gyldigFra": "2010-01-01", "gyldigTil": None}}],
+                "beliggenhedsadresse": [_address(rng)],
+                "adresseHemmelig": rng.random() < 0.1,
+            }
+
+        role = index % 5
+        if role in (0, 1):
+            share = rng.choice(["0.05", "0.1", "0.25", "0.3333", "0.5", "1.0"])
+            end = None if rng.random() < 0.8 else "2020-12-31"
+            organisations = [
+                _organisation("REGISTER", "EJERREGISTER", [
+                    _attribute("EJERANDEL_PROCENT", share, "2015-01-01", end),
+                    _attribute("EJERANDEL_STEMMERET_PROCENT", share, "2015-01-01", end),
+                ]),
+            ]
+            if not corporate and role == 1:
+                organisations.append(_organisation("REGISTER", "Reelle ejere", [
+                    _attribute("EJERANDEL_PROCENT", share, "2015-01-01", end),
+                ]))
+        elif role == 2:
+            organisations = [_organisation("LEDELSESORGAN", "Bestyrelse")]
+        elif role == 3:
+            organisations = [_organisation("LEDELSESORGAN", "Direktion")]
+        else:
+            organisations = [_organisation(rng.choice(["STIFTERE", "FULDT_ANSVARLIG_DELTAGERE"]), "Stiftere")]
+
+        deltager_relation.append({"deltager": participant, "organisationer": organisations})
+
+    return {
+        "Vrvirksomhed": {
+            "cvrNummer": cvr,
+            "enhedsNummer": 3000000000 + cvr,
+            "sidstOpdateret": updated,
+            "sidstIndlaest": updated,
+            "reklamebeskyttet": rng.random() < 0.3,
+            "beliggenhedsadresse": [_address(rng)],
+            "virksomhedMetadata": {
+                "nyesteNavn": {"navn": name},
+                "nyesteVirksomhedsform": {"langBeskrivelse": form, "kortBeskrivelse": suffix},
+                "stiftelsesDato": f"{rng.randint(1950, 2023)}-01-01",
+                "sammensatStatus": rng.choice(["Normal", "NORMAL", "Ophørt"]),
+            },
+            "deltagerRelation": deltager_relation,
+            "navne": [{"navn": name, "periode": {"gyldigFra": "2010-01-01", "gyldigTil": None}}],
+        }
+    }
+
+
+def generate_index(count: int, seed: int = 42, relations: int = 8, first_cvr: int = 10000000) -> list:
+    """
+    Generates `count` company documents with CVR numbers starting at `first_cvr`.
+    """
+    rng = random.Random(seed)
+    cvrs = list(range(first_cvr, first_cvr + count))
+    return [generate_company(cvr, rng, relations=relations, owner_cvrs=cvrs) for cvr in cvrs]
+
+
+def configure_environment(url: str):
+    """
+    Points the application settings at a mock server. Must run before app.services is imported.
+    """
+    os.environ["CVR_API_URL"] = url
+    os.environ.setdefault("CVR_API_USERNAME", "benchmark")
+    os.environ.setdefault("CVR_API_PASSWORD", "benchmark")
+    os.environ.setdefault("ELASTICSEARCH_VERSION", "6.8.16")
+
+
+def _field_values(document, path: str) -> list:
+    """
+    Resolves a dotted field path against a document, flattening lists along the way.
+    """
+    values = [document]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and value.get(part) is not None:
+                item = value[part]
+                next_values.extend(item if isinstance(item, list) else [item])
+        values = next_values
+    return values
+
+
+def _tokens(text) -> list:
+    return str(text).lower().replace(",", " ").split()
+
+
+def _evaluate(query: dict, document: dict) -> float:
+    """
+    Returns a relevance score for the document, or 0 when it does not match.
+    """
+    if not query or "match_all" in query:
+        return 1.0
+    if "match" in query:
+        field, value = next(iter(query["match"].items()))
+        if isinstance(value, dict):
+            value = value.get("query")
+        best = 0.0
+        query_tokens = set(_tokens(value))
+        for candidate in _field_values(document, field):
+            if isinstance(candidate, (int, float)) and not isinstance(candidate, bool):
+                if str(candidate) == str(value):
+                    return 1.0
+                continue
+            candidate_tokens = set(_tokens(candidate))
+            if query_tokens and candidate_tokens:
+                overlap = len(query_tokens & candidate_tokens)
+                best = max(best, overlap / len(query_tokens | candidate_tokens) * 10)
+        return best
+    if "match_phrase_prefix" in query:
+        field, value = next(iter(query["match_phrase_prefix"].items()))
+        if isinstance(value, dict):
+            value = value.get("query")
+        phrase = " ".join(_tokens(value))
+        for candidate in _field_values(document, field):
+            if (" " + " ".join(_tokens(candidate))).find(" " + phrase) >= 0:
+                return 1.0
+        return 0.0
+    if "terms" in query:
+        field, values = next(iter(query["terms"].items()))
+        wanted = {str(v) for v in values}
+        return 1.0 if any(str(v) in wanted for v in _field_values(document, field)) else 0.0
+    if "range" in query:
+        field, bounds = next(iter(query["range"].items()))
+        for candidate in _field_values(document, field):
+            if "gte" in bounds and not candidate >= bounds["gte"]:
+                continue
+            if "gt" in bounds and not candidate > bounds["gt"]:
+                continue
+            if "lte" in bounds and not candidate <= bounds["lte"]:
+                continue
+            if "lt" in bounds and not candidate < bounds["lt"]:
+                continue
+            return 1.0
+        return 0.0
+    if "bool" in query:
+        clauses = query["bool"]
+        score = 0.0
+        for key in ("must", "filter"):
+            subqueries = clauses.get(key, [])
+            for subquery in subqueries if isinstance(subqueries, list) else [subqueries]:
+                subscore = _evaluate(subquery, document)
+                if subscore <= 0:
+                    return 0.0
+                score += subscore if key == "must" else 0.0
+        should = clauses.get("should", [])
+        should_scores = [_evaluate(subquery, document) for subquery in should]
+        if should and not any(should_scores) and not clauses.get("must") and not clauses.get("filter"):
+            return 0.0
+        return max(score + sum(should_scores), 1e-6)
+    raise ValueError(f"Unsupported query: {list(query.keys())}")
+
+
+def _project(source: dict, source_filter) -> dict:
+    """
+    Applies an ElasticSearch `_source` filter (bool, list or {"includes": [...]}) to a document.
+    """
+    if source_filter is None or source_filter is True:
+        return source
+    if source_filter is False:
+        return {}
+    includes = source_filter.get("includes", []) if isinstance(source_filter, dict) else source_filter
+    if isinstance(includes, str):
+        includes = [includes]
+    if not includes:
+        return source
+
+    def project(value, paths):
+        if any(path == "" for path in paths):
+            return value
+        if isinstance(value, list):
+            return [project(item, paths) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            sub_paths = [path[len(key) + 1:] if path != key else "" for path in paths
+                         if path == key or path.startswith(key + ".")]
+            # Like ElasticSearch, a null or other leaf value is only kept when a path selects it
+            # in full, not when the paths only reach into it
+            if "" in sub_paths or (sub_paths and isinstance(item, (dict, list))):
+                result[key] = project(item, sub_paths)
+        return result
+
+    return project(source, includes)
+
+
+class MockESIndex:
+    """
+    In-memory document store that executes search bodies against the fixture documents.
+    """
+
+    def __init__(self, documents: list):
+        self.documents = documents
+        self.by_cvr = {document["Vrvirksomhed"]["cvrNummer"]: document for document in documents}
+
+    def search(self, body: dict) -> dict:
+        query = body.get("query", {"match_all": {}})
+        scored = []
+        cvr = query.get("match", {}).get("Vrvirksomhed.cvrNummer")
+        # Lookups by CVR ID skip the scan, so the server's CPU time does not depend on the index size
+        candidates = self.documents if not isinstance(cvr, int) else [self.by_cvr[cvr]] if cvr in self.by_cvr else []
+        for document in candidates:
+            score = _evaluate(query, document)
+            if score > 0:
+                scored.append((score, document))
+        scored.sort(key=lambda item: -item[0])
+
+        sort_fields = self._sort_fields(body.get("sort"))
+        if sort_fields:
+            for field, order in reversed(sort_fields):
+                scored.sort(key=lambda item: self._sort_value(item[1], field), reverse=order == "desc")
+            search_after = body.get("search_after")
+            if search_after:
+                scored = [item for item in scored if self._after(item[1], sort_fields, search_after)]
+
+        start = body.get("from", 0)
+        size = body.get("size", 10)
+        page = scored[start:start + size]
+        return {
+            "took": 1,
+            "timed_out": False,
+            "hits": {
+                "total": len(scored),
+                "max_score": scored[0][0] if scored else None,
+                "hits": [
+                    {
+                        "_index": "cvr-permanent",
+                        "_type": "virksomhed",
+                        "_id": str(document["Vrvirksomhed"]["cvrNummer"]),
+                        "_score": score,
+                        "_source": _project(document, body.get("_source")),
+                        **({"sort": [self._sort_value(document, field) for field, _ in sort_fields]} if sort_fields else {}),
+                    }
+                    for score, document in page
+                ],
+            },
+        }
+
+
+    @staticmethod
+    def _sort_fields(sort) -> list:
+        fields = []
+        for entry in sort or []:
+            if isinstance(entry, str):
+                fields.append((entry, "asc"))
+            else:
+                field, order = next(iter(entry.items()))
+                fields.append((field, order.get("order", "asc") if isinstance(order, dict) else order))
+        return fields
+
+    @staticmethod
+    def _sort_value(document, field):
+        values = _field_values(document, field)
+        return values[0] if values else ""
+
+    def _after(self, document, sort_fields, search_after) -> bool:
+        for (field, order), after in zip(sort_fields, search_after):
+            value = self._sort_value(document, field)
+            if value == after:
+                continue
+            return value > after if order == "asc" else value < after
+        return False
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when hundreds of clients connect at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockESServer:
+    """
+    Serves a MockESIndex over HTTP on 127.0.0.1 from a background thread.
+
+    Args:
+        documents (list): Fixture documents, e.g. from generate_index().
+        latency (float): Seconds every request sleeps before answering, emulating the upstream round trip.
+    """
+
+    def __init__(self, documents: list, latency: float = 0.0, port: int = 0):
+        self.index = MockESIndex(documents)
+        self.latency = latency
+        self.bytes_sent = 0
+        self.requests = 0
+        self.shared_requests = None  # multiprocessing.Value mirroring `requests` when run by MockESProcess
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/cvr-permanent/virksomhed/_search"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length) if length else b""
+                if server.latency:
+                    time.sleep(server.latency)
+                try:
+                    status, payload = server.handle(self.path, raw)
+                except Exception as e:
+                    status, payload = 400, {"error": str(e)}
+                body = json.dumps(payload).encode("utf-8")
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += len(body)
+                    if server.shared_requests is not None:
+                        server.shared_requests.value = server.requests
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+        return Handler
+
+    def handle(self, path: str, raw: bytes):
+        """
+        Dispatches one request to the index and returns (status, payload).
+        """
+        route = path.split("?", 1)[0]
+        if route.endswith("/_search"):
+            return 200, self.index.search(json.loads(raw or b"{}"))
+        if route.endswith("/_msearch"):
+            lines = [line for line in raw.decode("utf-8").splitlines() if line.strip()]
+            bodies = [json.loads(line) for line in lines[1::2]]
+            return 200, {"responses": [dict(self.index.search(body), status=200) for body in bodies]}
+        return 404, {"error": f"Unknown route {route}"}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve(documents: list, latency: float, port: int, shared_requests, connection):
+    server = MockESServer(documents, latency=latency, port=port)
+    server.shared_requests = shared_requests
+    connection.send(server.url)
+    server._server.serve_forever()
+
+
+class MockESProcess:
+    """
+    Serves a MockESIndex like MockESServer, but from a child process, so the server does not
+    compete with the benchmarked client for the GIL. Use it for throughput comparisons.
+
+    Args:
+        documents (list): Fixture documents, e.g. from generate_index().
+        latency (float): Seconds every request sleeps before answering, emulating the upstream round trip.
+    """
+
+    def __init__(self, documents: list, latency: float = 0.0, port: int = 0):
+        self._args = (documents, latency, port)
+        self._requests = multiprocessing.Value("q", 0, lock=False)
+        self._process = None
+        self.url = None
+
+    @property
+    def requests(self) -> int:
+        return self._requests.value
+
+    def start(self):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=_serve, args=(*self._args, self._requests, sender), daemon=True)
+        self._process.start()
+        self.url = receiver.recv()
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()